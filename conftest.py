@@ -0,0 +1 @@
+# Makes the project root importable (utils, gui, core) when the tests are run with a plain "pytest".
@@ -0,0 +1,199 @@
+"""
+Command line interface for QSOMap2KML
+-------------------------------------
+Headless batch export for servers and cron jobs:
+
+    python main.py export in.adi out.kml --grid JO31 --bands 20m=#FF0000 40m=#00FF00
+
+- Inputs are ADIF/ADX files, folders or glob patterns (merged without duplicates)
+- The output format follows the file extension (.kml, .kmz, .geojsonl,
+  .csv), --also writes further formats in the same pass, --tiled writes a
+  KMZ with level of detail
+- Locator, colors, language, area radius, aggregation and worker count
+  default to the settings of the GUI (config/settings.json) and can be
+  overridden with flags
+- seed-tiles pre-loads the base map of the preview into the offline tile
+  cache for a bounding box and zoom range:
+
+    python main.py seed-tiles --bbox 47 5 55 15 --max-zoom 8
+
+Only the parser and the exporters are imported, never Qt or folium, so the
+command starts without the GUI stack.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+COMMANDS = ("export", "seed-tiles")
+
+
+def _color_pairs(items, option):
+    """Parse NAME=COLOR arguments into a dict."""
+    colors = {}
+    for item in items or ():
+        name, sep, color = item.partition("=")
+        if not sep or not name or not color:
+            raise argparse.ArgumentTypeError(f"{option}: expected NAME=COLOR, got '{item}'")
+        colors[name] = color
+    return colors
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="QSOMap2KML", description="Export ADIF logs without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export ADIF/ADX logs to KML, KMZ, GeoJSON lines or CSV.")
+    export.add_argument("inputs", nargs="+", metavar="INPUT", help="ADIF/ADX files, folders or glob patterns.")
+    export.add_argument("output", help="Output file (.kml, .kmz, .geojsonl or .csv).")
+    export.add_argument("--also", nargs="+", default=[], metavar="FILE",
+                        help="More output files, written in the same pass (format by extension).")
+    export.add_argument("--grid", help="Own locator (default: my_grid of the settings).")
+    export.add_argument("--bands", nargs="+", metavar="BAND=COLOR", help="Line colors per band, e.g. 20m=#FF0000.")
+    export.add_argument("--modes", nargs="+", metavar="MODE=COLOR", help="Marker colors per mode, e.g. FT8=#00FF00.")
+    export.add_argument("--no-config-colors", action="store_true", help="Ignore the colors of the settings.")
+    export.add_argument("--lang", choices=("en", "de"), help="Language of popups and legend.")
+    export.add_argument("--aggregate", choices=("off", "grid", "grid_band"), help="One placemark per grid square (and band).")
+    export.add_argument("--radius", type=int, metavar="KM", help="Only QSOs within this distance of the own locator (0 = all).")
+    export.add_argument("--tiled", action="store_true", help="KMZ with level of detail tiles for very large logs.")
+    export.add_argument("--workers", type=int, help="Worker processes for import and export (default: number of CPUs).")
+    export.add_argument("--no-cache", action="store_true", help="Do not read or write the *.qsocache of a single file.")
+    export.add_argument("--config", help="Settings file (default: config/settings.json).")
+    export.add_argument("-q", "--quiet", action="store_true", help="Only report errors.")
+
+    seed = commands.add_parser("seed-tiles", help="Download base map tiles into the offline tile cache.")
+    seed.add_argument("--bbox", nargs=4, type=float, required=True, metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                      help="Area in degrees, e.g. 47 5 55 15.")
+    seed.add_argument("--min-zoom", type=int, default=0, help="Lowest zoom level (default: 0).")
+    seed.add_argument("--max-zoom", type=int, required=True, help="Highest zoom level.")
+    seed.add_argument("--provider", help="Base map of the catalog, e.g. OpenTopoMap (default: map_tiles of the settings).")
+    seed.add_argument("--cache", help="Tile cache file (default: config/tiles.sqlite).")
+    seed.add_argument("--max-mb", type=int, help="Size cap of the cache in MB (default: tile_cache_mb of the settings).")
+    seed.add_argument("--max-tiles", type=int, help="Refuse runs with more tiles (default: 20000).")
+    seed.add_argument("--refresh", action="store_true", help="Download tiles that are already cached again.")
+    seed.add_argument("--config", help="Settings file (default: config/settings.json).")
+    seed.add_argument("-q", "--quiet", action="store_true", help="Only report errors.")
+    return parser
+
+
+def load_qsos(paths, use_cache=True, max_workers=None):
+    """QSOStore of one file (with cache) or of several files/folders/patterns (merged)."""
+    from utils.qso_store import QSOStore
+    from utils.adif_import import import_adif_files
+
+    if len(paths) == 1 and os.path.isfile(paths[0]):
+        return QSOStore.load_adif(paths[0], use_cache=use_cache)
+    qsos, _report = import_adif_files(paths, max_workers=max_workers)
+    return qsos
+
+
+def run_export(args):
+    """Run the export command; returns the process exit code."""
+    from core.config_manager import ConfigManager
+    from core.i18n import I18n
+    from utils.qso_groups import AGGREGATE_OFF
+
+    if args.config:
+        ConfigManager.CONFIG_PATH = args.config
+    config = ConfigManager.load()
+    band_colors = {} if args.no_config_colors else dict(config.get("bands_colors", {}))
+    mode_colors = {} if args.no_config_colors else dict(config.get("modes_colors", {}))
+    band_colors.update(_color_pairs(args.bands, "--bands"))
+    mode_colors.update(_color_pairs(args.modes, "--modes"))
+    my_locator = args.grid or config.get("my_grid") or None
+    lang = args.lang or config.get("language", "en")
+    radius = args.radius if args.radius is not None else config.get("area_radius_km", 0)
+    workers = args.workers if args.workers is not None else config.get("export_workers")
+
+    from utils.exporters import EXPORTERS, export_qsos
+    from utils.render_plan import as_render_plan
+
+    outputs = [args.output] + args.also
+    if args.tiled and os.path.splitext(outputs[0])[1].lower() != ".kmz":
+        outputs[0] += ".kmz"
+    for output in outputs:
+        ext = os.path.splitext(output)[1].lower()
+        if ext not in EXPORTERS:
+            raise ValueError(f"Unknown export format '{ext or output}' (supported: {', '.join(sorted(EXPORTERS))})")
+
+    start = time.perf_counter()
+    qsos = load_qsos(args.inputs, use_cache=not args.no_cache and config.get("adif_cache", True),
+                     max_workers=args.workers if args.workers is not None else config.get("import_workers"))
+    if not my_locator:
+        logging.warning("No own locator (--grid or my_grid in the settings): KML/KMZ contain no QSOs.")
+    i18n = I18n(lang)
+    # Parsed, geocoded and measured once for all output files
+    plan = as_render_plan(qsos, my_locator, band_colors, mode_colors, lang, radius)
+    done = []
+    if args.tiled:
+        from utils.kml_tiles import export_qsos_to_kmz_tiles
+        export_qsos_to_kmz_tiles(plan, outputs[0], my_locator, band_colors, mode_colors, i18n=i18n, lang=lang,
+                                 area_radius_km=radius)
+        # The tiled KMZ has its own writer, the other files share one pass
+        done, outputs = outputs[:1], outputs[1:]
+    if outputs:
+        export_qsos(
+            plan, outputs, my_locator, band_colors, mode_colors, i18n=i18n, lang=lang, area_radius_km=radius,
+            aggregate=args.aggregate or config.get("aggregate_mode", AGGREGATE_OFF), max_workers=workers
+        )
+    logging.info(f"Exported {len(qsos)} QSOs to {', '.join(done + outputs)} in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+def run_seed_tiles(args):
+    """Run the seed-tiles command; returns the process exit code."""
+    from core.config_manager import ConfigManager
+    from utils.tile_cache import DEFAULT_CACHE_MB, DEFAULT_CACHE_PATH, MAX_SEED_TILES, TileCache, seed_tiles
+    from utils.tile_providers import DEFAULT_PROVIDER, load_providers
+
+    if args.config:
+        ConfigManager.CONFIG_PATH = args.config
+    config = ConfigManager.load()
+    name = args.provider or config.get("map_tiles", DEFAULT_PROVIDER)
+    provider = load_providers().get(name)
+    if provider is None:
+        raise ValueError(f"Unknown base map '{name}' (or it needs an API key)")
+    south, west, north, east = args.bbox
+    if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+        raise ValueError("--bbox: expected SOUTH < NORTH and WEST < EAST in degrees")
+    if args.min_zoom > args.max_zoom:
+        raise ValueError("--min-zoom is larger than --max-zoom")
+    max_mb = args.max_mb if args.max_mb is not None else config.get("tile_cache_mb", DEFAULT_CACHE_MB)
+
+    def report(done, total):
+        if done % 500 == 0 or done == total:
+            logging.info(f"{done}/{total} tiles")
+
+    start = time.perf_counter()
+    with TileCache(args.cache or DEFAULT_CACHE_PATH, max_mb) as cache:
+        fetched, cached, failed = seed_tiles(
+            cache, provider, args.bbox, range(args.min_zoom, args.max_zoom + 1), report, refresh=args.refresh,
+            max_tiles=args.max_tiles or MAX_SEED_TILES
+        )
+        logging.info(f"Tile cache {cache.path}: {len(cache)} tiles, {cache.total // (1024 * 1024)} MB "
+                     f"({time.perf_counter() - start:.1f} s)")
+    return 1 if failed and not (fetched or cached) else 0
+
+
+def main(argv=None):
+    """Entry point of the command line mode; returns the process exit code."""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.ERROR if args.quiet else logging.INFO,
+        format="%(levelname)s: %(message)s",
+        stream=sys.stderr
+    )
+    try:
+        if args.command == "export":
+            return run_export(args)
+        if args.command == "seed-tiles":
+            return run_seed_tiles(args)
+    except argparse.ArgumentTypeError as e:
+        logging.error(str(e))
+        return 2
+    except (OSError, ValueError) as e:
+        logging.error(f"{args.command.capitalize()} failed: {e}")
+        return 1
+    return 2
@@ -1,14 +1,22 @@
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QLabel, QPushButton, QLineEdit, QComboBox, QHBoxLayout, QColorDialog, QCheckBox, QFormLayout, QGroupBox
+    QDialog, QVBoxLayout, QLabel, QPushButton, QLineEdit, QComboBox, QHBoxLayout, QColorDialog, QCheckBox, QFormLayout, QGroupBox, QSpinBox
 )
-from PySide6.QtGui import QColor
+from PySide6.QtGui import QColor, QRegularExpressionValidator
 from PySide6.QtWidgets import QApplication
 from core.config_manager import ConfigManager
+from utils.qso_groups import AGGREGATE_MODES, AGGREGATE_OFF
+from gui.map_preview import RENDER_MODES, RENDER_AUTO
+from utils.tile_providers import DEFAULT_PROVIDER, load_providers
+from utils.tile_cache import DEFAULT_CACHE_MB
+from utils.qso_database import DEFAULT_MAX_QSOS
 from utils.logger import set_log_level
 from utils.app_utils import get_app_stylesheet
 from functools import partial
 
 
+# ADIF date of the database filter (YYYYMMDD)
+DATE_PATTERN = r"\d{0,8}"
+
 # Beispiel-Bänder und Modes (kannst du anpassen)
 BANDS = []
 MODES = []
@@ -50,6 +58,60 @@ class ConfigDialog(QDialog):
         idx = 0 if self.config.get("language", "en") == "en" else 1
         self.lang_combo.setCurrentIndex(idx)
         common_form.addRow(QLabel(self.i18n.t("config_language")), self.lang_combo)
+        self.database_checkbox = QCheckBox(self.i18n.t("config_use_database"))
+        self.database_checkbox.setChecked(self.config.get("use_database", False))
+        common_form.addRow(self.database_checkbox)
+        # Filter of the QSOs loaded from the database (empty = all)
+        self.db_bands_edit = QLineEdit(", ".join(self.config.get("db_bands", [])))
+        self.db_bands_edit.setPlaceholderText(self.i18n.t("config_db_filter_all"))
+        common_form.addRow(QLabel(self.i18n.t("config_db_bands")), self.db_bands_edit)
+        self.db_date_from_edit = QLineEdit(self.config.get("db_date_from", ""))
+        self.db_date_to_edit = QLineEdit(self.config.get("db_date_to", ""))
+        for edit, key in ((self.db_date_from_edit, "config_db_date_from"), (self.db_date_to_edit, "config_db_date_to")):
+            edit.setValidator(QRegularExpressionValidator(DATE_PATTERN, edit))
+            edit.setPlaceholderText("YYYYMMDD")
+            common_form.addRow(QLabel(self.i18n.t(key)), edit)
+        self.db_max_spin = QSpinBox()
+        self.db_max_spin.setRange(0, 10000000)
+        self.db_max_spin.setSingleStep(50000)
+        self.db_max_spin.setSpecialValueText(self.i18n.t("config_db_max_qsos_all"))
+        self.db_max_spin.setValue(self.config.get("db_max_qsos", DEFAULT_MAX_QSOS))
+        common_form.addRow(QLabel(self.i18n.t("config_db_max_qsos")), self.db_max_spin)
+        self.area_radius_spin = QSpinBox()
+        self.area_radius_spin.setRange(0, 20000)
+        self.area_radius_spin.setSingleStep(100)
+        self.area_radius_spin.setSuffix(" km")
+        self.area_radius_spin.setSpecialValueText(self.i18n.t("config_area_radius_off"))
+        self.area_radius_spin.setValue(self.config.get("area_radius_km", 0))
+        common_form.addRow(QLabel(self.i18n.t("config_area_radius")), self.area_radius_spin)
+        self.aggregate_combo = QComboBox()
+        for mode in AGGREGATE_MODES:
+            self.aggregate_combo.addItem(self.i18n.t(f"config_aggregate_{mode}"), mode)
+        self.aggregate_combo.setCurrentIndex(max(self.aggregate_combo.findData(self.config.get("aggregate_mode", AGGREGATE_OFF)), 0))
+        common_form.addRow(QLabel(self.i18n.t("config_aggregate")), self.aggregate_combo)
+        self.render_combo = QComboBox()
+        for mode in RENDER_MODES:
+            self.render_combo.addItem(self.i18n.t(f"config_map_render_{mode}"), mode)
+        self.render_combo.setCurrentIndex(max(self.render_combo.findData(self.config.get("map_render_mode", RENDER_AUTO)), 0))
+        common_form.addRow(QLabel(self.i18n.t("config_map_render")), self.render_combo)
+        self.clustering_checkbox = QCheckBox(self.i18n.t("config_map_clustering"))
+        self.clustering_checkbox.setChecked(self.config.get("map_clustering", True))
+        common_form.addRow(self.clustering_checkbox)
+        # Base map from the bundled provider catalog
+        self.tiles_combo = QComboBox()
+        self.tiles_combo.setMaxVisibleItems(20)
+        self.tiles_combo.addItems(list(load_providers()))
+        self.tiles_combo.setCurrentIndex(max(self.tiles_combo.findText(self.config.get("map_tiles", DEFAULT_PROVIDER)), 0))
+        common_form.addRow(QLabel(self.i18n.t("config_map_tiles")), self.tiles_combo)
+        self.tile_cache_checkbox = QCheckBox(self.i18n.t("config_tile_cache"))
+        self.tile_cache_checkbox.setChecked(self.config.get("tile_cache", True))
+        common_form.addRow(self.tile_cache_checkbox)
+        self.tile_cache_spin = QSpinBox()
+        self.tile_cache_spin.setRange(10, 100000)
+        self.tile_cache_spin.setSingleStep(100)
+        self.tile_cache_spin.setSuffix(" MB")
+        self.tile_cache_spin.setValue(self.config.get("tile_cache_mb", DEFAULT_CACHE_MB))
+        common_form.addRow(QLabel(self.i18n.t("config_tile_cache_size")), self.tile_cache_spin)
         common_group.setLayout(common_form)
         layout.addWidget(common_group)
 
@@ -117,6 +179,19 @@ class ConfigDialog(QDialog):
         self.config["my_grid"] = self.locator_edit.text().strip().upper()
         self.config["my_name"] = self.name_edit.text().strip()
         self.config["log_level"] = self.loglevel_combo.currentText()
+        self.config["use_database"] = self.database_checkbox.isChecked()
+        self.config["db_bands"] = [band.strip() for band in self.db_bands_edit.text().split(",") if band.strip()]
+        # Incomplete dates are dropped
+        self.config["db_date_from"] = self.db_date_from_edit.text() if len(self.db_date_from_edit.text()) == 8 else ""
+        self.config["db_date_to"] = self.db_date_to_edit.text() if len(self.db_date_to_edit.text()) == 8 else ""
+        self.config["db_max_qsos"] = self.db_max_spin.value()
+        self.config["area_radius_km"] = self.area_radius_spin.value()
+        self.config["aggregate_mode"] = self.aggregate_combo.currentData()
+        self.config["map_render_mode"] = self.render_combo.currentData()
+        self.config["map_clustering"] = self.clustering_checkbox.isChecked()
+        self.config["map_tiles"] = self.tiles_combo.currentText()
+        self.config["tile_cache"] = self.tile_cache_checkbox.isChecked()
+        self.config["tile_cache_mb"] = self.tile_cache_spin.value()
         # Farben speichern
         self.config["bands_colors"] = {band: self.band_color_buttons[band].palette().button().color().name() for band in self.band_color_buttons}
         self.config["modes_colors"] = {mode: self.mode_color_buttons[mode].palette().button().color().name() for mode in self.mode_color_buttons}
@@ -124,8 +199,9 @@ class ConfigDialog(QDialog):
         set_log_level(self.config["log_level"])
         if self.parent() and hasattr(self.parent(), "reload_language"):
             self.parent().reload_language(self.config["language"]) 
-        if hasattr(self.parent(), "qsos") and hasattr(self.parent(), "map_preview"):
-            self.parent().map_preview.show_qsos(self.parent().qsos)
+        if hasattr(self.parent(), "refresh_map"):
+            # Colors/language in place, other settings rebuild the map in the background
+            self.parent().refresh_map()
         if self.parent():
             app = QApplication.instance()
             if app:
@@ -0,0 +1,210 @@
+"""
+Background jobs for QSOMap2KML
+------------------------------
+Long running work (import, map rendering, export) runs on a worker thread
+instead of the GUI thread, so the window and the progress bar stay alive:
+- A job is a function work(job) running in a QThreadPool; it announces its
+  stages (parse, geocode, html, write) with job.set_stage() and reports
+  progress with job.progress(done, total)
+- Stages, progress, result and errors reach the GUI thread as Qt signals
+  (queued connections); progress signals are throttled to whole percents
+- job.cancel() makes the next job.progress()/job.check() raise JobCancelled
+  inside the worker, so the work stops at the next progress report
+- JobRunner keeps one job per kind: submitting a new job cancels the
+  running one of the same kind, whose results are then ignored
+Widgets must not be touched in work(); the result is handed to on_done,
+which runs on the GUI thread.
+"""
+
+import logging
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+# Stages of the pipeline (status texts: i18n keys "job_stage_<stage>")
+STAGE_PARSE = "parse"
+STAGE_GEOCODE = "geocode"
+STAGE_HTML = "html"
+STAGE_WRITE = "write"
+STAGES = (STAGE_PARSE, STAGE_GEOCODE, STAGE_HTML, STAGE_WRITE)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job after it was cancelled."""
+
+
+class Job(QObject):
+    """
+    One unit of background work.
+
+    Signals:
+        stage_changed(str): A new stage started.
+        progress_changed(int, int): done, total of the current stage.
+        finished(object): Return value of work(job).
+        failed(str): Error message if work(job) raised.
+        cancelled(): The job stopped after cancel().
+    """
+
+    stage_changed = Signal(str)
+    progress_changed = Signal(int, int)
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+    def __init__(self, kind, work):
+        super().__init__()
+        self.kind = kind
+        self.work = work
+        self.stage = None
+        self._cancel = threading.Event()
+        self._last_percent = None
+
+    def cancel(self):
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """Raise JobCancelled if the job was cancelled (call between steps)."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def set_stage(self, stage):
+        self.check()
+        self.stage = stage
+        self._last_percent = None
+        self.stage_changed.emit(stage)
+
+    def progress(self, done, total):
+        """Progress callback for the work functions (done, total); also the cancellation point."""
+        self.check()
+        percent = int(done * 100 / total) if total else 100
+        # Only whole percents, a signal per QSO would flood the GUI event queue
+        if percent != self._last_percent:
+            self._last_percent = percent
+            self.progress_changed.emit(int(done), int(total))
+
+    def run(self):
+        """Run the work function (on the worker thread) and emit the outcome."""
+        try:
+            self.check()
+            result = self.work(self)
+            self.check()
+        except JobCancelled:
+            logging.info(f"Job '{self.kind}' cancelled (stage: {self.stage})")
+            self.cancelled.emit()
+        except Exception as e:
+            logging.error(f"Job '{self.kind}' failed (stage: {self.stage}): {e}")
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(result)
+
+
+class _JobRunnable(QRunnable):
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.setAutoDelete(True)
+
+    def run(self):
+        self.job.run()
+
+
+class JobRunner(QObject):
+    """
+    Starts jobs on a thread pool, one job per kind. A new job of a kind
+    supersedes (cancels) the running one; only the current job of a kind
+    reaches the callbacks.
+
+    Signals:
+        stage_changed(str, str): kind, stage of a current job.
+        progress_changed(str, int, int): kind, done, total of a current job.
+        busy_changed(bool): Whether any job is running.
+    """
+
+    stage_changed = Signal(str, str)
+    progress_changed = Signal(str, int, int)
+    busy_changed = Signal(bool)
+
+    def __init__(self, parent=None, max_threads=2):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._jobs = {}
+
+    def current(self, kind):
+        return self._jobs.get(kind)
+
+    def is_busy(self):
+        return bool(self._jobs)
+
+    def submit(self, kind, work, on_done=None, on_failed=None, on_cancelled=None):
+        """
+        Run work(job) in the background, cancelling the running job of the same kind.
+
+        Args:
+            kind (str): Job kind, e.g. "load" or "export".
+            work (callable): Called with the Job on a worker thread; returns the result.
+            on_done (callable): Called with the result on the GUI thread.
+            on_failed (callable): Called with the error message on the GUI thread.
+            on_cancelled (callable): Called on the GUI thread if the job was cancelled
+                (not if it was superseded by a newer job).
+
+        Returns:
+            The Job.
+        """
+        was_busy = self.is_busy()
+        self._drop(kind)
+        job = Job(kind, work)
+        self._jobs[kind] = job
+
+        job.stage_changed.connect(lambda stage: self._if_current(job, self.stage_changed.emit, kind, stage))
+        job.progress_changed.connect(
+            lambda done, total: self._if_current(job, self.progress_changed.emit, kind, done, total)
+        )
+        job.finished.connect(lambda result: self._end(job, on_done, result))
+        job.failed.connect(lambda message: self._end(job, on_failed, message))
+        job.cancelled.connect(lambda: self._end(job, on_cancelled))
+
+        if not was_busy:
+            self.busy_changed.emit(True)
+        self.pool.start(_JobRunnable(job))
+        return job
+
+    def cancel(self, kind=None):
+        """Cancel the job of a kind (None: all jobs); its callbacks are not called any more."""
+        was_busy = self.is_busy()
+        self._drop(kind)
+        if was_busy and not self.is_busy():
+            self.busy_changed.emit(False)
+
+    def request_cancel(self, kind=None):
+        """Ask the job of a kind (None: all jobs) to stop; its on_cancelled callback is still called."""
+        for k, job in self._jobs.items():
+            if kind is None or k == kind:
+                job.cancel()
+
+    def wait(self, msecs=-1):
+        """Wait for the worker threads (e.g. before the application quits)."""
+        return self.pool.waitForDone(msecs)
+
+    def _drop(self, kind):
+        for k in list(self._jobs) if kind is None else [kind]:
+            job = self._jobs.pop(k, None)
+            if job:
+                job.cancel()
+
+    def _if_current(self, job, emit, *args):
+        if self._jobs.get(job.kind) is job:
+            emit(*args)
+
+    def _end(self, job, callback, *args):
+        if self._jobs.get(job.kind) is not job:
+            # Superseded or cancelled by a newer job: drop the stale result
+            return
+        del self._jobs[job.kind]
+        if not self._jobs:
+            self.busy_changed.emit(False)
+        if callback:
+            callback(*args)
@@ -4,18 +4,30 @@ from PySide6.QtWidgets import (
     QMainWindow, QFileDialog, QMessageBox, QToolBar
 )
 from PySide6.QtGui import QAction, QIcon
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtWidgets import QApplication
 from gui.status_bar import StatusBar
 from gui.config_dialog import ConfigDialog
 from gui.map_preview import MapPreview
 from gui.auto_msgboxes import AutoCloseInfoBox
+from gui.jobs import JobRunner, JobCancelled, STAGE_PARSE, STAGE_GEOCODE, STAGE_HTML, STAGE_WRITE
 from core.config_manager import ConfigManager
 from core.i18n import I18n
-from utils.adif_parser import parse_adif
-from utils.kml_export import export_qsos_to_kml
+from utils.qso_store import QSOStore
+from utils.qso_database import QSODatabase, DEFAULT_DB_PATH, database_filters
+from utils.adif_import import import_adif_files
+from utils.adif_follow import AdifFollower
+from utils.kml_export import KmlAppender
+from utils.exporters import EXPORTERS, export_qsos
+from utils.kml_tiles import export_qsos_to_kmz_tiles
+from utils.qso_groups import AGGREGATE_OFF
+from utils.render_plan import as_render_plan
 from utils.app_utils import get_app_stylesheet
 
+# Job kinds: a new job of a kind supersedes the running one
+JOB_LOAD = "load"
+JOB_EXPORT = "export"
+
 class MainWindow(QMainWindow):
     """
     Main application window for QSOMap2KML.
@@ -31,6 +43,19 @@ class MainWindow(QMainWindow):
         self.map_preview = MapPreview(self, self.i18n)
         self.setCentralWidget(self.map_preview)
         self.qsos = []
+        # Stores appended by follow mode, merged into self.qsos only when needed (see _all_qsos)
+        self._follow_parts = []
+        # Import, map rendering and export run in the background (gui.jobs)
+        self.jobs = JobRunner(self)
+        self.jobs.stage_changed.connect(self._job_stage)
+        self.jobs.progress_changed.connect(lambda kind, done, total: self.status_bar.show_progress(done, total))
+        self.jobs.busy_changed.connect(self.status_bar.set_busy)
+        self.status_bar.cancel_requested.connect(self.jobs.request_cancel)
+        # Follow mode (live log)
+        self.follower = None
+        self.follow_kml = None
+        self.follow_timer = QTimer(self)
+        self.follow_timer.timeout.connect(self.poll_follow)
         self._create_actions()
         self._create_menu()
         self._create_toolbar()
@@ -50,6 +75,21 @@ class MainWindow(QMainWindow):
         self.export_kml_action_menu.triggered.connect(self.export_kml)
         self.export_kml_action_menu.setEnabled(bool(self.qsos))
 
+        self.open_folder_action_menu = QAction(self._icon("Upload image.png"), self.i18n.t("menu_open_folder"), self)
+        self.open_folder_action_menu.setToolTip(self.i18n.t("tooltip_open_folder"))
+        self.open_folder_action_menu.triggered.connect(self.open_folder)
+
+        self.follow_action_menu = QAction(self._icon("Flow block.png"), self.i18n.t("menu_follow_log"), self)
+        self.follow_action_menu.setToolTip(self.i18n.t("tooltip_follow_log"))
+        self.follow_action_menu.setCheckable(True)
+        self.follow_action_menu.setChecked(self.follower is not None)
+        self.follow_action_menu.toggled.connect(self.toggle_follow)
+
+        self.show_database_action_menu = QAction(self._icon("Flow block.png"), self.i18n.t("menu_show_database"), self)
+        self.show_database_action_menu.setToolTip(self.i18n.t("tooltip_show_database"))
+        self.show_database_action_menu.triggered.connect(self.show_database)
+        self.show_database_action_menu.setVisible(ConfigManager.load().get("use_database", False))
+
         self.exit_action_menu = QAction(self._icon("Close.png"), self.i18n.t("menu_exit"), self)
         self.exit_action_menu.setToolTip(self.i18n.t("tooltip_exit"))
         self.exit_action_menu.triggered.connect(self.close)
@@ -92,6 +132,9 @@ class MainWindow(QMainWindow):
         # File menu
         file_menu = menubar.addMenu(self.i18n.t("menu_file"))
         file_menu.addAction(self.open_action_menu)
+        file_menu.addAction(self.open_folder_action_menu)
+        file_menu.addAction(self.follow_action_menu)
+        file_menu.addAction(self.show_database_action_menu)
         file_menu.addAction(self.export_kml_action_menu)
         file_menu.addSeparator()
         file_menu.addAction(self.exit_action_menu)
@@ -116,32 +159,276 @@ class MainWindow(QMainWindow):
         toolbar.addAction(self.exit_action_toolbar)
 
     def open_adif(self):
-        file, _ = QFileDialog.getOpenFileName(
+        files, _ = QFileDialog.getOpenFileNames(
             self,
             self.i18n.t("dialog_open_adif_title"),
             "",
             self.i18n.t("dialog_open_adif_filter")
         )
-        if file:
-            self.status_bar.showMessage(self.i18n.t("status_loading_adif"))
-            try:
-                qsos = parse_adif(file)
-                self.qsos = qsos
+        if files:
+            self.load_files(files)
 
-                def progress(idx, total):
-                    self.status_bar.show_progress(idx, total)
+    def open_folder(self):
+        folder = QFileDialog.getExistingDirectory(
+            self,
+            self.i18n.t("dialog_open_folder_title"),
+            ""
+        )
+        if folder:
+            self.load_files([folder])
 
-                self.map_preview.show_qsos(qsos, progress_callback=progress)
-                self.status_bar.hide_progress()
-                self.status_bar.showMessage(self.i18n.t("status_loaded_adif").format(count=len(qsos)))
-                logging.info(f"Loaded ADIF file: {file} ({len(qsos)} QSOs)")
-                self.export_kml_action_menu.setEnabled(True)
-                self.export_kml_action_toolbar.setEnabled(True)
-            except Exception as e:
-                self.status_bar.hide_progress()
-                self.status_bar.showMessage(self.i18n.t("status_error_adif"))
-                logging.error(f"Error loading ADIF file: {file} - {e}")
-                QMessageBox.critical(self, "Error", str(e))
+    def load_files(self, paths):
+        """
+        Load one ADIF file, or several files/folders in parallel with duplicate removal.
+        Parsing and map rendering run as a background job; a new load cancels it.
+        """
+        if self.follower:
+            self.follow_action_menu.setChecked(False)
+        self.status_bar.showMessage(self.i18n.t("status_loading_adif"))
+        config = ConfigManager.load()
+
+        def work(job):
+            job.set_stage(STAGE_PARSE)
+            qsos, message, report = self._read_qsos(paths, config, job.progress)
+            return qsos, self._render_map(job, qsos), message, report
+
+        def done(result):
+            qsos, page, message, report = result
+            self._set_qsos(qsos)
+            self._show_map(page)
+            self.status_bar.showMessage(message)
+            logging.info(f"Loaded ADIF: {', '.join(paths)} ({len(qsos)} QSOs)")
+            if report:
+                self._show_import_report(report)
+
+        def failed(error):
+            self.status_bar.hide_progress()
+            self.status_bar.showMessage(self.i18n.t("status_error_adif"))
+            logging.error(f"Error loading ADIF file: {', '.join(paths)} - {error}")
+            QMessageBox.critical(self, "Error", error)
+
+        self.jobs.submit(JOB_LOAD, work, done, failed, self._job_cancelled)
+
+    def _read_qsos(self, paths, config, progress_callback=None):
+        """Parse the files (worker thread); returns (qsos, status message, import report or None)."""
+        use_database = config.get("use_database", False)
+        report = None
+        if len(paths) == 1 and os.path.isfile(paths[0]):
+            file = paths[0]
+            if use_database:
+                # Incremental import: only new QSOs are added, the map shows the database (settings filter)
+                with QSODatabase(config.get("database_path", DEFAULT_DB_PATH)) as db:
+                    added, skipped = db.import_adif(file)
+                    qsos = db.query(**database_filters(config))
+                    total = db.count()
+                message = self.i18n.t("status_db_imported").format(added=added, skipped=skipped, count=total)
+            else:
+                qsos = QSOStore.load_adif(file, use_cache=config.get("adif_cache", True))
+                message = self.i18n.t("status_loaded_adif").format(count=len(qsos))
+        else:
+            qsos, report = import_adif_files(
+                paths, max_workers=config.get("import_workers"), progress_callback=progress_callback
+            )
+            message = self.i18n.t("status_loaded_adif").format(count=len(qsos))
+            if use_database:
+                with QSODatabase(config.get("database_path", DEFAULT_DB_PATH)) as db:
+                    added, skipped = db.import_qsos(qsos)
+                    qsos = db.query(**database_filters(config))
+                    total = db.count()
+                message = self.i18n.t("status_db_imported").format(added=added, skipped=skipped, count=total)
+        return qsos, message, report
+
+    def _show_import_report(self, report):
+        lines = []
+        for file, entry in report.items():
+            if "error" in entry:
+                lines.append(self.i18n.t("import_report_error").format(file=os.path.basename(file), error=entry["error"]))
+            else:
+                lines.append(self.i18n.t("import_report_line").format(file=os.path.basename(file), **entry))
+        QMessageBox.information(self, self.i18n.t("import_report_title"), "\n".join(lines))
+
+    def toggle_follow(self, checked):
+        if checked:
+            self.start_follow()
+        else:
+            self.stop_follow()
+
+    def start_follow(self):
+        """
+        Follow a live ADIF file: load it once, then poll for appended QSOs and
+        push only those to the map and (optionally) to a KML file.
+        """
+        file, _ = QFileDialog.getOpenFileName(
+            self,
+            self.i18n.t("dialog_follow_log_title"),
+            "",
+            self.i18n.t("dialog_open_adif_filter")
+        )
+        if not file:
+            self.follow_action_menu.setChecked(False)
+            return
+        kml_file, _ = QFileDialog.getSaveFileName(
+            self,
+            self.i18n.t("dialog_follow_kml_title"),
+            "QSO-Live",
+            "KML (*.kml)"
+        )
+        try:
+            config = ConfigManager.load()
+            self.follower = AdifFollower(file)
+            qsos = QSOStore.from_records(self.follower.poll())
+            if kml_file:
+                lang = self.i18n.lang if hasattr(self.i18n, "lang") else "en"
+                self.follow_kml = KmlAppender(
+                    kml_file, config.get("my_grid"), config.get("bands_colors", {}), config.get("modes_colors", {}),
+                    i18n=self.i18n, lang=lang
+                )
+                self.follow_kml.append(qsos)
+
+            def start_polling():
+                # Only after the first map is shown, appended QSOs are drawn onto it
+                if self.follower:
+                    self.follow_timer.start(config.get("follow_interval_ms", 2000))
+                    self.status_bar.showMessage(
+                        self.i18n.t("status_following").format(file=os.path.basename(file), count=len(qsos))
+                    )
+
+            self._display_qsos(qsos, on_shown=start_polling)
+            logging.info(f"Following ADIF file: {file} ({len(qsos)} QSOs)")
+        except Exception as e:
+            logging.error(f"Error following ADIF file: {file} - {e}")
+            QMessageBox.critical(self, "Error", str(e))
+            self.follow_action_menu.setChecked(False)
+
+    def stop_follow(self):
+        self.follow_timer.stop()
+        if self.follower:
+            logging.info(f"Stopped following ADIF file: {self.follower.filepath}")
+        self.follower = None
+        self.follow_kml = None
+
+    def poll_follow(self):
+        if not self.follower:
+            return
+        try:
+            new_qsos = self.follower.poll()
+            if not new_qsos:
+                return
+            new_store = QSOStore.from_records(new_qsos)
+            # Not merged per poll: copying the whole log would make every poll O(log size)
+            self._follow_parts.append(new_store)
+            if self.follow_kml:
+                self.follow_kml.append(new_store)
+            count = len(self.qsos) + sum(len(part) for part in self._follow_parts)
+            message = self.i18n.t("status_follow_update").format(new=len(new_store), count=count)
+            if ConfigManager.load().get("aggregate_mode", AGGREGATE_OFF) == AGGREGATE_OFF:
+                self.map_preview.add_qsos(new_store)
+                self.status_bar.showMessage(message)
+            else:
+                # Groups change with every QSO, redraw in the background (a newer poll supersedes it)
+                self._redraw_map(
+                    self._all_qsos(), on_shown=lambda: self.status_bar.showMessage(message), view=self.map_preview.view
+                )
+        except Exception as e:
+            logging.error(f"Error following ADIF file: {self.follower.filepath} - {e}")
+            self.follow_action_menu.setChecked(False)
+
+    def show_database(self):
+        if self.follower:
+            self.follow_action_menu.setChecked(False)
+        config = ConfigManager.load()
+
+        def work(job):
+            job.set_stage(STAGE_PARSE)
+            with QSODatabase(config.get("database_path", DEFAULT_DB_PATH)) as db:
+                qsos = db.query(**database_filters(config))
+                total = db.count()
+            return qsos, total, self._render_map(job, qsos)
+
+        def done(result):
+            qsos, total, page = result
+            self._set_qsos(qsos)
+            self._show_map(page)
+            self.status_bar.showMessage(self.i18n.t("status_db_shown").format(count=len(qsos), total=total))
+            logging.info(f"Loaded QSO database ({len(qsos)} of {total} QSOs)")
+
+        def failed(error):
+            self.status_bar.hide_progress()
+            self.status_bar.showMessage(self.i18n.t("status_error_adif"))
+            logging.error(f"Error loading QSO database: {error}")
+            QMessageBox.critical(self, "Error", error)
+
+        self.jobs.submit(JOB_LOAD, work, done, failed, self._job_cancelled)
+
+    def _display_qsos(self, qsos, on_shown=None):
+        """Show a QSOStore on the map (rendered in the background) and enable the export."""
+        self._set_qsos(qsos)
+        self._redraw_map(qsos, on_shown)
+
+    def refresh_map(self):
+        """
+        Apply changed settings to the map: colors and language in place (canvas
+        page), anything else by rebuilding the page in the background at the current view.
+        """
+        self.map_preview.configure_tiles()
+        if not self.qsos:
+            # Base map may have changed
+            self.map_preview.show_empty_map()
+            return
+        if self.map_preview.restyle():
+            return
+        self._redraw_map(self._all_qsos(), view=self.map_preview.view)
+
+    def _redraw_map(self, qsos, on_shown=None, view=None):
+        """Render QSOs as a background job and show them; on_shown is called afterwards."""
+        def done(page):
+            self._show_map(page)
+            if on_shown:
+                on_shown()
+
+        def failed(error):
+            self.status_bar.hide_progress()
+            logging.error(f"Error displaying QSOs on map: {error}")
+
+        self.jobs.submit(JOB_LOAD, lambda job: self._render_map(job, qsos, view), done, failed, self._job_cancelled)
+
+    def _set_qsos(self, qsos):
+        self.qsos = qsos
+        self._follow_parts = []
+        self.export_kml_action_menu.setEnabled(True)
+        self.export_kml_action_toolbar.setEnabled(True)
+
+    def _all_qsos(self):
+        """The log shown including the QSOs followed since the last merge (one copy per merge, not per poll)."""
+        if self._follow_parts:
+            self.qsos = QSOStore.concat([self.qsos] + self._follow_parts)
+            self._follow_parts = []
+        return self.qsos
+
+    def _render_map(self, job, qsos, view=None):
+        """Geocode and build the map page (worker thread); returns the page for _show_map()."""
+        job.set_stage(STAGE_GEOCODE)
+        plan = self.map_preview.plan_for(qsos)
+        job.set_stage(STAGE_HTML)
+        return self.map_preview.build_html(plan, progress_callback=job.progress, view=view)
+
+    def _show_map(self, page):
+        self.map_preview.show_html(*page)
+        self.status_bar.hide_progress()
+
+    def _job_stage(self, kind, stage):
+        self.status_bar.show_stage(self.i18n.t(f"job_stage_{stage}"))
+
+    def _job_cancelled(self):
+        self.status_bar.hide_progress()
+        self.status_bar.showMessage(self.i18n.t("status_job_cancelled"))
+
+    def closeEvent(self, event):
+        # Laufende Jobs abbrechen und auf die Worker-Threads warten
+        self.jobs.cancel()
+        self.jobs.wait()
+        self.map_preview.close_tiles()
+        super().closeEvent(event)
 
     def open_config(self):
         dialog = ConfigDialog(self, self.i18n)
@@ -165,32 +452,80 @@ class MainWindow(QMainWindow):
         self.status_bar.showMessage(self.i18n.t("ready"))
 
     def export_kml(self):
-        file, _ = QFileDialog.getSaveFileName(
+        tiled_filter = self.i18n.t("dialog_export_filter_tiled")
+        filters = {
+            "KML (*.kml)": ".kml",
+            "KMZ (*.kmz)": ".kmz",
+            tiled_filter: ".kmz",
+            self.i18n.t("dialog_export_filter_geojsonl"): ".geojsonl",
+            "CSV (*.csv)": ".csv",
+        }
+        file, selected_filter = QFileDialog.getSaveFileName(
             self,
             self.i18n.t("dialog_export_kml_title"),
             "QSO-Export",
-            "KML (*.kml)"
+            ";;".join(filters)
         )
         if file:
+            # Format by extension, or by the selected filter if the name has none of ours
+            ext = os.path.splitext(file)[1].lower()
+            if ext not in EXPORTERS:
+                ext = filters.get(selected_filter, ".kml")
+                file += ext
+            tiled = selected_filter == tiled_filter and ext == ".kmz"
+            options = {}
+            if tiled:
+                # Large logs: quadtree of tiles with level of detail (own aggregation)
+                export = export_qsos_to_kmz_tiles
+            else:
+                # KML/KMZ (streamed, KMZ with the marker icon bundled), GeoJSON lines or CSV
+                export = export_qsos
             from core.config_manager import ConfigManager
             config = ConfigManager.load()
+            if not tiled:
+                options["aggregate"] = config.get("aggregate_mode", AGGREGATE_OFF)
+                # Placemarks rendered in a process pool (None = one worker per CPU)
+                options["max_workers"] = config.get("export_workers")
             my_locator = config.get("my_grid")
             band_colors = config.get("bands_colors", {})
             mode_colors = config.get("modes_colors", {})
             lang = self.i18n.lang if hasattr(self.i18n, "lang") else "en"
-            def progress(idx, total):
-                self.status_bar.show_progress(idx, total)        
-                    
-            export_qsos_to_kml(
-                self.qsos, file, my_locator, band_colors, mode_colors,
-                i18n=self.i18n, lang=lang, progress_callback=progress
-            )
-            
-            self.status_bar.hide_progress() 
-            self.status_bar.showMessage(self.i18n.t("ready"))
-            AutoCloseInfoBox(
-                self,
-                self.i18n.t("export_kml_title"),
-                self.i18n.t("status_kml_exported"),
-                os.path.join(os.path.dirname(__file__), "../resources/icons/Ok.png")
-            ).exec()
+            radius = config.get("area_radius_km", 0)
+            # Reuse the preview's render plan if it was built for this log and these settings
+            log = self._all_qsos()
+            plan = self.map_preview.render_plan
+            qsos = plan if plan is not None and plan.source is log else log
+
+            def work(job):
+                job.set_stage(STAGE_GEOCODE)
+                plan = as_render_plan(qsos, my_locator, band_colors, mode_colors, lang, radius)
+                job.set_stage(STAGE_WRITE)
+                try:
+                    export(
+                        plan, file if tiled else [file], my_locator, band_colors, mode_colors,
+                        i18n=self.i18n, lang=lang, progress_callback=job.progress,
+                        area_radius_km=radius, **options
+                    )
+                except JobCancelled:
+                    # Keine halb geschriebene Datei liegen lassen
+                    if os.path.exists(file):
+                        os.remove(file)
+                    raise
+                return file
+
+            def done(_file):
+                self.status_bar.hide_progress()
+                self.status_bar.showMessage(self.i18n.t("ready"))
+                AutoCloseInfoBox(
+                    self,
+                    self.i18n.t("export_kml_title"),
+                    self.i18n.t("status_kml_exported"),
+                    os.path.join(os.path.dirname(__file__), "../resources/icons/Ok.png")
+                ).exec()
+
+            def failed(error):
+                self.status_bar.hide_progress()
+                self.status_bar.showMessage(self.i18n.t("status_error_export"))
+                QMessageBox.critical(self, "Error", error)
+
+            self.jobs.submit(JOB_EXPORT, work, done, failed, self._job_cancelled)
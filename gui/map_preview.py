@@ -1,92 +1,375 @@
 from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtWebChannel import QWebChannel
+from PySide6.QtCore import QObject, Slot
 import folium
 import logging
+from html import escape
+import json
+import sqlite3
 from folium.plugins import BeautifyIcon
 from folium import Element
-from utils.grid_locator import locator_to_latlon
-from utils.kml_export import format_adif_date, format_adif_time
+import numpy as np
+from utils.render_plan import RenderPlan, as_render_plan
+from utils.kml_export import group_popup
+from utils.qso_groups import AGGREGATE_OFF, AGGREGATE_GRID_BAND, group_qsos
+from utils.clustering import CLUSTER_MAX_ZOOM
+from utils.view_tiles import DETAIL_ZOOM, ViewTiles, plan_clusters
 from utils.app_utils import call_progress
 from core.config_manager import ConfigManager
+from utils.tile_cache import DEFAULT_CACHE_MB, DEFAULT_CACHE_PATH, TileCache
+from utils.tile_providers import DEFAULT_PROVIDER, get_provider
+from gui.map_scheme import (
+    STATIC_URL, TILES_URL, QWEBCHANNEL_SCRIPT, MapPage, MapSchemeHandler, PageFolder, TileServer, data_script
+)
+
+DEFAULT_TOOLTIP = (
+    "Call: {call}\nBand: {band}\nMode: {mode}\nName: {name}\nDate: {date}\nTime: {time}"
+    "\nDistance: {distance} km\nBearing: {bearing}°"
+)
+DEFAULT_CLUSTER_TOOLTIP = "<b>{count} QSOs</b><br>Bands: {bands}<br>Modes: {modes}"
+DEFAULT_COLOR = "#3388ff"
+
+# Values of the "map_render_mode" setting: folium markers per QSO, one
+# canvas layer fed from a compact JSON payload, or the canvas layer loading
+# the tiles in view on demand (auto: canvas for large logs, lazy for huge ones)
+RENDER_AUTO = "auto"
+RENDER_MARKERS = "markers"
+RENDER_CANVAS = "canvas"
+RENDER_LAZY = "lazy"
+RENDER_MODES = (RENDER_AUTO, RENDER_MARKERS, RENDER_CANVAS, RENDER_LAZY)
+CANVAS_MIN_QSOS = 2000
+LAZY_MIN_QSOS = 200000
+# Canvas layer: static drawing code (resources/web) and the per-page QSO data file
+CANVAS_SCRIPT = "qso_canvas.js"
+CANVAS_DATA_FILE = "qsos.js"
+CANVAS_CALL = """
+document.addEventListener("DOMContentLoaded", function() { qsoCanvas(%s, QSO_DATA); });
+"""
+# Page script of every map (reports the view over QWebChannel, see resources/web/qso_page.js)
+PAGE_SCRIPT = "qso_page.js"
+PAGE_CALL = """
+document.addEventListener("DOMContentLoaded", function() { qsoPage(%s); });
+"""
+LEGEND_ID = "qso-legend"
+DEFAULT_VIEW = (51, 10, 4)
+# Settings that shape a page; if only colors or the language change, the page is restyled in place
+PAGE_SETTINGS = {
+    "my_grid": "",
+    "my_name": "",
+    "area_radius_km": 0,
+    "aggregate_mode": AGGREGATE_OFF,
+    "map_render_mode": RENDER_AUTO,
+    "map_clustering": True,
+    "map_tiles": DEFAULT_PROVIDER,
+    "tile_cache": True,
+}
+
+
+class MapBridge(QObject):
+    """Python side of the page (QWebChannel object "qsoBridge")."""
+
+    def __init__(self, preview):
+        super().__init__(preview)
+        self.preview = preview
+
+    @Slot(float, float, float)
+    def viewChanged(self, lat, lon, zoom):
+        # Center and zoom after every pan/zoom, a rebuilt page of the same log opens there
+        self.preview.view = (lat, lon, zoom)
+
+    @Slot(int, int, str, result=str)
+    def loadTiles(self, token, zoom, tiles):
+        # Lazy page: content of the tiles in view, answered to the page's callback
+        return self.preview.load_tiles(token, zoom, tiles)
+
 
 class MapPreview(QWebEngineView):
     """
-    Zeigt eine Karte mit QSOs und Linien vom eigenen Standort zu jedem QSO-Partner.
+    Zeigt eine Karte mit QSOs und Großkreis-Linien vom eigenen Standort zu jedem QSO-Partner.
     Die Linienfarbe wird pro Band aus der Konfiguration genommen.
     Die Markerfarbe wird pro Mode aus der Konfiguration genommen (BeautifyIcon, beliebige Farbe).
-    Tooltip beim Hover zeigt QSO-Infos (i18n).
+    Tooltip beim Hover zeigt QSO-Infos inkl. Entfernung/Richtung (i18n).
+    Die Legende zeigt zusätzlich ODX pro Band/Mode, eine Richtungsrose und ein Entfernungshistogramm.
+    Optional ein Marker/eine Linie pro Locatorfeld (und Band) statt pro QSO.
+    Große Logs werden als ein kompaktes JSON-Paket auf einem Canvas gezeichnet
+    (Kreismarker, eine Linie pro Locatorfeld und Band) statt als folium-Marker,
+    bei kleinem Zoom als vorberechnete Cluster mit Anzahl und Band/Mode-Aufteilung.
+    Sehr große Logs lädt die Seite kachelweise nach (nur die sichtbaren Cluster/QSOs).
     """
     def __init__(self, parent=None, i18n=None):
         super().__init__(parent)
         self.i18n = i18n
+        self._map_name = None
+        # RenderPlan of the map shown, reused by the exports
+        self.render_plan = None
+        # Settings the page shown was built with (see PAGE_SETTINGS) and its current view (lat, lon, zoom)
+        self._page_layout = None
+        self.view = None
+        # ViewTiles of a lazily loaded page
+        self._view_tiles = None
+        self._bridge = MapBridge(self)
+        self._channel = QWebChannel(self)
+        self._channel.registerObject("qsoBridge", self._bridge)
+        self.page().setWebChannel(self._channel)
+        # Pages are loaded by URL (qsomap:// from memory, else temporary files), setHtml() is capped at 2 MB
+        self._pages = MapSchemeHandler.install(self.page().profile()) or PageFolder()
+        self.configure_tiles()
         self.show_empty_map()
 
+    def _tooltip_template(self):
+        return self.i18n.t("qso_tooltip") if self.i18n else DEFAULT_TOOLTIP
+
+    def _qso_tooltip(self, call, band, mode, name, date, time, distance="-", bearing="-"):
+        return self._tooltip_template().format(
+            call=call,
+            band=band,
+            mode=mode,
+            name=name,
+            date=date,
+            time=time,
+            distance=distance,
+            bearing=bearing
+        )
+
+    @staticmethod
+    def _rose_svg(rose, size=150):
+        """Bearing rose as inline SVG: one wedge per sector, length by QSO count."""
+        peak = max(int(rose.max()), 1)
+        center = size / 2
+        sector = 2 * np.pi / len(rose)
+        wedges = []
+        for k, count in enumerate(rose):
+            r = (center - 2) * count / peak
+            a0, a1 = (k - 0.5) * sector, (k + 0.5) * sector
+            # Compass angles: 0 = north (up), clockwise
+            x0, y0 = center + r * np.sin(a0), center - r * np.cos(a0)
+            x1, y1 = center + r * np.sin(a1), center - r * np.cos(a1)
+            wedges.append(f'<path d="M{center},{center} L{x0:.1f},{y0:.1f} L{x1:.1f},{y1:.1f} Z" fill="#3388ff" fill-opacity="0.7"/>')
+        return (
+            f'<svg width="{size}" height="{size}" viewBox="0 0 {size} {size}">'
+            f'<circle cx="{center}" cy="{center}" r="{center - 2}" fill="none" stroke="grey"/>'
+            f'{"".join(wedges)}'
+            f'<text x="{center}" y="11" font-size="10" text-anchor="middle">N</text>'
+            '</svg>'
+        )
+
+    @staticmethod
+    def _histogram_svg(histogram, step_km, width=150, height=60):
+        """Distance histogram as inline SVG: one bar per step_km bin, height by QSO count."""
+        peak = max(int(histogram.max()), 1)
+        bar = width / len(histogram)
+        plot = height - 12
+        bars = []
+        for k, count in enumerate(histogram):
+            h = plot * count / peak
+            bars.append(f'<rect x="{k * bar:.1f}" y="{plot - h:.1f}" width="{max(bar - 1, 1):.1f}" height="{h:.1f}" fill="#3388ff" fill-opacity="0.7"/>')
+        return (
+            f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            f'{"".join(bars)}'
+            f'<line x1="0" y1="{plot}" x2="{width}" y2="{plot}" stroke="grey"/>'
+            f'<text x="0" y="{height - 1}" font-size="10">0</text>'
+            f'<text x="{width}" y="{height - 1}" font-size="10" text-anchor="end">{len(histogram) * step_km} km</text>'
+            '</svg>'
+        )
+
+    @staticmethod
+    def _path_locations(plan):
+        """Polyline locations per grid code of the plan (split at the antimeridian), built once per plan."""
+        return plan.derived("leaflet_paths", lambda: [
+            [part.tolist() for part in path] if path else None for path in plan.paths
+        ], shared=True)
+
+    def configure_tiles(self, config=None):
+        """Open, resize or close the offline tile cache of the base map (GUI thread, after settings changes)."""
+        config = config if config is not None else ConfigManager.load()
+        if not isinstance(self._pages, MapSchemeHandler):
+            # Pages loaded as files cannot reach qsomap://, tiles come from the tile servers
+            return
+        tiles = self._pages.tiles
+        max_mb = config.get("tile_cache_mb", DEFAULT_CACHE_MB)
+        if not config.get("tile_cache", True):
+            self.close_tiles()
+        elif tiles is None:
+            try:
+                self._pages.tiles = TileServer(TileCache(DEFAULT_CACHE_PATH, max_mb), self._pages)
+            except (OSError, sqlite3.Error) as e:
+                logging.error(f"Error opening tile cache {DEFAULT_CACHE_PATH}: {e}")
+        else:
+            tiles.cache.resize(max_mb)
+
+    def close_tiles(self):
+        """Close the tile cache, if open (writes the pending tile use times)."""
+        if isinstance(self._pages, MapSchemeHandler) and self._pages.tiles is not None:
+            self._pages.tiles.close()
+            self._pages.tiles = None
+
+    def _base_map(self, location, zoom, config):
+        """folium.Map with the configured base map, served from the tile cache if it is open."""
+        provider = get_provider(config.get("map_tiles", DEFAULT_PROVIDER))
+        if provider is None:
+            return folium.Map(location=location, zoom_start=zoom)
+        m = folium.Map(location=location, zoom_start=zoom, tiles=None)
+        if getattr(self._pages, "tiles", None) is not None:
+            url = f"{TILES_URL}{provider.name}/{{z}}/{{x}}/{{y}}"
+        else:
+            url = provider.leaflet_url()
+        folium.TileLayer(
+            tiles=url,
+            attr=provider.attribution,
+            name=provider.name,
+            min_zoom=provider.min_zoom,
+            max_zoom=provider.max_zoom,
+            subdomains="".join(provider.subdomains)
+        ).add_to(m)
+        return m
+
     def show_empty_map(self):
         try:
-            m = folium.Map(location=[51, 10], zoom_start=4)
-            html = m.get_root().render()
-            self.setHtml(html)
+            lat, lon, zoom = DEFAULT_VIEW
+            m = self._base_map([lat, lon], zoom, ConfigManager.load())
+            self.load(self._pages.publish(MapPage(m.get_root().render())))
             logging.info("Displayed empty map in MapPreview.")
         except Exception as e:
             logging.error(f"Error displaying empty map: {e}")
 
     def show_qsos(self, qsos, progress_callback=None):
         try:
-            config = ConfigManager.load()
-            my_grid = config.get("my_grid", "")
-            my_name = config.get("my_name", "")
-            my_pos = locator_to_latlon(my_grid)
-            band_colors = config.get("bands_colors", {})
-            mode_colors = config.get("modes_colors", {})
-            m = folium.Map(location=[51, 10], zoom_start=4)
-
-            # Marker für eigenen Standort (sofern gültig)
-            if my_pos:
-                folium.Marker(
-                    location=my_pos,
-                    popup=f"{my_name} ({my_grid})",
-                    icon=BeautifyIcon(
-                        icon_shape='star',
-                        border_color='red',
-                        text_color='white',
-                        background_color='red'
-                    )
-                ).add_to(m)
+            plan, page = self.build_html(qsos, progress_callback)
+            self.show_html(plan, page)
+        except Exception as e:
+            logging.error(f"Error displaying QSOs on map: {e}")
+
+    def show_html(self, plan, page):
+        """Load a MapPage of build_html() (GUI thread)."""
+        self.render_plan = plan
+        self._map_name = page.map_name
+        self._page_layout = page.layout
+        self._view_tiles = page.source
+        self.load(self._pages.publish(page))
+        logging.debug(f"Map page {page.size // 1024} KB")
+
+    def plan_for(self, qsos, config=None):
+        """RenderPlan of QSOs for the map settings (geocoding and distances; reused if it matches)."""
+        config = config if config is not None else ConfigManager.load()
+        lang = self.i18n.lang if hasattr(self.i18n, "lang") else "en"
+        return as_render_plan(
+            qsos, config.get("my_grid", ""), config.get("bands_colors", {}), config.get("modes_colors", {}),
+            lang, config.get("area_radius_km", 0)
+        )
+
+    def restyle(self, config=None):
+        """
+        Apply changed colors and language to the page shown in place: lines and
+        markers are recolored and tooltips use the new texts, zoom and position
+        are kept. Only for the canvas layer (large logs).
+
+        Returns:
+            False if the page has to be rebuilt (other settings changed or not a canvas page).
+        """
+        config = config if config is not None else ConfigManager.load()
+        plan, layout = self.render_plan, self._page_layout
+        if plan is None or not layout or not layout["canvas"]:
+            return False
+        if any(config.get(key, default) != layout[key] for key, default in PAGE_SETTINGS.items()):
+            return False
+        lang = self.i18n.lang if hasattr(self.i18n, "lang") else "en"
+        plan = plan.restyled(config.get("bands_colors", {}), config.get("modes_colors", {}), lang)
+        style = dict(self._canvas_texts(), colors=self._canvas_colors(plan), lang=lang)
+        self.page().runJavaScript(
+            f"{self._map_name}.qsoMap.setStyle({json.dumps(style)});"
+            f"document.getElementById({json.dumps(LEGEND_ID)}).innerHTML = {json.dumps(self._legend_html(plan))};"
+        )
+        self.render_plan = plan
+        logging.info("Map restyled in place (colors/language).")
+        return True
+
+    def build_html(self, qsos, progress_callback=None, view=None):
+        """
+        Render the map page of QSOs without touching the widget, so it can run
+        on a worker thread (see gui.jobs); show it with show_html().
+
+        Args:
+            qsos (RenderPlan, QSOStore or list): QSOs or their render plan.
+            progress_callback (callable): Called with (done, total), may raise to abort.
+            view (tuple): (lat, lon, zoom) to open the map at, e.g. the current
+                view when the same log is rebuilt (default: Europe).
+
+        Returns:
+            (plan, MapPage)
+        """
+        config = ConfigManager.load()
+        my_grid = config.get("my_grid", "")
+        my_name = config.get("my_name", "")
+        band_colors = config.get("bands_colors", {})
+        mode_colors = config.get("modes_colors", {})
+        plan = self.plan_for(qsos, config)
+        my_pos = plan.my_pos
+        files = {}
+        lat, lon, zoom = view or DEFAULT_VIEW
+        m = self._base_map([lat, lon], zoom, config)
+
+        # Marker für eigenen Standort (sofern gültig)
+        if my_pos:
+            folium.Marker(
+                location=my_pos,
+                popup=f"{my_name} ({my_grid})",
+                icon=BeautifyIcon(
+                    icon_shape='star',
+                    border_color='red',
+                    text_color='white',
+                    background_color='red'
+                )
+            ).add_to(m)
 
-            marker_count = 0
-            total = len(qsos) 
-            done = 0
+        store = plan.store
+        bands = store.column("band")
+        modes = store.column("mode")
+        path_locations = self._path_locations(plan)
+        stats = plan.stats
+        aggregate = config.get("aggregate_mode", AGGREGATE_OFF)
+        render_mode = config.get("map_render_mode", RENDER_AUTO)
+        clustering = config.get("map_clustering", True)
+        valid_count = int(plan.valid.sum())
+        use_lazy = render_mode == RENDER_LAZY or (render_mode == RENDER_AUTO and valid_count > LAZY_MIN_QSOS)
+        use_canvas = use_lazy or render_mode == RENDER_CANVAS or (
+            render_mode == RENDER_AUTO and valid_count > CANVAS_MIN_QSOS
+        )
+        source = None
 
-            for done, qso in enumerate(qsos):
+        marker_count = 0
+        total = len(store)
+
+        if aggregate != AGGREGATE_OFF:
+            marker_count = self._add_groups(m, plan, aggregate, progress_callback)
+        elif use_lazy:
+            source = ViewTiles(plan)
+            marker_count = self._add_lazy_layer(m, plan, source, files)
+        elif use_canvas:
+            marker_count = self._add_canvas_layer(m, plan, clustering, files)
+        else:
+            for i in range(total):
                 # Fortschritt melden
-                call_progress(progress_callback, done, total)
-                done += 1
-                grid = qso.get('gridsquare')
-                call = qso.get('call', 'Unknown').upper()
-                band = qso.get('band', '')
-                mode = qso.get('mode', '').upper()
-                name = qso.get('name', '')
-                date_raw = qso.get('date', '') or qso.get('qso_date', '')
-                time_raw = qso.get('time', '') or qso.get('time_on', '')
-                lang = self.i18n.lang if hasattr(self.i18n, "lang") else "en"
-                date = format_adif_date(date_raw, lang)
-                time = format_adif_time(time_raw)
-                pos = locator_to_latlon(grid) if grid else None
-
-                tooltip = self.i18n.t("qso_tooltip").format(
-                    call=call,
-                    band=band,
-                    mode=mode,
-                    name=name,
-                    date=date,
-                    time=time
-                ) if self.i18n else f"Call: {call}\nBand: {band}\nMode: {mode}\nName: {name}\nDate: {date}\nTime: {time}"
+                call_progress(progress_callback, i, total)
+                call = plan.calls[i] or 'UNKNOWN'
+                band = bands[i]
+                mode = modes[i]
+                name = plan.names[i]
+                date = plan.dates[i]
+                time = plan.times[i]
+                pos = (float(plan.lat[i]), float(plan.lon[i])) if plan.valid[i] else None
+
+                if stats:
+                    tooltip = self._qso_tooltip(call, band, mode, name, date, time,
+                                                stats.format_distance(i), stats.format_bearing(i))
+                else:
+                    tooltip = self._qso_tooltip(call, band, mode, name, date, time)
 
                 if pos:
                     line_color = band_colors.get(band, "#3388ff")
                     marker_color = mode_colors.get(mode, "#3388ff")
                     if my_pos:
                         folium.PolyLine(
-                            locations=[my_pos, pos],
+                            locations=path_locations[plan.grid_codes[i]],
                             color=line_color,
                             weight=2,
                             opacity=0.7
@@ -106,40 +389,328 @@ class MapPreview(QWebEngineView):
                     ).add_to(m)
                     marker_count += 1
 
-            # Nach dem letzten QSO: Fortschritt auf 100%
-            if progress_callback:
-                progress_callback(len(qsos), len(qsos))
+        # Nach dem letzten QSO: Fortschritt auf 100%
+        if progress_callback:
+            progress_callback(total, total)
+
+        if marker_count == 0:
+            folium.Marker(
+                location=[51, 10],
+                popup="No QSOs with valid locator"
+            ).add_to(m)
+            logging.info("No QSOs with valid locator to display on map.")
+        else:
+            logging.info(f"Displayed {marker_count} QSOs on map.")
+
+        legend_html = f"""
+        <div id="{LEGEND_ID}" style="
+            position: fixed; 
+            top: 10px; left: 10px; width: 180px; z-index:9999; 
+            background: white; border:2px solid grey; border-radius:6px; 
+            padding: 8px; font-size:12px; opacity: 0.9;">
+            {self._legend_html(plan)}
+        </div>
+        """         
+        m.get_root().html.add_child(Element(legend_html))  
+        self._add_page_script(m)
+
+        layout = {key: config.get(key, default) for key, default in PAGE_SETTINGS.items()}
+        layout["canvas"] = use_canvas and aggregate == AGGREGATE_OFF
+        return plan, MapPage(m.get_root().render(), m.get_name(), files, layout, source)
+
+    def _legend_html(self, plan):
+        """Content of the legend: colors per band and mode, ODX, bearing rose and distance histogram."""
+        band_legend = "<b>Bands:</b><br>"
+        for band, color in plan.band_colors.items():
+            band_legend += f'<i style="background:{color};width:12px;height:12px;display:inline-block;margin-right:4px"></i> {band}<br>'
+
+        # Legend for Modes
+        mode_legend = "<b>Modes:</b><br>"
+        for mode, color in plan.mode_colors.items():
+            mode_legend += f'<i style="background:{color};width:12px;height:12px;display:inline-block;margin-right:4px"></i> {mode}<br>'
+
+        # ODX, bearing rose and distance histogram
+        stats = plan.stats
+        stats_legend = ""
+        if stats and stats.odx_lines():
+            stats_legend = (
+                '<hr style="margin:4px 0;"><b>ODX:</b><br>'
+                + "".join(f"{escape(line)}<br>" for line in stats.odx_lines())
+                + self._rose_svg(stats.rose)
+                + "<br>" + self._histogram_svg(stats.histogram, stats.histogram_step_km)
+            )
+        return f'{band_legend}<hr style="margin:4px 0;">{mode_legend}{stats_legend}'
+
+    @staticmethod
+    def _add_page_script(m):
+        """Page script of every map: connects the page to MapBridge."""
+        m.get_root().header.add_child(Element(
+            f'<script src="{STATIC_URL}{QWEBCHANNEL_SCRIPT}"></script><script src="{STATIC_URL}{PAGE_SCRIPT}"></script>'
+        ))
+        m.get_root().script.add_child(Element(PAGE_CALL % m.get_name()))
+
+
+    def _canvas_payload(self, plan):
+        """
+        QSOs with a position as one compact JSON payload for the canvas layer:
+        columns instead of objects, repeated texts as lookup tables, and one
+        path per grid square plus the (grid, band) pairs that need a line.
+        Colors and texts are not part of it (see _canvas_colors/_canvas_texts).
+        """
+        drawn = np.flatnonzero(plan.valid)
+        store = plan.store
+        bands, modes = store.column("band"), store.column("mode")
+        band_codes = plan.band_codes[drawn]
+        grid_codes = plan.grid_codes[drawn]
+
+        def lookup(values):
+            table, codes = {}, []
+            for value in values:
+                codes.append(table.setdefault(value, len(table)))
+            return {"values": list(table), "codes": codes}
+
+        def rounded(values):
+            return [None if np.isnan(v) else int(v) for v in np.round(values)]
+
+        lines = []
+        paths = {}
+        if plan.my_pos and len(drawn):
+            pairs = np.unique(np.stack([grid_codes, band_codes], axis=1), axis=0)
+            for grid_code, band_code in pairs.tolist():
+                if plan.paths[grid_code]:
+                    paths[grid_code] = [np.round(part, 4).tolist() for part in plan.paths[grid_code]]
+                    lines.append([grid_code, band_code])
+        stats = plan.stats
+        dates = store.column("date")
+        return {
+            "lat": np.round(plan.lat[drawn], 5).tolist(),
+            "lon": np.round(plan.lon[drawn], 5).tolist(),
+            "band": band_codes.tolist(),
+            "mode": plan.mode_codes[drawn].tolist(),
+            "bands": list(bands.categories),
+            "modes": list(modes.categories),
+            "call": [plan.calls[i] or "UNKNOWN" for i in drawn],
+            "name": lookup(plan.names[i] for i in drawn),
+            # ADIF dates, formatted in the page (a language change needs no new data)
+            "date": lookup(dates[i] for i in drawn),
+            "time": lookup(plan.times[i] for i in drawn),
+            "distance": rounded(stats.distance[drawn]) if stats else [None] * len(drawn),
+            "bearing": rounded(stats.bearing[drawn]) if stats else [None] * len(drawn),
+            "paths": paths,
+            "lines": lines,
+        }
 
-            if marker_count == 0:
-                folium.Marker(
-                    location=[51, 10],
-                    popup="No QSOs with valid locator"
+    @staticmethod
+    def _cluster_payload(plan):
+        """Cluster levels 0..CLUSTER_MAX_ZOOM of the QSOs with a position, computed once per plan."""
+        def build():
+            levels = plan_clusters(plan)
+            return {
+                "maxZoom": CLUSTER_MAX_ZOOM,
+                "levels": [{
+                    "lat": np.round(level.lat, 5).tolist(),
+                    "lon": np.round(level.lon, 5).tolist(),
+                    "count": level.count.tolist(),
+                    "first": level.first.tolist(),
+                    "exp": level.expansion_zoom.tolist(),
+                    "bands": level.bands,
+                    "modes": level.modes,
+                } for level in levels],
+            }
+        return plan.derived("leaflet_clusters", build, shared=True)
+
+    @staticmethod
+    def _canvas_colors(plan):
+        """Line colors per band and marker colors per mode for the canvas layer."""
+        return {"bands": dict(plan.band_colors), "modes": dict(plan.mode_colors), "fallback": DEFAULT_COLOR}
+
+    def _canvas_texts(self):
+        """Tooltip templates of the canvas layer in the current language."""
+        return {
+            "template": escape(self._tooltip_template()).replace("\n", "<br>"),
+            "clusterTemplate": self.i18n.t("cluster_tooltip") if self.i18n else DEFAULT_CLUSTER_TOOLTIP,
+        }
+
+    def _add_canvas_layer(self, m, plan, clustering, files):
+        """
+        Fast mode: all QSOs drawn by Leaflet's canvas renderer (resources/web/qso_canvas.js),
+        optionally as precomputed clusters up to CLUSTER_MAX_ZOOM. The QSO data
+        is a file of its own next to the page (added to files), not part of the HTML.
+        """
+        payload = self._canvas_payload(plan)
+        data = dict(
+            self._canvas_texts(),
+            payload=payload,
+            clusters=self._cluster_payload(plan) if clustering and payload["lat"] else None,
+            colors=self._canvas_colors(plan),
+            lang=plan.lang,
+        )
+        self._add_canvas_script(m, data, files)
+        return len(payload["lat"])
+
+    def _add_lazy_layer(self, m, plan, source, files):
+        """
+        Lazy mode for huge logs: the canvas layer starts empty (only the band and
+        mode tables) and asks for the clusters or QSOs of the tiles in view over
+        QWebChannel (MapBridge.loadTiles -> utils.view_tiles), so the page has a
+        constant size. Always clustered up to CLUSTER_MAX_ZOOM.
+        """
+        store = plan.store
+        payload = {
+            "lat": [], "lon": [], "band": [], "mode": [], "call": [],
+            "bands": list(store.column("band").categories),
+            "modes": list(store.column("mode").categories),
+            "name": {"values": [], "codes": []},
+            "date": {"values": [], "codes": []},
+            "time": {"values": [], "codes": []},
+            "distance": [], "bearing": [], "paths": {}, "lines": [],
+        }
+        data = dict(
+            self._canvas_texts(),
+            payload=payload,
+            clusters=None,
+            lazy={"token": source.token, "maxZoom": CLUSTER_MAX_ZOOM, "detailZoom": DETAIL_ZOOM},
+            colors=self._canvas_colors(plan),
+            lang=plan.lang,
+        )
+        self._add_canvas_script(m, data, files)
+        return len(source.drawn)
+
+    @staticmethod
+    def _add_canvas_script(m, data, files):
+        """The canvas layer and its data file (QSO_DATA) on a page."""
+        files[CANVAS_DATA_FILE] = data_script("QSO_DATA", json.dumps(data, separators=(",", ":")))
+        m.get_root().header.add_child(Element(
+            f'<script src="{STATIC_URL}{CANVAS_SCRIPT}"></script><script src="{CANVAS_DATA_FILE}"></script>'
+        ))
+        m.get_root().script.add_child(Element(CANVAS_CALL % m.get_name()))
+
+    def load_tiles(self, token, zoom, tiles):
+        """
+        Answer a tile request of a lazy page (MapBridge.loadTiles, GUI thread).
+
+        Args:
+            token (int): Page token; requests of a page that was replaced get "null".
+            zoom (int): Zoom level of the map.
+            tiles (str): JSON list of [x, y] tiles.
+
+        Returns:
+            JSON text of ViewTiles.tiles().
+        """
+        source = self._view_tiles
+        if source is None or source.token != token:
+            return "null"
+        try:
+            return json.dumps(source.tiles(zoom, json.loads(tiles)), separators=(",", ":"))
+        except (ValueError, TypeError, IndexError) as e:
+            logging.error(f"Error loading map tiles {tiles} (zoom {zoom}): {e}")
+            return "null"
+
+    def _add_groups(self, m, plan, aggregate, progress_callback):
+        """Aggregation mode: one marker (with QSO count) and one line per grid square (and band)."""
+        groups = group_qsos(plan.store, by_band=aggregate == AGGREGATE_GRID_BAND)
+        path_locations = self._path_locations(plan)
+        for k, group in enumerate(groups):
+            call_progress(progress_callback, k, len(groups))
+            band = group.band if group.band is not None else group.dominant("band")
+            line_color = plan.band_colors.get(band, "#3388ff")
+            marker_color = plan.mode_colors.get(group.dominant("mode"), "#3388ff")
+            locations = path_locations[group.grid_code] if path_locations else None
+            if locations:
+                folium.PolyLine(
+                    locations=locations,
+                    color=line_color,
+                    weight=2,
+                    opacity=0.7
                 ).add_to(m)
-                logging.info("No QSOs with valid locator to display on map.")
-            else:
-                logging.info(f"Displayed {marker_count} QSOs on map.")
-
-            band_legend = "<b>Bands:</b><br>"
-            for band, color in band_colors.items():
-                band_legend += f'<i style="background:{color};width:12px;height:12px;display:inline-block;margin-right:4px"></i> {band}<br>'
-
-            # Legend for Modes
-            mode_legend = "<b>Modes:</b><br>"
-            for mode, color in mode_colors.items():
-                mode_legend += f'<i style="background:{color};width:12px;height:12px;display:inline-block;margin-right:4px"></i> {mode}<br>'
-
-            legend_html = f"""
-            <div style="
-                position: fixed; 
-                top: 10px; left: 10px; width: 180px; z-index:9999; 
-                background: white; border:2px solid grey; border-radius:6px; 
-                padding: 8px; font-size:12px; opacity: 0.9;">
-                {band_legend}<hr style="margin:4px 0;">{mode_legend}
-            </div>
-            """         
-            m.get_root().html.add_child(Element(legend_html))  
-            
-            html = m.get_root().render()
-            self.setHtml(html)
+            folium.Marker(
+                location=(group.lat, group.lon),
+                popup=folium.Popup(group_popup(group, plan, self.i18n), max_width=450),
+                tooltip=escape(f"{group.grid} ({len(group)})"),
+                icon=BeautifyIcon(
+                    icon_shape='marker',
+                    border_color=marker_color,
+                    background_color=marker_color,
+                    text_color='white',
+                    number=len(group)
+                )
+            ).add_to(m)
+        return len(groups)
+
+    def add_qsos(self, qsos):
+        """
+        Add QSOs to the map that is already shown (follow mode).
+        Only the new markers and lines are sent to the page via JavaScript,
+        the folium map is not rebuilt and zoom/position are kept. On a canvas
+        page the QSOs are appended to its data and shown at every zoom level
+        (also on lazy pages, whose tiles only hold the QSOs the page was built
+        with). The render plan is dropped, so the next settings change rebuilds
+        the page from the whole log instead of restyling a partial one.
+        """
+        if not self._map_name:
+            return
+        try:
+            config = ConfigManager.load()
+            lang = self.i18n.lang if hasattr(self.i18n, "lang") else "en"
+            # Plan for the new QSOs only (no area filter, as before)
+            plan = RenderPlan(qsos, config.get("my_grid", ""), config.get("bands_colors", {}),
+                              config.get("modes_colors", {}), lang)
+            stats = plan.stats
+            path_locations = self._path_locations(plan)
+            items = []
+            distance = np.round(stats.distance) if stats else None
+            bearing = np.round(stats.bearing) if stats else None
+            for i in np.flatnonzero(plan.valid):
+                qso = plan.store.record(i)
+                tooltip = self._qso_tooltip(
+                    qso["call"], qso["band"], qso["mode"], qso["name"], plan.dates[i], plan.times[i],
+                    *((stats.format_distance(i), stats.format_bearing(i)) if stats else ())
+                )
+                items.append({
+                    "lat": float(plan.lat[i]),
+                    "lon": float(plan.lon[i]),
+                    "path": path_locations[plan.grid_codes[i]] if path_locations else None,
+                    # Raw values for the canvas layer (tooltips from its template)
+                    "call": plan.calls[i] or "UNKNOWN",
+                    "band": qso["band"],
+                    "mode": qso["mode"],
+                    "name": plan.names[i],
+                    "date": qso["date"],
+                    "time": plan.times[i],
+                    "distance": None if stats is None or np.isnan(distance[i]) else int(distance[i]),
+                    "bearing": None if stats is None or np.isnan(bearing[i]) else int(bearing[i]),
+                    # Ready-made HTML for folium marker pages
+                    "popup": escape(qso["call"]),
+                    "label": qso["mode"] or "?",
+                    "tooltip": escape(tooltip).replace("\n", "<br>"),
+                    "line": plan.band_colors.get(qso["band"], "#3388ff"),
+                    "marker": plan.mode_colors.get(qso["mode"], "#3388ff"),
+                })
+            if not items:
+                return
+            js = f"""
+            (function(map, qsos) {{
+                if (map.qsoMap) {{
+                    // Canvas mode (see resources/web/qso_canvas.js)
+                    map.qsoMap.addQsos(qsos);
+                    return;
+                }}
+                qsos.forEach(function(q) {{
+                    if (q.path) {{
+                        L.polyline(q.path, {{color: q.line, weight: 2, opacity: 0.7}}).addTo(map);
+                    }}
+                    var icon = L.BeautifyIcon ? L.BeautifyIcon.icon({{
+                        iconShape: 'marker', borderColor: q.marker, backgroundColor: q.marker,
+                        textColor: 'white', isAlphaNumericIcon: true, text: q.label
+                    }}) : new L.Icon.Default();
+                    L.marker([q.lat, q.lon], {{icon: icon}}).bindPopup(q.popup).bindTooltip(q.tooltip).addTo(map);
+                }});
+            }})({self._map_name}, {json.dumps(items)});
+            """
+            self.page().runJavaScript(js)
+            # Plan and tile source no longer cover the page: restyle() and the
+            # exports fall back to a rebuild from the whole log
+            self.render_plan = None
+            logging.info(f"Added {len(items)} QSOs to map.")
         except Exception as e:
-            logging.error(f"Error displaying QSOs on map: {e}")
\ No newline at end of file
+            logging.error(f"Error adding QSOs to map: {e}")
\ No newline at end of file
@@ -0,0 +1,286 @@
+"""
+Page delivery for the QSOMap2KML map preview
+--------------------------------------------
+QWebEngineView.setHtml() is limited to about 2 MB, which the page of a large
+log exceeds (the map then stays blank). The preview is loaded by URL instead:
+- MapPage: one rendered map, its index.html plus data files next to it
+  (the QSO data of the canvas layer is its own script, not part of the HTML)
+- MapSchemeHandler serves the current page from memory under
+  qsomap://map/<page>/; the static assets (resources/web and Qt's
+  qwebchannel.js) are read once and served from memory under
+  qsomap://map/static/
+- register_scheme() has to run before the QApplication is created (main.py)
+- Without the registered scheme (e.g. MapPreview used outside main.py)
+  PageFolder writes the pages to a temporary folder and loads them as files
+- TileServer serves the base map under qsomap://map/tiles/<provider>/z/x/y
+  from the offline tile cache (utils.tile_cache); tiles that are not cached
+  yet are fetched asynchronously and stored
+The page size is only limited by the browser's memory.
+"""
+
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+from shiboken6 import isValid
+from PySide6.QtCore import QBuffer, QByteArray, QFile, QIODevice, QObject, QUrl
+from PySide6.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
+from PySide6.QtWebEngineCore import QWebEngineUrlRequestJob, QWebEngineUrlScheme, QWebEngineUrlSchemeHandler
+from utils.app_utils import resource_path
+from utils.tile_cache import USER_AGENT
+from utils.tile_providers import load_providers
+
+SCHEME = b"qsomap"
+HOST = "map"
+PAGE_FILE = "index.html"
+STATIC_DIR = "static"
+STATIC_PATH = "resources/web"
+# Relative to a page (pages and static/ are siblings in both URL layouts)
+STATIC_URL = f"../{STATIC_DIR}/"
+TILES_DIR = "tiles"
+TILES_URL = f"../{TILES_DIR}/"
+# Client side of QWebChannel, shipped inside Qt
+QWEBCHANNEL_SCRIPT = "qwebchannel.js"
+QWEBCHANNEL_RESOURCE = ":/qtwebchannel/qwebchannel.js"
+
+MIME_TYPES = {
+    ".html": b"text/html;charset=utf-8",
+    ".js": b"text/javascript;charset=utf-8",
+    ".json": b"application/json",
+    ".css": b"text/css;charset=utf-8",
+    ".png": b"image/png",
+}
+# Tile URLs carry no extension, the type is taken from the data
+IMAGE_TYPES = (
+    (b"\x89PNG", b"image/png"),
+    (b"\xff\xd8", b"image/jpeg"),
+    (b"RIFF", b"image/webp"),
+    (b"GIF8", b"image/gif"),
+)
+
+
+def register_scheme():
+    """Register the qsomap:// scheme (before the QApplication is created)."""
+    scheme = QWebEngineUrlScheme(SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme.setDefaultPort(QWebEngineUrlScheme.SpecialPort.PortUnspecified)
+    # Secure like https, so the page may load the tile servers and CDN scripts
+    scheme.setFlags(QWebEngineUrlScheme.Flag.SecureScheme | QWebEngineUrlScheme.Flag.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+def scheme_registered():
+    return bytes(QWebEngineUrlScheme.schemeByName(SCHEME).name().data()) == SCHEME
+
+
+def mime_type(name):
+    return MIME_TYPES.get(os.path.splitext(name)[1].lower(), b"application/octet-stream")
+
+
+def image_type(data):
+    return next((mime for magic, mime in IMAGE_TYPES if data.startswith(magic)), b"application/octet-stream")
+
+
+def reply(job, data, mime):
+    """Answer a QWebEngineUrlRequestJob with data."""
+    # The buffer belongs to the job and is freed with it
+    buffer = QBuffer(job)
+    buffer.setData(QByteArray(data))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    job.reply(QByteArray(mime), buffer)
+
+
+@lru_cache(maxsize=None)
+def static_file(name):
+    """Content of a static asset in resources/web (read once), None if there is none."""
+    if name == QWEBCHANNEL_SCRIPT:
+        resource = QFile(QWEBCHANNEL_RESOURCE)
+        if not resource.open(QIODevice.OpenModeFlag.ReadOnly):
+            return None
+        return bytes(resource.readAll().data())
+    if os.path.basename(name) != name:
+        return None
+    path = resource_path(os.path.join(STATIC_PATH, name))
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def data_script(variable, text):
+    """A data file that the page includes as script: assigns JSON text to a global variable."""
+    return f"var {variable} = {text};\n".encode("utf-8")
+
+
+class MapPage:
+    """
+    One rendered map, built on a worker thread (see MapPreview.build_html).
+
+    Args:
+        html (str): index.html.
+        map_name (str): JavaScript name of the folium map (for add_qsos).
+        files (dict): More files next to index.html, name -> bytes.
+        layout (dict): Settings the page was built with (see MapPreview.restyle).
+        source (ViewTiles): Data of a lazily loaded page (utils.view_tiles).
+    """
+
+    def __init__(self, html, map_name=None, files=None, layout=None, source=None):
+        self.map_name = map_name
+        self.layout = layout
+        self.source = source
+        self.files = {PAGE_FILE: html.encode("utf-8")}
+        self.files.update(files or {})
+
+    @property
+    def size(self):
+        return sum(len(data) for data in self.files.values())
+
+
+class MapSchemeHandler(QWebEngineUrlSchemeHandler):
+    """
+    Serves the current MapPage and the static assets under qsomap://map/.
+    Only the page shown last is kept, older pages are released.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.page_id = 0
+        self.page = None
+        # TileServer of the base map (None: the page loads tiles from the tile servers)
+        self.tiles = None
+
+    @classmethod
+    def install(cls, profile):
+        """Handler of a QWebEngineProfile (installed once), None if the scheme is not registered."""
+        if not scheme_registered():
+            return None
+        handler = profile.urlSchemeHandler(QByteArray(SCHEME))
+        if handler is None:
+            handler = cls(profile)
+            profile.installUrlSchemeHandler(QByteArray(SCHEME), handler)
+        return handler
+
+    def publish(self, page):
+        """Make a page available; returns the URL to load."""
+        self.page_id += 1
+        self.page = page
+        return QUrl(f"{SCHEME.decode()}://{HOST}/{self.page_id}/{PAGE_FILE}")
+
+    def resource(self, path):
+        """Content of a URL path (/static/<name> or /<page id>/<name>), None if unknown."""
+        folder, _, name = path.strip("/").partition("/")
+        if folder == STATIC_DIR:
+            return static_file(name)
+        if self.page is not None and folder == str(self.page_id):
+            return self.page.files.get(name)
+        return None
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        path = url.path()
+        if url.host() == HOST and self.tiles is not None and path.startswith(f"/{TILES_DIR}/"):
+            self.tiles.request(job, path[len(TILES_DIR) + 2:])
+            return
+        data = self.resource(path) if url.host() == HOST else None
+        if data is None:
+            logging.debug(f"Map page resource not found: {url.toString()}")
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        reply(job, data, mime_type(path))
+
+
+class TileServer(QObject):
+    """
+    Base map tiles for the scheme handler: served from the TileCache, misses
+    are downloaded with a QNetworkAccessManager (without blocking the GUI
+    thread), stored and then served. Offline, missing tiles stay blank.
+
+    Args:
+        cache (TileCache): Offline cache (opened on the GUI thread).
+    """
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.network = QNetworkAccessManager(self)
+        # Downloads in flight: (provider, z, x, y) -> [jobs waiting for the tile]
+        self._pending = {}
+
+    def close(self):
+        for reply in self.network.findChildren(QNetworkReply):
+            reply.abort()
+        self.cache.close()
+
+    def request(self, job, path):
+        """Answer a request for <provider>/<z>/<x>/<y>."""
+        try:
+            name, z, x, y = path.split("/")
+            key = (name, int(z), int(x), int(y))
+        except ValueError:
+            key = None
+        provider = load_providers().get(key[0]) if key else None
+        if provider is None:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        data = self.cache.get(*key)
+        if data is not None:
+            reply(job, data, image_type(data))
+            return
+        if key in self._pending:
+            self._pending[key].append(job)
+            return
+        self._pending[key] = [job]
+        request = QNetworkRequest(QUrl(provider.tile_url(*key[1:])))
+        request.setHeader(QNetworkRequest.KnownHeaders.UserAgentHeader, USER_AGENT)
+        network_reply = self.network.get(request)
+        network_reply.finished.connect(lambda: self._fetched(key, network_reply))
+
+    def _fetched(self, key, network_reply):
+        jobs = self._pending.pop(key, [])
+        data = bytes(network_reply.readAll().data())
+        ok = network_reply.error() == QNetworkReply.NetworkError.NoError and data
+        network_reply.deleteLater()
+        if ok:
+            self.cache.put(*key, data)
+        else:
+            logging.debug(f"Tile {'/'.join(map(str, key))} not loaded: {network_reply.errorString()}")
+        for job in jobs:
+            # Jobs of a page that was closed in the meantime are already gone
+            if not isValid(job):
+                continue
+            if ok:
+                reply(job, data, image_type(data))
+            else:
+                job.fail(QWebEngineUrlRequestJob.Error.RequestFailed)
+
+
+class PageFolder:
+    """
+    Fallback without the qsomap scheme: pages are written to a temporary
+    folder (removed at exit) and loaded as local files.
+    """
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix="qsomap_")
+        self.page_id = 0
+        atexit.register(shutil.rmtree, self.root, ignore_errors=True)
+
+    def publish(self, page):
+        """Write a page (and the static assets once); returns the URL to load."""
+        static = os.path.join(self.root, STATIC_DIR)
+        if not os.path.isdir(static):
+            shutil.copytree(resource_path(STATIC_PATH), static)
+            with open(os.path.join(static, QWEBCHANNEL_SCRIPT), "wb") as f:
+                f.write(static_file(QWEBCHANNEL_SCRIPT) or b"")
+        # Only the page shown last is kept
+        shutil.rmtree(os.path.join(self.root, str(self.page_id)), ignore_errors=True)
+        self.page_id += 1
+        folder = os.path.join(self.root, str(self.page_id))
+        os.makedirs(folder)
+        for name, data in page.files.items():
+            with open(os.path.join(folder, name), "wb") as f:
+                f.write(data)
+        return QUrl.fromLocalFile(os.path.join(folder, PAGE_FILE))
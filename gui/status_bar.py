@@ -1,25 +1,48 @@
-from PySide6.QtWidgets import QStatusBar, QProgressBar
+from PySide6.QtCore import Signal
+from PySide6.QtWidgets import QStatusBar, QProgressBar, QToolButton
 
 class StatusBar(QStatusBar):
+    # Cancel button of a running background job clicked
+    cancel_requested = Signal()
+
     def __init__(self, parent, i18n):
         super().__init__(parent)
         self.i18n = i18n
+        self.stage = ""
         self.progress = QProgressBar(self)
         self.progress.setVisible(False)
         self.addPermanentWidget(self.progress)
+        self.cancel_button = QToolButton(self)
+        self.cancel_button.setText("✕")
+        self.cancel_button.setToolTip(self.i18n.t("tooltip_cancel_job"))
+        self.cancel_button.setVisible(False)
+        self.cancel_button.clicked.connect(self.cancel_requested)
+        self.addPermanentWidget(self.cancel_button)
         self.showMessage(self.i18n.t("ready"))
 
     def set_i18n(self, i18n):
         """Set new Language after Config update."""
         self.i18n = i18n
+        self.cancel_button.setToolTip(self.i18n.t("tooltip_cancel_job"))
         self.showMessage(self.i18n.t("ready"))
 
+    def set_busy(self, busy):
+        """Show the cancel button while a background job runs."""
+        self.cancel_button.setVisible(busy)
+        if not busy:
+            self.stage = ""
+
+    def show_stage(self, text):
+        """Stage of the running job, shown in front of the progress counter."""
+        self.stage = text
+        self.showMessage(text)
+
     def show_progress(self, value, maximum):
         self.progress.setMaximum(maximum)
         self.progress.setValue(value)
         self.progress.setVisible(True)
-        self.showMessage(f"{value}/{maximum}")
+        self.showMessage(f"{self.stage} {value}/{maximum}" if self.stage else f"{value}/{maximum}")
 
     def hide_progress(self):
         self.progress.setVisible(False)
-        self.clearMessage()
\ No newline at end of file
+        self.clearMessage()
@@ -1,13 +1,7 @@
 import sys, os
+import multiprocessing
 os.environ["QTWEBENGINE_DISABLE_SANDBOX"] = "1"
 os.environ["QT_LOGGING_RULES"] = "*.debug=false;qt.qpa.*=false"
-from PySide6.QtWidgets import QApplication
-from PySide6.QtGui import QIcon
-from PySide6.QtCore import qInstallMessageHandler
-from gui.main_window import MainWindow
-from utils.logger import setup_logger
-from core.i18n import I18n
-from utils.app_utils import resource_path, get_app_stylesheet
 from core.config_manager import ConfigManager
 
 def qt_message_handler(mode, context, message):
@@ -15,6 +9,16 @@ def qt_message_handler(mode, context, message):
     logging.getLogger("qt").info(message)
 
 def main():
+    # Qt, QtWebEngine and folium are only imported for the GUI (not for the command line mode)
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtGui import QIcon
+    from PySide6.QtCore import qInstallMessageHandler
+    from gui.main_window import MainWindow
+    from gui.map_scheme import register_scheme
+    from utils.logger import setup_logger
+    from core.i18n import I18n
+    from utils.app_utils import resource_path, get_app_stylesheet
+
     qInstallMessageHandler(qt_message_handler)
     # Load config and language
     config = ConfigManager.load()
@@ -23,6 +27,8 @@ def main():
     setup_logger(log_level=config.get("log_level", "INFO"))
 
     i18n = I18n(lang)
+    # The map preview is served under qsomap:// (must be registered before the QApplication)
+    register_scheme()
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(resource_path("resources/icons/flow_block.ico")))
     app.setApplicationName("QSOMap2KML © 2025 by DB4REB")
@@ -37,4 +43,11 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Needed for the import process pool in frozen (Nuitka/PyInstaller) builds
+    multiprocessing.freeze_support()
+    # Command line mode: python main.py export in.adi out.kml ...
+    from core.cli import COMMANDS
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        from core.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+    main()
@@ -0,0 +1,279 @@
+/*
+ * Canvas layer of the QSOMap2KML map preview (static asset, served once).
+ * Draws the payload of MapPreview._canvas_payload(): one line per grid and
+ * band, one circle marker per QSO, tooltips built on hover from the template.
+ * With clusters (see utils.clustering) the levels up to clusters.maxZoom show
+ * cluster bubbles (count, band/mode breakdown, click zooms to the split)
+ * instead of the QSO markers; only the clusters in view are created.
+ * Called by the page after folium's own script has created the map.
+ *
+ * The layer stays on the page and is updated in place through map.qsoMap:
+ * - setStyle({colors, template, clusterTemplate, lang}): new colors restyle
+ *   the existing lines and markers, new texts apply to the next tooltip
+ * - addQsos(rows): appends QSOs (follow mode) to the data and the map
+ *
+ * With data.lazy (huge logs) the payload starts empty: after every pan and
+ * zoom the layer asks MapPreview for the tiles in view it does not have yet
+ * (map.qsoBridge.loadTiles, see utils.view_tiles) and appends their clusters
+ * or QSOs; lines are drawn for the QSOs loaded above clusters.maxZoom.
+ * Tiles a response leaves out (too many tiles for one request, or detail
+ * tiles with more QSOs than one response holds) come back in result.more
+ * and are asked for again, cut detail tiles from the given offset.
+ */
+function qsoCanvas(map, data) {
+    var d = data.payload, clusters = data.clusters, lazy = data.lazy;
+    var tpl = data.template, clusterTpl = data.clusterTemplate;
+    var colors = data.colors, lang = data.lang;
+    var renderer = L.canvas({padding: 0.5});
+    map._qsoCanvas = renderer;
+    var entities = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"};
+    function esc(s) { return String(s).replace(/[&<>"']/g, function(c) { return entities[c]; }); }
+    function fill(template, v) {
+        return template.replace(/\{(\w+)\}/g, function(m, key) { return key in v ? esc(v[key]) : m; });
+    }
+    function text(col, i) { return col.values[col.codes[i]]; }
+    // ADIF date YYYYMMDD as in utils.render_plan.format_adif_date
+    function formatDate(s) {
+        if (!s || s.length !== 8) { return s; }
+        if (lang === "de") { return s.slice(6, 8) + "." + s.slice(4, 6) + "." + s.slice(0, 4); }
+        return s.slice(0, 4) + "-" + s.slice(4, 6) + "-" + s.slice(6, 8);
+    }
+    function tooltip(i) {
+        return fill(tpl, {call: d.call[i], band: d.bands[d.band[i]], mode: d.modes[d.mode[i]], name: text(d.name, i),
+                          date: formatDate(text(d.date, i)), time: text(d.time, i),
+                          distance: d.distance[i] === null ? "-" : d.distance[i],
+                          bearing: d.bearing[i] === null ? "-" : d.bearing[i]});
+    }
+    function colorTables() {
+        d.lineColors = d.bands.map(function(band) { return colors.bands[band] || colors.fallback; });
+        d.markerColors = d.modes.map(function(mode) { return colors.modes[mode] || colors.fallback; });
+    }
+    colorTables();
+    function qsoMarker(i) {
+        var color = d.markerColors[d.mode[i]];
+        var marker = L.circleMarker([d.lat[i], d.lon[i]], {renderer: renderer, radius: 5, color: color,
+                                                           fillColor: color, fillOpacity: 0.8, weight: 1});
+        marker.qso = i;
+        return marker;
+    }
+    var lines = [], lineKeys = {};
+    function addLine(key, band) {
+        lineKeys[key + ":" + band] = true;
+        var line = L.polyline(d.paths[key], {renderer: renderer, color: d.lineColors[band], weight: 2, opacity: 0.7,
+                                              interactive: false}).addTo(map);
+        line.band = band;
+        lines.push(line);
+    }
+    d.lines.forEach(function(l) { addLine(l[0], l[1]); });
+    var markers = [];
+    for (var i = 0; i < d.lat.length; i++) {
+        markers.push(qsoMarker(i));
+    }
+    var group = L.featureGroup(markers)
+        .bindTooltip(function(layer) { return tooltip(layer.qso); })
+        .bindPopup(function(layer) { return esc(d.call[layer.qso]); });
+    // QSOs appended later (follow mode), shown at every zoom level
+    var added = L.featureGroup()
+        .bindTooltip(function(layer) { return tooltip(layer.qso); })
+        .bindPopup(function(layer) { return esc(d.call[layer.qso]); })
+        .addTo(map);
+    var update = null;
+
+    // Lookup tables get an index on first use (appending many rows stays linear)
+    var indexes = new Map();
+    function code(values, value) {
+        var index = indexes.get(values);
+        if (!index) {
+            index = new Map(values.map(function(v, k) { return [v, k]; }));
+            indexes.set(values, index);
+        }
+        var k = index.get(value);
+        if (k === undefined) {
+            k = values.length;
+            values.push(value);
+            index.set(value, k);
+        }
+        return k;
+    }
+    map.qsoMap = {
+        setStyle: function(style) {
+            if (style.colors) {
+                colors = style.colors;
+                colorTables();
+                lines.forEach(function(line) { line.setStyle({color: d.lineColors[line.band]}); });
+                markers.concat(added.getLayers()).forEach(function(marker) {
+                    var color = d.markerColors[d.mode[marker.qso]];
+                    marker.setStyle({color: color, fillColor: color});
+                });
+            }
+            if (style.template !== undefined) { tpl = style.template; }
+            if (style.clusterTemplate !== undefined) { clusterTpl = style.clusterTemplate; }
+            if (style.lang) { lang = style.lang; }
+            // Cluster bubbles and single QSOs in view are recreated with the new style
+            if (update) { update(); }
+        },
+        addQsos: function(rows) {
+            rows.forEach(function(q) {
+                var i = d.lat.length;
+                d.lat.push(q.lat);
+                d.lon.push(q.lon);
+                d.band.push(code(d.bands, q.band));
+                d.mode.push(code(d.modes, q.mode));
+                d.call.push(q.call);
+                [["name", q.name], ["date", q.date], ["time", q.time]].forEach(function(f) {
+                    d[f[0]].codes.push(code(d[f[0]].values, f[1]));
+                });
+                d.distance.push(q.distance);
+                d.bearing.push(q.bearing);
+                colorTables();
+                if (q.path) {
+                    d.paths["+" + i] = q.path;
+                    addLine("+" + i, d.band[i]);
+                }
+                added.addLayer(qsoMarker(i));
+            });
+        }
+    };
+    if (lazy) {
+        clusters = {maxZoom: lazy.maxZoom, levels: []};
+        for (var z = 0; z <= lazy.maxZoom; z++) {
+            clusters.levels.push({lat: [], lon: [], count: [], first: [], exp: [], bands: [], modes: []});
+        }
+    }
+    if (!clusters) {
+        group.addTo(map);
+        return;
+    }
+
+    function breakdown(pairs, labels) {
+        var parts = [];
+        for (var k = 0; k < pairs.length; k += 2) {
+            parts.push((labels[pairs[k]] || "?") + ": " + pairs[k + 1]);
+        }
+        return parts.join(", ");
+    }
+    function bubble(level, c) {
+        var n = level.count[c];
+        var size = Math.round(26 + 8 * Math.log10(n));
+        var color = d.markerColors[level.modes[c][0]];
+        var icon = L.divIcon({
+            className: "qso-cluster", iconSize: [size, size],
+            html: '<div style="width:' + size + 'px;height:' + size + 'px;line-height:' + size + 'px;' +
+                  'border-radius:50%;text-align:center;font:bold 11px sans-serif;background:rgba(255,255,255,0.85);' +
+                  'border:3px solid ' + color + ';box-sizing:border-box;">' + n + '</div>'
+        });
+        return L.marker([level.lat[c], level.lon[c]], {icon: icon})
+            .bindTooltip(function() {
+                return fill(clusterTpl, {count: n, bands: breakdown(level.bands[c], d.bands),
+                                         modes: breakdown(level.modes[c], d.modes)});
+            })
+            .on("click", function() { map.setView([level.lat[c], level.lon[c]], level.exp[c]); });
+    }
+    var layer = L.layerGroup().addTo(map);
+    // Lazy loading: rows of a response (columns, codes of the page tables), index of the first one
+    function appendRows(rows) {
+        var first = d.lat.length;
+        for (var k = 0; k < rows.lat.length; k++) {
+            d.lat.push(rows.lat[k]);
+            d.lon.push(rows.lon[k]);
+            d.band.push(rows.band[k]);
+            d.mode.push(rows.mode[k]);
+            d.call.push(rows.call[k]);
+            d.name.codes.push(code(d.name.values, rows.name[k]));
+            d.date.codes.push(code(d.date.values, rows.date[k]));
+            d.time.codes.push(code(d.time.values, rows.time[k]));
+            d.distance.push(rows.distance[k]);
+            d.bearing.push(rows.bearing[k]);
+        }
+        return first;
+    }
+    function appendClusters(level, c, first) {
+        for (var k = 0; k < c.count.length; k++) {
+            level.lat.push(c.lat[k]);
+            level.lon.push(c.lon[k]);
+            level.count.push(c.count[k]);
+            level.first.push(c.row[k] < 0 ? -1 : first + c.row[k]);
+            level.exp.push(c.exp[k]);
+            level.bands.push(c.bands[k]);
+            level.modes.push(c.modes[k]);
+        }
+    }
+    function appendDetails(rows, first) {
+        for (var k = 0; k < rows.lat.length; k++) {
+            var i = first + k, grid = rows.grid[k];
+            if (grid !== null && d.paths[grid] && !lineKeys[grid + ":" + d.band[i]]) {
+                addLine(grid, d.band[i]);
+            }
+            var marker = qsoMarker(i);
+            markers.push(marker);
+            group.addLayer(marker);
+        }
+    }
+    var loaded = {};
+    function request(zoom) {
+        if (!lazy || !map.qsoBridge) { return; }
+        var z = zoom > clusters.maxZoom ? lazy.detailZoom : Math.max(zoom, 0);
+        var n = Math.pow(2, z), bounds = map.getBounds().pad(0.25);
+        var nw = map.project(bounds.getNorthWest(), z).divideBy(256).floor();
+        var se = map.project(bounds.getSouthEast(), z).divideBy(256).floor();
+        var keys = [];
+        for (var x = nw.x; x <= se.x && x < nw.x + n; x++) {
+            for (var y = Math.max(nw.y, 0); y <= Math.min(se.y, n - 1); y++) {
+                var tx = ((x % n) + n) % n, id = z + "/" + tx + "/" + y;
+                if (!loaded[id]) {
+                    loaded[id] = true;
+                    keys.push([tx, y]);
+                }
+            }
+        }
+        fetchTiles(zoom, z, keys);
+    }
+    // keys: [x, y] or, for the rest of a detail tile that was cut, [x, y, offset];
+    // whatever the reply leaves out comes back in result.more and is fetched next
+    function fetchTiles(zoom, z, keys) {
+        if (!keys.length) { return; }
+        map.qsoBridge.loadTiles(lazy.token, zoom, JSON.stringify(keys), function(text) {
+            var result = JSON.parse(text);
+            if (!result) {
+                // Ask again later; continued tiles keep their first part
+                keys.forEach(function(k) {
+                    if (k.length < 3) { delete loaded[z + "/" + k[0] + "/" + k[1]]; }
+                });
+                return;
+            }
+            Object.assign(d.paths, result.paths);
+            var first = appendRows(result.rows);
+            if (result.clusters) {
+                appendClusters(clusters.levels[z], result.clusters, first);
+            } else {
+                appendDetails(result.rows, first);
+            }
+            fetchTiles(zoom, z, result.more || []);
+            if (Math.floor(map.getZoom()) === zoom) { update(); }
+        });
+    }
+    update = function() {
+        var zoom = Math.floor(map.getZoom());
+        request(zoom);
+        layer.clearLayers();
+        if (zoom > clusters.maxZoom) {
+            if (!map.hasLayer(group)) { group.addTo(map); }
+            return;
+        }
+        if (map.hasLayer(group)) { map.removeLayer(group); }
+        var level = clusters.levels[Math.max(zoom, 0)];
+        var bounds = map.getBounds().pad(0.25);
+        for (var c = 0; c < level.count.length; c++) {
+            if (!bounds.contains([level.lat[c], level.lon[c]])) { continue; }
+            if (level.count[c] === 1) {
+                var i = level.first[c];
+                layer.addLayer(qsoMarker(i).bindTooltip(tooltip(i)).bindPopup(esc(d.call[i])));
+            } else {
+                layer.addLayer(bubble(level, c));
+            }
+        }
+    };
+    map.on("zoomend moveend", update);
+    if (lazy) { map.on("qsobridge", update); }
+    update();
+}
@@ -0,0 +1,24 @@
+/*
+ * Page script of the QSOMap2KML map preview (static asset, served once).
+ * Connects the page to MapPreview over QWebChannel (object "qsoBridge"):
+ * the view (center and zoom) is reported after every pan and zoom, so a
+ * rebuilt page of the same log opens where the user left it. The bridge is
+ * kept as map.qsoBridge ("qsobridge" event once connected) for the lazily
+ * loaded canvas layer (qso_canvas.js).
+ */
+function qsoPage(map) {
+    if (typeof QWebChannel === "undefined" || !window.qt || !qt.webChannelTransport) {
+        return;
+    }
+    new QWebChannel(qt.webChannelTransport, function(channel) {
+        var bridge = channel.objects.qsoBridge;
+        map.qsoBridge = bridge;
+        map.fire("qsobridge");
+        function report() {
+            var center = map.getCenter();
+            bridge.viewChanged(center.lat, center.lng, map.getZoom());
+        }
+        map.on("moveend", report);
+        report();
+    });
+}
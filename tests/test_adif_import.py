@@ -0,0 +1,21 @@
+from utils.adif_import import import_adif_files
+
+
+def write_log(path, calls):
+    path.write_text(
+        "<EOH>\n" + "".join(f"<CALL:{len(c)}>{c}<QSO_DATE:8>20240101<TIME_ON:4>1200<BAND:3>20m<MODE:2>CW<EOR>\n" for c in calls),
+        encoding="utf-8",
+    )
+
+
+def test_files_are_merged_without_duplicates(tmp_path):
+    write_log(tmp_path / "a.adi", ["DL1ABC", "K1XYZ"])
+    write_log(tmp_path / "b.adi", ["K1XYZ", "G4AAA"])
+    write_log(tmp_path / "c.adi", ["JA1BBB"])
+    # Worker processes are spawned, parse_adif_file and its results have to pickle
+    store, report = import_adif_files([str(tmp_path)], max_workers=2)
+    calls = store.column("call")
+    assert [calls[i] for i in range(len(store))] == ["DL1ABC", "K1XYZ", "G4AAA", "JA1BBB"]
+    assert report[str(tmp_path / "b.adi")] == {"parsed": 2, "duplicates": 1}
+    serial, _ = import_adif_files([str(tmp_path)], max_workers=1)
+    assert len(serial) == len(store)
@@ -0,0 +1,78 @@
+import pytest
+
+from utils.adif_parser import iter_adif, iter_complete_records
+from utils.log_reader import iter_qsos
+
+HEADER = "Exported log <ADIF_VER:5>3.1.4 <EOH>\n"
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64 * 1024])
+def test_byte_counted_utf8_length(tmp_path, chunk_size):
+    # ü is two bytes in UTF-8: 7 bytes for 6 characters
+    path = write(tmp_path, "bytes.adi", (HEADER + "<CALL:6>DL1ABC<NAME:7>Jürgen<BAND:3>20M<EOR>\n").encode("utf-8"))
+    assert list(iter_adif(path, chunk_size)) == [{"call": "DL1ABC", "name": "Jürgen", "band": "20m"}]
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64 * 1024])
+def test_character_counted_utf8_length(tmp_path, chunk_size):
+    path = write(tmp_path, "chars.adi", (HEADER + "<NAME:6>Jürgen <CALL:6>DL1ABC <EOR>\n").encode("utf-8"))
+    assert list(iter_adif(path, chunk_size)) == [{"name": "Jürgen", "call": "DL1ABC"}]
+
+
+def test_value_with_angle_brackets(tmp_path):
+    path = write(tmp_path, "brackets.adi", (HEADER + "<COMMENT:7>a<b>c<d<CALL:6>DL1ABC<EOR>").encode("utf-8"))
+    assert list(iter_adif(path)) == [{"comment": "a<b>c<d", "call": "DL1ABC"}]
+
+
+@pytest.mark.parametrize("chunk_size", [5, 64 * 1024])
+def test_cp1252_file(tmp_path, chunk_size):
+    # The cp1252 byte of ü is invalid UTF-8: the rest of the file is read as cp1252
+    text = HEADER + "<CALL:5>K1XYZ<NAME:3>Bob<EOR>\n<CALL:6>DL1ABC<NAME:6>Jürgen<QTH:4>Köln<EOR>\n"
+    path = write(tmp_path, "cp1252.adi", text.encode("cp1252"))
+    assert list(iter_adif(path, chunk_size)) == [
+        {"call": "K1XYZ", "name": "Bob"},
+        {"call": "DL1ABC", "name": "Jürgen", "qth": "Köln"},
+    ]
+
+
+def test_truncated_final_eor(tmp_path):
+    text = HEADER + "<CALL:6>DL1ABC<EOR>\n<CALL:5>K1XYZ<BAND:3>40m<EOR"
+    path = write(tmp_path, "truncated.adi", text.encode("utf-8"))
+    # A complete file read keeps the last record
+    assert list(iter_adif(path)) == [{"call": "DL1ABC"}, {"call": "K1XYZ", "band": "40m"}]
+    # A log still being written only yields the records up to the last <EOR>
+    records = list(iter_complete_records(text))
+    assert [qso for qso, _ in records] == [{"call": "DL1ABC"}]
+    assert text[:records[0][1]].endswith("<EOR>")
+
+
+def test_empty_file(tmp_path):
+    path = write(tmp_path, "empty.adi", b"  \n")
+    with pytest.raises(ValueError):
+        list(iter_adif(path))
+
+
+def test_adx_reads_like_adif(tmp_path):
+    adi = write(tmp_path, "log.adi", (HEADER + "<CALL:6>DL1ABC<BAND:3>20M<MODE:2>CW<NAME:6>Jürgen<EOR>").encode("utf-8"))
+    adx = write(tmp_path, "log.adx", (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<ADX><HEADER><ADIF_VER>3.1.4</ADIF_VER></HEADER><RECORDS>'
+        "<RECORD><CALL>DL1ABC</CALL><BAND>20M</BAND><MODE>CW</MODE><NAME>Jürgen</NAME></RECORD>"
+        "</RECORDS></ADX>"
+    ).encode("utf-8"))
+    assert list(iter_qsos(adx)) == list(iter_qsos(adi)) == [
+        {"call": "DL1ABC", "band": "20m", "mode": "CW", "name": "Jürgen"}
+    ]
+
+
+def test_utf8_before_cp1252_byte_in_same_chunk(tmp_path):
+    # UTF-8 ü in the first record, a cp1252 ö in the second: only the text from
+    # the bad byte on is read as cp1252
+    data = (HEADER + "<NAME:6>Jürgen<EOR>\n").encode("utf-8") + "<QTH:4>Köln<EOR>\n".encode("cp1252")
+    path = write(tmp_path, "mixed.adi", data)
+    assert list(iter_adif(path)) == [{"name": "Jürgen"}, {"qth": "Köln"}]
@@ -0,0 +1,23 @@
+import pytest
+
+from utils.adx_parser import iter_adx
+
+
+def test_records_are_read(tmp_path):
+    path = tmp_path / "log.adx"
+    path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?><ADX><HEADER><ADIF_VER>3.1.4</ADIF_VER></HEADER><RECORDS>'
+        '<RECORD><CALL>DL1ABC</CALL><BAND>20M</BAND><MODE>CW</MODE>'
+        '<APP PROGRAMID="LOG" FIELDNAME="X" TYPE="S">1</APP></RECORD>'
+        '<RECORD><CALL>K1XYZ</CALL></RECORD></RECORDS></ADX>',
+        encoding="utf-8",
+    )
+    records = list(iter_adx(str(path)))
+    assert records == [{"call": "DL1ABC", "band": "20m", "mode": "CW", "app_log_x": "1"}, {"call": "K1XYZ"}]
+
+
+def test_other_xml_is_rejected(tmp_path):
+    path = tmp_path / "other.adx"
+    path.write_text('<?xml version="1.0"?><foo><bar/></foo>', encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_adx(str(path)))
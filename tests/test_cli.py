@@ -0,0 +1,58 @@
+import csv
+import json
+import zipfile
+
+import pytest
+
+from core.cli import main
+from core.config_manager import ConfigManager
+
+LOG = (
+    "<ADIF_VER:5>3.1.4 <EOH>\n"
+    "<CALL:6>DL1ABC<BAND:3>20M<MODE:2>CW<GRIDSQUARE:4>JO31<QSO_DATE:8>20240102<TIME_ON:4>1234<EOR>\n"
+    "<CALL:5>K1ABC<BAND:3>40M<MODE:3>SSB<GRIDSQUARE:6>FN31pr<QSO_DATE:8>20240103<TIME_ON:4>0815<EOR>\n"
+)
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    # Settings of the test only, ConfigManager.CONFIG_PATH is restored afterwards
+    config = tmp_path / "settings.json"
+    config.write_text(json.dumps({"my_grid": "JO40", "bands_colors": {"20m": "#FF0000"}}), encoding="utf-8")
+    monkeypatch.setattr(ConfigManager, "CONFIG_PATH", str(config))
+    path = tmp_path / "log.adi"
+    path.write_text(LOG, encoding="utf-8")
+    return str(path)
+
+
+def test_export_writes_every_output(tmp_path, log_file):
+    kml, csv_path, geojson = (str(tmp_path / name) for name in ("out.kml", "out.csv", "out.geojsonl"))
+    assert main(["export", log_file, kml, "--also", csv_path, geojson, "--no-cache", "--workers", "1", "-q"]) == 0
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        assert [row[0] for row in csv.reader(f)] == ["call", "DL1ABC", "K1ABC"]
+    with open(geojson, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    with open(kml, encoding="utf-8") as f:
+        text = f.read()
+    # Own locator and band colors from the settings
+    assert "DL1ABC" in text and "K1ABC" in text
+    assert "ff0000ff" in text.lower()
+
+
+def test_tiled_export(tmp_path, log_file):
+    out = str(tmp_path / "out")
+    assert main(["export", log_file, out, "--tiled", "--grid", "FN20", "--no-cache", "-q"]) == 0
+    with zipfile.ZipFile(out + ".kmz") as kmz:
+        names = kmz.namelist()
+    assert names[0] == "doc.kml"
+    assert any(name.startswith("tiles/") for name in names)
+
+
+@pytest.mark.parametrize("args, code", [
+    (["out.txt"], 1),
+    (["out.kml", "--bands", "20m"], 2),
+])
+def test_export_errors(tmp_path, log_file, args, code):
+    args[0] = str(tmp_path / args[0])
+    assert main(["export", log_file] + args + ["-q"]) == code
+    assert not (tmp_path / "out.kml").exists() and not (tmp_path / "out.txt").exists()
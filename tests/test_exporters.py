@@ -0,0 +1,55 @@
+import csv
+import json
+
+import pytest
+
+from utils import exporters
+from utils.exporters import CSV_COLUMNS, Exporter, export_qsos, exporter_for
+
+QSOS = [
+    {"call": "DL1ABC", "band": "20m", "mode": "CW", "gridsquare": "JO31", "name": "Jürgen", "date": "20240102", "time": "1234"},
+    {"call": "K1ABC", "band": "40m", "mode": "SSB", "gridsquare": "FN31pr", "name": "", "date": "20240103", "time": "235959"},
+    {"call": "NOGRID", "band": "20m", "mode": "FT8", "gridsquare": "", "name": "", "date": "20240104", "time": "0000"},
+]
+
+
+class Recorder(Exporter):
+    """Records the chunks it is fed."""
+
+    def begin(self, plan, i18n=None):
+        self.chunks = []
+
+    def write(self, plan, indices):
+        self.chunks.append(list(indices))
+
+
+def test_formats_are_written_in_one_pass(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporters, "EXPORT_CHUNK_QSOS", 2)
+    recorder = Recorder(None)
+    csv_path, geojson_path, kml_path = (str(tmp_path / name) for name in ("log.csv", "log.geojsonl", "log.kml"))
+    plan = export_qsos(QSOS, [csv_path, geojson_path, kml_path, recorder], "JO40", lang="de")
+    assert recorder.chunks == [[0, 1], [2]]
+    assert len(plan) == 3
+
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == CSV_COLUMNS
+    # Dates stay ISO in data exports, also with a German plan
+    assert rows[1][:7] == ["DL1ABC", "20m", "CW", "Jürgen", "2024-01-02", "12:34", "JO31"]
+    assert rows[2][5] == "23:59:59"
+    assert rows[3][7:] == ["", "", "", ""]
+
+    with open(geojson_path, encoding="utf-8") as f:
+        features = [json.loads(line) for line in f]
+    assert [feature["properties"]["call"] for feature in features] == ["DL1ABC", "K1ABC", "NOGRID"]
+    assert features[0]["geometry"]["coordinates"] == [7.0, 51.5]
+    assert features[2]["geometry"] is None
+
+    with open(kml_path, encoding="utf-8") as f:
+        kml = f.read()
+    assert "DL1ABC" in kml and "02.01.2024" in kml
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown export format"):
+        exporter_for(str(tmp_path / "log.txt"))
@@ -0,0 +1,70 @@
+import random
+
+import numpy as np
+import pytest
+
+from utils.grid_locator import locator_to_latlon, locators_to_latlon
+
+LOCATORS = [
+    # 2 characters: field only, not enough for a position
+    "JO", "AA", "RR",
+    # 4, 6, 8 and 10 characters
+    "JO31", "jo31", "AA00", "RR99", "FN31pr", "JN47FD", "jn47fd", "AA00AA", "RR99XX",
+    "JN47FD52", "RR99XX99", "JN47FD52KL", "JN47FD52kl", " JO31", "\tFN31", "JO31 ",
+    # Invalid, or valid only up to the last good pair
+    "", "J", "JO3", "SS00", "JO3A", "JOAA", "JO31YY", "JO31P", "JO31PRA", "JO31PR5Z",
+    "JN47FD52KLMN", "  ", "0000", "ZZ99", "JÖ31", "JO31ÄÄ",
+]
+
+
+def scalar(locators):
+    points = [locator_to_latlon(locator) for locator in locators]
+    lat = np.array([np.nan if p is None else p[0] for p in points])
+    lon = np.array([np.nan if p is None else p[1] for p in points])
+    return lat, lon, np.array([p is not None for p in points])
+
+
+def random_locators(count, seed=4711):
+    rng = random.Random(seed)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 "
+    pairs = [
+        lambda: rng.choice("ABCDEFGHIJKLMNOPQR") + rng.choice("ABCDEFGHIJKLMNOPQR"),
+        lambda: rng.choice("0123456789") + rng.choice("0123456789"),
+        lambda: rng.choice("abcdefghijklmnopqrstuvwx") + rng.choice("ABCDEFGHIJKLMNOPQRSTUVWX"),
+        lambda: rng.choice("0123456789") + rng.choice("0123456789"),
+        lambda: rng.choice("abcdefghijklmnopqrstuvwx") + rng.choice("abcdefghijklmnopqrstuvwx"),
+    ]
+    result = []
+    for _ in range(count):
+        locator = "".join(pair() for pair in pairs[:rng.choice([1, 2, 3, 4, 5])])
+        if rng.random() < 0.2:
+            # Replace one character by an arbitrary one
+            k = rng.randrange(len(locator))
+            locator = locator[:k] + rng.choice(alphabet) + locator[k + 1:]
+        result.append(locator)
+    return result
+
+
+@pytest.mark.parametrize("locators", [LOCATORS, random_locators(5000)], ids=["fixed", "random"])
+def test_vectorized_matches_scalar(locators):
+    lat, lon, valid = locators_to_latlon(locators)
+    expected_lat, expected_lon, expected_valid = scalar(locators)
+    assert np.array_equal(valid, expected_valid)
+    assert np.allclose(lat, expected_lat, rtol=0, atol=1e-9, equal_nan=True)
+    assert np.allclose(lon, expected_lon, rtol=0, atol=1e-9, equal_nan=True)
+
+
+def test_bytes_and_empty_input():
+    lat, lon, valid = locators_to_latlon(np.array([b"JO31", b"JO", b"jn47fd"]))
+    assert valid.tolist() == [True, False, True]
+    assert (lat[0], lon[0]) == pytest.approx(locator_to_latlon("JO31"))
+    assert (lat[2], lon[2]) == pytest.approx(locator_to_latlon("JN47FD"))
+    lat, lon, valid = locators_to_latlon([])
+    assert len(lat) == len(lon) == len(valid) == 0
+
+
+def test_precision_by_length():
+    # Center of the 2 by 1 degree square; invalid trailing pairs are ignored
+    assert locator_to_latlon("JO31") == pytest.approx((51.5, 7.0))
+    assert locator_to_latlon("JO") is None
+    assert locator_to_latlon("JO31ZZ") == locator_to_latlon("JO31")
@@ -0,0 +1,44 @@
+import io
+import pickle
+from types import MappingProxyType
+
+from utils.kml_export import PARALLEL_MIN_QSOS, write_qso_placemarks
+from utils.render_plan import RenderPlan
+
+BAND_COLORS = {"20m": "#ff0000", "40m": "#00ff00"}
+MODE_COLORS = {"CW": "#0000ff", "SSB": "#ffff00"}
+
+
+def make_plan(count):
+    grids = ["JO31", "FN31", "PM95", "QF56", "KP20"]
+    qsos = [
+        {
+            "call": f"DL{i}ABC", "band": "20m" if i % 2 else "40m", "mode": "CW" if i % 3 else "SSB",
+            "gridsquare": grids[i % len(grids)], "date": "20240101", "time": "1200",
+        }
+        for i in range(count)
+    ]
+    return RenderPlan(qsos, "JO40", BAND_COLORS, MODE_COLORS)
+
+
+def test_plan_pickles_without_memo():
+    plan = make_plan(10)
+    plan.derived("test", lambda: [1, 2, 3])
+    plan.derived("test_shared", lambda: [4], shared=True)
+    copy = pickle.loads(pickle.dumps(plan))
+    assert isinstance(copy.band_colors, MappingProxyType)
+    assert dict(copy.band_colors) == BAND_COLORS
+    assert dict(copy.mode_colors) == MODE_COLORS
+    assert copy.derived("test", lambda: None) is None
+    assert copy.derived("test_shared", lambda: None, shared=True) is None
+    assert copy.band_colors_by_code == plan.band_colors_by_code
+
+
+def test_parallel_export_matches_serial():
+    plan = make_plan(PARALLEL_MIN_QSOS)
+    serial, parallel = io.StringIO(), io.StringIO()
+    write_qso_placemarks(serial, plan, max_workers=1)
+    # Worker processes are spawned (no fork), so the plan has to pickle
+    write_qso_placemarks(parallel, plan, max_workers=2)
+    assert parallel.getvalue() == serial.getvalue()
+    assert serial.getvalue().count("<Placemark>") > 0
@@ -0,0 +1,111 @@
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+
+import pytest
+
+from utils.kml_export import KMZ_DOC_NAME, KMZ_ICON_PATH
+from utils.kml_tiles import LOD_PIXELS, TILE_MAX_QSOS, export_qsos_to_kmz_tiles
+
+NS = {"kml": "http://www.opengis.net/kml/2.2"}
+GRIDS = ["JO31", "FN31pr", "PM95", "QF56", "JO31ab", "KP20", "JO62", "GG66"]
+
+
+def make_qsos(count, grids=GRIDS):
+    return [
+        {"call": f"DL{i}ABC", "band": "20m" if i % 2 else "40m", "mode": "CW", "gridsquare": grids[i % len(grids)],
+         "date": "20240101", "time": "1200"}
+        for i in range(count)
+    ]
+
+
+def read_tiles(path):
+    """Walk the NetworkLinks from doc.kml: {tile path: (root element, link name, min/max Lod pixels)}."""
+    tiles = {}
+    with zipfile.ZipFile(path) as kmz:
+        names = set(kmz.namelist())
+        pending = [(KMZ_DOC_NAME, None, None)]
+        while pending:
+            name, link_name, lod = pending.pop()
+            assert name in names and name not in tiles
+            root = ET.fromstring(kmz.read(name))
+            tiles[name] = (root, link_name, lod)
+            for link in root.iter(f"{{{NS['kml']}}}NetworkLink"):
+                href = link.find("kml:Link/kml:href", NS).text
+                lod = link.find("kml:Region/kml:Lod", NS)
+                assert link.find("kml:Region/kml:LatLonAltBox", NS) is not None
+                pending.append((
+                    posixpath.normpath(posixpath.join(posixpath.dirname(name), href)),
+                    link.find("kml:name", NS).text,
+                    (int(lod.find("kml:minLodPixels", NS).text), int(lod.find("kml:maxLodPixels", NS).text)),
+                ))
+        assert KMZ_ICON_PATH in names
+        assert names - {KMZ_ICON_PATH} == set(tiles)
+    return tiles
+
+
+def qso_calls(root):
+    """Calls of the QSO placemarks of a leaf tile (names are "CALL (MODE)")."""
+    return [
+        placemark.find("kml:name", NS).text.split(" ")[0]
+        for placemark in root.iter(f"{{{NS['kml']}}}Placemark")
+        if placemark.find("kml:Point", NS) is not None
+    ]
+
+
+def test_tiles_hold_every_qso_once(tmp_path):
+    qsos = make_qsos(400) + [
+        {"call": "QTH1", "band": "20m", "mode": "CW", "gridsquare": "JO40"},
+        {"call": "NOGRID", "band": "20m", "mode": "CW", "gridsquare": "XX"},
+    ]
+    path = str(tmp_path / "tiles.kmz")
+    export_qsos_to_kmz_tiles(qsos, path, "JO40", max_qsos=60)
+    tiles = read_tiles(path)
+    root_links = tiles[KMZ_DOC_NAME][0].findall("kml:Document/kml:NetworkLink", NS)
+    assert len(root_links) == 2
+
+    calls = []
+    for name, (root, link_name, lod) in tiles.items():
+        if name == KMZ_DOC_NAME:
+            continue
+        assert name.startswith("tiles/")
+        level = int(posixpath.basename(name).split("_")[0])
+        # Top-level tiles are always shown, sub-tiles once they are large on screen
+        assert lod == ((0, -1) if level == 0 else (LOD_PIXELS, -1))
+        count = int(re.match(r"(\d+) QSOs", link_name).group(1))
+        overview = root.find("kml:Document/kml:Folder[kml:name='Overview']", NS)
+        if overview is None:
+            # Leaf tile with the QSOs themselves
+            leaf_calls = qso_calls(root)
+            assert len(leaf_calls) == count
+            calls += leaf_calls
+            continue
+        # Split tile: aggregates with the QSO count per cell, then links to the sub-tiles
+        assert count > 60
+        aggregate_counts = [int(p.find("kml:name", NS).text) for p in overview.findall("kml:Placemark", NS)]
+        assert sum(aggregate_counts) == count
+        assert int(overview.find("kml:Region/kml:Lod/kml:maxLodPixels", NS).text) == 2 * LOD_PIXELS
+        children = root.findall("kml:Document/kml:NetworkLink", NS)
+        assert 1 <= len(children) <= 4
+        assert sum(int(link.find("kml:name", NS).text.split()[0]) for link in children) == count
+    assert sorted(calls) == sorted(q["call"] for q in qsos[:400])
+
+
+@pytest.mark.parametrize("count, split", [(TILE_MAX_QSOS, False), (TILE_MAX_QSOS + 1, True)])
+def test_tile_is_split_above_max_qsos(tmp_path, count, split):
+    # All QSOs in the eastern hemisphere, on two spots
+    path = str(tmp_path / "tiles.kmz")
+    export_qsos_to_kmz_tiles(make_qsos(count, ["JO31", "PM95"]), path, "FN31")
+    tiles = read_tiles(path)
+    assert set(tiles) == {KMZ_DOC_NAME, "tiles/0_1_0.kml"} | ({"tiles/1_2_1.kml", "tiles/1_3_1.kml"} if split else set())
+    assert (tiles["tiles/0_1_0.kml"][0].find("kml:Document/kml:Folder[kml:name='Overview']", NS) is not None) == split
+    leaves = [root for name, (root, _, _) in tiles.items() if name != KMZ_DOC_NAME and (name != "tiles/0_1_0.kml" or not split)]
+    assert sum(len(qso_calls(root)) for root in leaves) == count
+
+
+def test_without_qth_there_are_no_tiles(tmp_path):
+    path = str(tmp_path / "tiles.kmz")
+    export_qsos_to_kmz_tiles(make_qsos(10), path)
+    with zipfile.ZipFile(path) as kmz:
+        assert kmz.namelist() == [KMZ_DOC_NAME]
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+pytest.importorskip("PySide6.QtWebEngineWidgets", exc_type=ImportError)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+
+from core.config_manager import ConfigManager
+from gui.map_preview import CANVAS_DATA_FILE, RENDER_CANVAS, MapPreview
+from gui.map_scheme import PAGE_FILE
+
+# QWebEngineView.setHtml() limit
+SET_HTML_LIMIT = 2 * 1024 * 1024
+
+
+@pytest.fixture
+def preview(monkeypatch):
+    config = dict(ConfigManager.load(), my_grid="JO31", map_render_mode=RENDER_CANVAS, tile_cache=False)
+    monkeypatch.setattr(ConfigManager, "load", staticmethod(lambda: dict(config)))
+    app = QApplication.instance() or QApplication([])
+    widget = MapPreview()
+    yield widget
+    widget.deleteLater()
+    app.processEvents()
+
+
+def test_canvas_payload_is_not_inlined(preview):
+    grids = ["FN31", "PM95", "QF56", "KP20", "GG87"]
+    qsos = [
+        {"call": f"DL{i}ABC", "band": "20m", "mode": "CW", "gridsquare": grids[i % len(grids)] + "ab",
+         "date": "20240101", "time": "1200"}
+        for i in range(120000)
+    ]
+    _plan, page = preview.build_html(qsos)
+    assert len(page.files[CANVAS_DATA_FILE]) > SET_HTML_LIMIT
+    html = page.files[PAGE_FILE]
+    assert len(html) < SET_HTML_LIMIT
+    assert f'src="{CANVAS_DATA_FILE}"'.encode() in html
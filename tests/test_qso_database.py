@@ -0,0 +1,53 @@
+from utils.qso_database import QSODatabase, area_fields, database_filters
+from utils.spatial_index import apply_area_filter
+
+GRIDS = ["JO31", "JO62", "JN58", "IO91", "FN31", "KP20", "PM95", "RR73", "AA00", "JJ00"]
+
+
+def calls(store):
+    column = store.column("call")
+    return [column[i] for i in range(len(store))]
+
+
+def make_db(tmp_path):
+    qsos = [
+        {"call": f"DL{i}ABC", "band": "20m" if i % 2 else "40m", "mode": "CW",
+         "gridsquare": GRIDS[i % len(GRIDS)], "qso_date": f"2024{1 + i % 12:02d}01", "time_on": "1200"}
+        for i in range(1000)
+    ]
+    db = QSODatabase(str(tmp_path / "qsos.sqlite"))
+    db.import_qsos(qsos)
+    return db
+
+
+def test_area_filter_matches_full_query(tmp_path):
+    with make_db(tmp_path) as db:
+        for radius in (300, 1500, 8000):
+            config = {"my_grid": "JO31", "area_radius_km": radius}
+            filtered = apply_area_filter(db.query(**database_filters(config)), "JO31", radius)
+            full = apply_area_filter(db.query(), "JO31", radius)
+            assert calls(filtered) == calls(full)
+            assert db.count(**database_filters(config)) <= db.count()
+
+
+def test_filters_from_settings(tmp_path):
+    with make_db(tmp_path) as db:
+        config = {"db_bands": ["20m"], "db_date_from": "20240301", "db_date_to": "20240531"}
+        store = db.query(**database_filters(config))
+        assert len(store) == db.count(bands=["20m"], date_from="20240301", date_to="20240531") > 0
+        assert {store.column("band")[i] for i in range(len(store))} == {"20m"}
+    assert database_filters({"db_bands": [], "db_date_from": "", "area_radius_km": 0, "db_max_qsos": 0}) == {}
+    assert area_fields("JO31", 0) is None
+    assert area_fields("JO31", 20000) is None
+    assert area_fields("JO31", 500) == ["IN", "IO", "JN", "JO"]
+
+
+def test_latest_qsos_are_capped_by_default(tmp_path):
+    with make_db(tmp_path) as db:
+        store = db.query(**database_filters({"db_max_qsos": 100}))
+        dates = [store.column("date")[i] for i in range(len(store))]
+        assert len(store) == 100
+        assert dates == sorted(dates)
+        assert dates[-1] == "20241201"
+        assert len(db.query(**database_filters({"db_max_qsos": 0}))) == db.count() == 1000
+        assert database_filters({})["limit"] > 0
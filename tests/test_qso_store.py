@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+
+from utils import qso_store
+from utils.qso_store import CACHE_SUFFIX, CATEGORICAL_FIELDS, STRING_FIELDS, QSOStore
+
+RECORD = "<CALL:{}>{}<BAND:3>20M<MODE:2>CW<GRIDSQUARE:4>JO31<NAME:6>Jürgen<QSO_DATE:8>20240102<TIME_ON:4>1234<EOR>\n"
+
+
+def write_log(path, calls):
+    text = "<ADIF_VER:5>3.1.4 <EOH>\n" + "".join(RECORD.format(len(call), call) for call in calls)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def assert_same_columns(a, b):
+    for field in STRING_FIELDS:
+        assert np.array_equal(a.column(field).offsets, b.column(field).offsets)
+        assert np.array_equal(a.column(field).data, b.column(field).data)
+    for field in CATEGORICAL_FIELDS:
+        assert np.array_equal(a.column(field).codes, b.column(field).codes)
+        assert list(a.column(field).categories) == list(b.column(field).categories)
+    assert np.array_equal(a.lat, b.lat, equal_nan=True)
+    assert np.array_equal(a.lon, b.lon, equal_nan=True)
+
+
+def test_cache_round_trip(tmp_path):
+    path = write_log(tmp_path / "log.adi", ["DL1ABC", "OH2XYZ", "K1ABC"])
+    parsed = QSOStore.load_adif(path)
+    assert os.path.exists(path + CACHE_SUFFIX)
+    cached = QSOStore.load_adif(path)
+    assert cached._mmap is not None
+    assert_same_columns(parsed, cached)
+    assert list(cached) == list(parsed)
+
+
+def test_cache_is_stale_after_source_changes(tmp_path):
+    path = write_log(tmp_path / "log.adi", ["DL1ABC", "OH2XYZ"])
+    QSOStore.load_adif(path)
+    cache_path = path + CACHE_SUFFIX
+    assert QSOStore.load(cache_path, source=path) is not None
+
+    # Same size, other mtime
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert QSOStore.load(cache_path, source=path) is None
+
+    # Other size, same mtime: the new QSO is parsed, not taken from the cache
+    QSOStore.load_adif(path)
+    st = os.stat(path)
+    write_log(tmp_path / "log.adi", ["DL1ABC", "OH2XYZ", "K1ABC"])
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert QSOStore.load(cache_path, source=path) is None
+    store = QSOStore.load_adif(path)
+    assert store._mmap is None
+    assert [qso["call"] for qso in store] == ["DL1ABC", "OH2XYZ", "K1ABC"]
+    assert len(QSOStore.load(cache_path, source=path)) == 3
+
+
+def test_cache_of_other_version_is_ignored(tmp_path, monkeypatch):
+    path = write_log(tmp_path / "log.adi", ["DL1ABC"])
+    QSOStore.load_adif(path)
+    monkeypatch.setattr(qso_store, "CACHE_VERSION", qso_store.CACHE_VERSION + 1)
+    assert QSOStore.load(path + CACHE_SUFFIX, source=path) is None
+    store = QSOStore.load_adif(path)
+    assert store._mmap is None
+    assert QSOStore.load(path + CACHE_SUFFIX, source=path) is not None
+
+
+def test_broken_cache_is_ignored(tmp_path):
+    path = write_log(tmp_path / "log.adi", ["DL1ABC"])
+    (tmp_path / ("log.adi" + CACHE_SUFFIX)).write_bytes(b"not a cache")
+    assert [qso["call"] for qso in QSOStore.load_adif(path)] == ["DL1ABC"]
@@ -0,0 +1,30 @@
+import pickle
+
+from utils.qso_store import StringColumn
+from utils.render_plan import RenderPlan
+
+
+def _qsos(count):
+    return [{"call": f"DL{i}ABC", "band": "20m", "mode": "CW", "gridsquare": "JO31", "name": "Müller",
+             "date": f"202401{i % 28 + 1:02d}", "time": "1234"} for i in range(count)]
+
+
+def test_strings_are_formatted_on_access():
+    plan = RenderPlan(_qsos(30), "JO40", lang="de")
+    assert isinstance(plan.calls, StringColumn)
+    assert plan.calls[29] == "DL29ABC"
+    assert plan.names[0] == "Müller"
+    assert plan.dates[1] == "02.01.2024"
+    assert plan.times[0] == "12:34"
+    assert list(plan.restyled(lang="en").dates)[:2] == ["2024-01-01", "2024-01-02"]
+    assert plan.dates[0] == "01.01.2024"
+
+
+def test_pickled_plan_holds_no_per_qso_strings():
+    plan = RenderPlan(_qsos(5000), "JO40")
+    plan.dates[0], plan.times[0]
+    copy = pickle.loads(pickle.dumps(plan))
+    assert len(pickle.dumps(plan)) < 2 * len(pickle.dumps(plan.store))
+    assert [copy.dates[i] for i in range(3)] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert copy.calls[4999] == "DL4999ABC"
+    assert copy.calls is copy.store.column("call")
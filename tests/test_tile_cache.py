@@ -0,0 +1,29 @@
+from utils.tile_cache import TileCache
+
+TILE = b"x" * 100000
+
+
+def test_hits_are_batched_and_keep_tiles(tmp_path):
+    path = str(tmp_path / "tiles.sqlite")
+    cache = TileCache(path, max_mb=1)
+    for x in range(10):
+        cache.put("P", 1, x, 0, TILE)
+    changes = cache.conn.total_changes
+    for _ in range(100):
+        assert cache.get("P", 1, 0, 0) == TILE
+    # No write per hit
+    assert cache.conn.total_changes == changes
+    # Over the cap: the least recently used tiles go, the tile just read stays
+    cache.put("P", 1, 10, 0, TILE)
+    assert ("P", 1, 0, 0) in cache
+    assert ("P", 1, 1, 0) not in cache
+
+
+def test_hits_are_written_on_close(tmp_path):
+    path = str(tmp_path / "tiles.sqlite")
+    with TileCache(path) as cache:
+        cache.put("P", 1, 0, 0, TILE)
+        before = cache.conn.execute("SELECT used FROM tiles").fetchone()[0]
+        cache.get("P", 1, 0, 0)
+    with TileCache(path) as cache:
+        assert cache.conn.execute("SELECT used FROM tiles").fetchone()[0] > before
@@ -0,0 +1,39 @@
+import numpy as np
+
+from utils.render_plan import RenderPlan
+from utils.view_tiles import DETAIL_ZOOM, MAX_REQUEST_TILES, MAX_TILE_QSOS, ViewTiles, tile_keys
+
+
+def test_overfull_detail_tile_is_continued():
+    count = 2 * MAX_TILE_QSOS + 123
+    qsos = [{"call": f"DL{i}ABC", "band": "20m", "mode": "CW", "gridsquare": "JO31"} for i in range(count)]
+    plan = RenderPlan(qsos, "FN31")
+    source = ViewTiles(plan)
+    x, y = tile_keys(plan.lat[:1], plan.lon[:1], DETAIL_ZOOM)
+    calls, keys = [], [[int(x[0]), int(y[0])]]
+    while keys:
+        result = source.tiles(DETAIL_ZOOM + 2, keys)
+        assert len(result["rows"]["call"]) <= MAX_TILE_QSOS
+        calls += result["rows"]["call"]
+        keys = result["more"]
+    assert sorted(calls) == sorted(q["call"] for q in qsos)
+    assert source.tiles(0, [[0, 0]])["more"] == []
+    assert np.sum(plan.valid) == count
+
+
+def test_keys_beyond_the_request_limit_are_returned():
+    qsos = [{"call": f"DL{i}ABC", "band": "20m", "mode": "CW", "gridsquare": grid}
+            for i, grid in enumerate(["JO31", "FN31", "PM95", "QF56"] * 50)]
+    source = ViewTiles(RenderPlan(qsos, "JO40"))
+    zoom = 5
+    n = 1 << zoom
+    keys = [[x, y] for x in range(n) for y in range(n)]
+    assert len(keys) > MAX_REQUEST_TILES
+    count, requests = 0, 0
+    while keys:
+        result = source.tiles(zoom, keys)
+        count += sum(result["clusters"]["count"])
+        keys = result["more"]
+        requests += 1
+    assert count == len(qsos)
+    assert requests == -(-n * n // MAX_REQUEST_TILES)
@@ -0,0 +1,61 @@
+"""
+Follow mode for live ADIF logs
+------------------------------
+Logging programs append QSOs to their ADIF file while a contest runs.
+AdifFollower remembers the byte offset just past the last complete <eor>
+record and, on every poll, parses only the bytes appended since then.
+A record that is still being written stays unread until its <eor> arrives.
+"""
+
+import codecs
+import logging
+import os
+
+from utils.adif_parser import iter_complete_records
+
+
+class AdifFollower:
+    """
+    Incremental reader for a growing ADIF file.
+
+    Usage:
+        follower = AdifFollower("live.adi")
+        qsos = follower.poll()   # all QSOs so far
+        ...
+        new = follower.poll()    # only QSOs appended since the last poll
+    """
+
+    def __init__(self, filepath, offset=0):
+        self.filepath = filepath
+        self.offset = offset
+
+    def poll(self):
+        """Return the list of QSO dicts completed since the last poll."""
+        size = os.path.getsize(self.filepath)
+        if size < self.offset:
+            # File was truncated or replaced: start over
+            logging.info(f"{self.filepath} shrank from {self.offset} to {size} bytes, re-reading from start")
+            self.offset = 0
+        if size == self.offset:
+            return []
+        with open(self.filepath, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+
+        try:
+            # Not final: a multi-byte character cut off at the end stays pending
+            text = codecs.getincrementaldecoder("utf-8")().decode(data, False)
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            text = data.decode("cp1252", errors="replace")
+            encoding = "cp1252"
+
+        qsos, end = [], 0
+        for qso, end in iter_complete_records(text):
+            qsos.append(qso)
+        if end:
+            # cp1252 is one byte per character, UTF-8 text re-encodes exactly
+            self.offset += end if encoding == "cp1252" else len(text[:end].encode("utf-8"))
+        if qsos:
+            logging.debug(f"Follow {self.filepath}: {len(qsos)} new QSOs, offset {self.offset}")
+        return qsos
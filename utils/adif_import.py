@@ -0,0 +1,139 @@
+"""
+Multi-file ADIF import for QSOMap2KML
+-------------------------------------
+Parses many ADIF files (or whole folders) concurrently in a process pool and
+merges the results:
+- Each worker parses one file into a QSOStore and hashes the QSO keys
+  (call, qso_date, time_on, band, mode)
+- The parent merges the stores in input order and drops every QSO whose key
+  hash was already seen, reporting the drop count per file
+"""
+
+import glob
+import hashlib
+import logging
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from utils.log_reader import iter_qsos
+from utils.app_utils import call_progress
+from utils.qso_store import QSOStore, project_qso
+
+ADIF_EXTENSIONS = (".adi", ".adif", ".adx")
+
+
+def expand_adif_paths(paths):
+    """
+    Resolve files, folders and glob patterns to a sorted, duplicate free list
+    of ADIF files. Folders contribute their ADIF files (not recursive).
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+            files.extend(c for c in candidates if c.lower().endswith(ADIF_EXTENSIONS) and os.path.isfile(c))
+        elif glob.has_magic(path):
+            files.extend(sorted(c for c in glob.glob(path) if os.path.isfile(c)))
+        else:
+            files.append(path)
+    unique, seen = [], set()
+    for f in files:
+        key = os.path.abspath(f)
+        if key not in seen:
+            seen.add(key)
+            unique.append(f)
+    return unique
+
+
+def qso_key_hash(row):
+    """64 bit hash of the duplicate key of a row in utils.qso_store.FIELDS order."""
+    call, band, mode, _grid, _name, date, time = row
+    key = "\x1f".join((call, date, time, band, mode)).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def parse_adif_file(filepath):
+    """
+    Parse one ADIF or ADX file into (QSOStore, key hashes as uint64 array).
+    Runs in the worker processes; the result is compact to send back.
+    """
+    hashes = array("Q")
+
+    def rows():
+        for qso in iter_qsos(filepath):
+            row = project_qso(qso)
+            hashes.append(qso_key_hash(row))
+            yield row
+
+    store = QSOStore.from_rows(rows())
+    return store, np.frombuffer(hashes, dtype=np.uint64)
+
+
+def import_adif_files(paths, max_workers=None, progress_callback=None):
+    """
+    Parse ADIF files concurrently and merge them without duplicates.
+
+    Args:
+        paths (list): Files, folders or glob patterns.
+        max_workers (int): Worker processes (default: number of CPUs).
+        progress_callback (callable): Called with (files_done, files_total).
+
+    Returns:
+        (QSOStore, report) where report maps each file to
+        {"parsed": n, "duplicates": d}; files that could not be read are
+        reported with an "error" entry instead of aborting the import.
+    """
+    files = expand_adif_paths(paths)
+    if not files:
+        raise ValueError("No ADIF files found.")
+    results, errors = {}, {}
+    total = len(files)
+    if total == 1 or (max_workers or os.cpu_count() or 1) == 1:
+        for done, filepath in enumerate(files, 1):
+            try:
+                results[filepath] = parse_adif_file(filepath)
+            except Exception as e:
+                errors[filepath] = e
+            call_progress(progress_callback, done, total)
+    else:
+        # spawn: the GUI imports on a worker thread, and forking a threaded process is not safe
+        pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = {pool.submit(parse_adif_file, filepath): filepath for filepath in files}
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    errors[futures[future]] = e
+                call_progress(progress_callback, done, total)
+        finally:
+            # A progress callback may raise to abort (cancelled job): drop the files not started yet
+            pool.shutdown(cancel_futures=True)
+    for filepath, e in errors.items():
+        logging.error(f"Error parsing ADIF file {filepath}: {e}")
+    if not results:
+        raise ValueError(f"No QSOs could be read: {next(iter(errors.values()))}")
+    files = [f for f in files if f in results]
+
+    # Keep the first occurrence of every key, in input file order
+    all_hashes = np.concatenate([results[f][1] for f in files])
+    keep = np.zeros(len(all_hashes), dtype=bool)
+    keep[np.unique(all_hashes, return_index=True)[1]] = True
+
+    parts, report = [], {}
+    start = 0
+    for filepath in files:
+        store = results[filepath][0]
+        mask = keep[start:start + len(store)]
+        start += len(store)
+        kept = int(mask.sum())
+        report[filepath] = {"parsed": len(store), "duplicates": len(store) - kept}
+        parts.append(store if kept == len(store) else store.take(np.flatnonzero(mask)))
+        logging.info(f"Imported {filepath}: {len(store)} QSOs, {len(store) - kept} duplicates dropped")
+    for filepath, e in errors.items():
+        report[filepath] = {"parsed": 0, "duplicates": 0, "error": str(e)}
+    return QSOStore.concat(parts), report
@@ -1,40 +1,224 @@
+"""
+Streaming ADIF parser for QSOMap2KML
+------------------------------------
+Reads ADIF (.adi) logs chunk by chunk, so memory use does not depend on the
+file size:
+- UTF-8 with a switch to cp1252 at the first byte that is not valid UTF-8
+- Values are sliced by their declared length, so they may contain '<' or '>'
+- Lengths count characters; byte counts that some loggers write for UTF-8
+  values are detected (see _value_end)
+- iter_complete_records() parses a log that is still being written (follow mode)
+"""
+
+import codecs
 import logging
 
+# Bytes read from disk per step; the parser never holds more than one chunk
+# plus the record currently being assembled.
+CHUNK_SIZE = 64 * 1024
+
+# Characters after a value that are looked at to tell character from byte counted lengths
+TAG_LOOKAHEAD = 64
+
+# Enumeration fields whose value case is not significant in ADIF. They are
+# normalized so that band color lookups match regardless of the logger used.
+LOWERCASE_FIELDS = ("band", "band_rx")
+
+
+def _iter_text(fileobj, chunk_size=CHUNK_SIZE):
+    """
+    Decode a binary file object chunk by chunk.
+    Starts with UTF-8 and switches to cp1252 for the rest of the file at the
+    first invalid UTF-8 sequence (the text before it stays UTF-8), without
+    reading the file again.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    encoding = "utf-8"
+    while True:
+        raw = fileobj.read(chunk_size)
+        final = not raw
+        try:
+            text = decoder.decode(raw, final)
+        except UnicodeDecodeError as e:
+            if encoding != "utf-8":
+                raise
+            # e.start indexes the bytes held back from the last chunk plus this one:
+            # the valid part before the bad byte is still UTF-8
+            pending, _ = decoder.getstate()
+            data = pending + raw
+            decoder = codecs.getincrementaldecoder("cp1252")(errors="replace")
+            encoding = "cp1252"
+            logging.debug("ADIF Content cp1252")
+            text = data[:e.start].decode("utf-8") + decoder.decode(data[e.start:], final)
+        if text:
+            yield text
+        if final:
+            return
+
+
+def _tag_follows(buf, pos):
+    """True if the next non-blank character at pos starts a tag (or nothing follows)."""
+    rest = buf[pos:pos + TAG_LOOKAHEAD].lstrip()
+    return not rest or rest[0] == "<"
+
+
+def _utf8_length_end(buf, start, nbytes):
+    """Index where a value of nbytes UTF-8 bytes starting at start ends."""
+    count = 0
+    i = start
+    while i < len(buf):
+        size = len(buf[i].encode("utf-8", errors="replace"))
+        if count + size > nbytes:
+            break
+        count += size
+        i += 1
+    return i
+
+
+def _value_end(buf, start, length):
+    """
+    Index where a value with the declared length starting at start ends.
+    The length counts characters; if the value is not ASCII and no tag follows
+    it, but one follows when the length is read as UTF-8 bytes (written so by
+    some loggers), the byte count is used. Needs TAG_LOOKAHEAD characters
+    after the value in buf, unless the file ends there.
+    """
+    end = start + length
+    if buf[start:end].isascii() or _tag_follows(buf, end):
+        return end
+    byte_end = _utf8_length_end(buf, start, length)
+    return byte_end if _tag_follows(buf, byte_end) else end
+
+
+def _iter_records(chunks, with_offsets=False):
+    """
+    Turn decoded text chunks into QSO dicts.
+    With with_offsets, yields (qso, end) where end is the character offset just
+    past the record's <eor>, and a trailing record without <eor> is not yielded.
+
+    Tags are read as <name:length[:type]>value. The declared length is used to
+    slice the value, so values may contain '<' or '>'. Lengths are characters;
+    byte counts written by some loggers for UTF-8 values are detected. Tags without a length
+    (other than <eor>/<eoh>) fall back to reading up to the next '<'.
+    Fields seen before <eoh> belong to the header and are dropped.
+    """
+    buf = ""
+    pos = 0
+    consumed = 0
+    eof = False
+    record = {}
+    chunks = iter(chunks)
+
+    def fill():
+        nonlocal buf, pos, consumed, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return False
+        consumed += pos
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        lt = buf.find("<", pos)
+        if lt < 0:
+            pos = len(buf)
+            if not fill():
+                break
+            continue
+        gt = buf.find(">", lt + 1)
+        if gt < 0:
+            pos = lt
+            if not fill():
+                break
+            continue
+
+        parts = buf[lt + 1:gt].split(":")
+        name = parts[0].strip().lower()
+        start = gt + 1
+        if name == "eor":
+            if record:
+                yield (record, consumed + start) if with_offsets else record
+            record = {}
+            pos = start
+            continue
+        if name == "eoh":
+            record = {}
+            pos = start
+            continue
+
+        length = parts[1].strip() if len(parts) > 1 else ""
+        if length.isdigit():
+            # The value and what follows it have to be in buf (see _value_end)
+            if start + int(length) + TAG_LOOKAHEAD > len(buf) and not eof:
+                pos = lt
+                fill()
+                continue
+            end = _value_end(buf, start, int(length))
+            value = buf[start:end]
+        else:
+            end = buf.find("<", start)
+            if end < 0 and not eof:
+                pos = lt
+                fill()
+                continue
+            if end < 0:
+                end = len(buf)
+            value = buf[start:end]
+        pos = end
+
+        value = value.strip()
+        if name:
+            if name in LOWERCASE_FIELDS:
+                value = value.lower()
+            record[name] = value
+
+    if record and not with_offsets:
+        yield record
+
+
+def iter_adif(filepath, chunk_size=CHUNK_SIZE):
+    """
+    Streaming ADIF parser: yields one dict per QSO while reading the file.
+    Field names are lowercased, values are kept as written (except the band,
+    see LOWERCASE_FIELDS). Memory use does not depend on the file size.
+    Raises ValueError if the file holds nothing but whitespace.
+    """
+    seen_content = False
+
+    def checked(chunks):
+        nonlocal seen_content
+        for text in chunks:
+            if not seen_content and text.strip():
+                seen_content = True
+            yield text
+
+    with open(filepath, "rb") as f:
+        yield from _iter_records(checked(_iter_text(f, chunk_size)))
+    if not seen_content:
+        raise ValueError("ADIF file is empty or could not be read.")
+
+
+def iter_complete_records(text):
+    """
+    Parse ADIF text that may end in the middle of a record (e.g. a log that
+    is still being written). Yields (qso, end) pairs where end is the
+    character offset just past the record's <eor>; the unfinished tail is
+    not yielded.
+    """
+    return _iter_records([text], with_offsets=True)
+
+
 def parse_adif(filepath):
     """
-    Very simple ADIF parser: returns a list of dicts for each QSO.
-    Only supports basic ADIF fields.
+    Parses an ADIF file and returns a list of dicts for each QSO.
+    Thin wrapper around iter_adif for callers that need the whole log.
     """
-    qsos = []
     try:
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                content = f.read().lower()
-                logging.debug(f"ADIF Content utf-8")
-        except UnicodeDecodeError:
-            with open(filepath, "r", encoding="cp1252") as f:
-                content = f.read().lower()
-                logging.debug(f"ADIF Content cp1252")
-        # Prüfung und Parsen jetzt außerhalb!
-        if not content.strip():
-            raise ValueError("ADIF file is empty or could not be read.")    
-        records = content.split('<eor>')
-        for record in records:
-            qso = {}
-            fields = record.split('<')
-            for field in fields:
-                if '>' in field:
-                    keyval = field.split('>', 1)
-                    if len(keyval) == 2:
-                        key, val = keyval
-                        key = key.split(':')[0].strip()
-                        val = val.strip()
-                        if key:
-                            qso[key] = val
-            if qso:
-                qsos.append(qso)
+        qsos = list(iter_adif(filepath))
         logging.info(f"Parsed {len(qsos)} QSOs from {filepath}")
     except Exception as e:
         logging.error(f"Error parsing ADIF file {filepath}: {e}")
         raise
-    return qsos
\ No newline at end of file
+    return qsos
@@ -0,0 +1,68 @@
+"""
+ADX (XML ADIF) import for QSOMap2KML
+------------------------------------
+Streams <RECORD> elements with an incremental XML pull parser and yields the
+same QSO dicts as utils.adif_parser.iter_adif:
+- Field names are lowercased (APP fields become app_<programid>_<fieldname>,
+  USERDEF fields use their FIELDNAME)
+- Every finished record is cleared from the tree, so memory stays constant
+  no matter how large the export is
+"""
+
+import xml.etree.ElementTree as ET
+
+from utils.adif_parser import LOWERCASE_FIELDS
+
+
+def _local_name(tag):
+    """Tag name without XML namespace, lowercased."""
+    return tag.rsplit("}", 1)[-1].lower()
+
+
+def _field_name(elem, tag):
+    if tag == "app":
+        return f"app_{elem.get('PROGRAMID', '')}_{elem.get('FIELDNAME', '')}".lower()
+    if tag == "userdef":
+        return elem.get("FIELDNAME", "").lower()
+    return tag
+
+
+def iter_adx(filepath):
+    """
+    Streaming ADX parser: yields one dict per QSO while reading the file.
+    Raises ValueError if the file contains no ADX document.
+    """
+    records_parent = None
+    record = None
+    is_adx = False
+    try:
+        for event, elem in ET.iterparse(filepath, events=("start", "end")):
+            tag = _local_name(elem.tag)
+            if event == "start":
+                if tag in ("adx", "records"):
+                    is_adx = True
+                if tag == "records":
+                    records_parent = elem
+                elif tag == "record":
+                    record = {}
+                continue
+            if tag == "record":
+                if record:
+                    yield record
+                record = None
+                # Drop the finished record (and its fields) from the tree
+                if records_parent is not None:
+                    records_parent.clear()
+                else:
+                    elem.clear()
+            elif record is not None:
+                name = _field_name(elem, tag)
+                value = (elem.text or "").strip()
+                if name:
+                    if name in LOWERCASE_FIELDS:
+                        value = value.lower()
+                    record[name] = value
+    except ET.ParseError as e:
+        raise ValueError(f"Invalid ADX file: {e}") from e
+    if not is_adx:
+        raise ValueError(f"Invalid ADX file: no ADX or RECORDS element in {filepath}")
@@ -0,0 +1,118 @@
+"""
+Marker clustering for the QSOMap2KML map preview
+------------------------------------------------
+Precomputes a cluster hierarchy once per log instead of clustering in the
+browser on every pan:
+- Positions are projected to Web Mercator and binned into square cells of
+  CLUSTER_CELL_PX screen pixels for every zoom level up to CLUSTER_MAX_ZOOM
+- Cells halve from one zoom level to the next, so every cluster splits into
+  the clusters of its cell at the next level (a strict hierarchy)
+- Each cluster has its QSO count, mean position, per-band and per-mode
+  counts and the zoom level at which it splits (to zoom to on click)
+All levels are computed with a few sorts over the position arrays.
+"""
+
+import numpy as np
+
+# Cell size in screen pixels (a power of two fraction of the 256 px tile)
+CLUSTER_CELL_PX = 64
+# Deepest zoom level with clusters; above it the single QSOs are shown
+CLUSTER_MAX_ZOOM = 9
+TILE_SIZE = 256
+# Web Mercator is limited to this latitude
+MAX_LATITUDE = 85.05112878
+
+
+def mercator_xy(lat, lon):
+    """Normalized Web Mercator coordinates (0..1, y downwards) of lat/lon arrays."""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    sin = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * np.pi)
+    return np.clip(x, 0.0, 1.0 - 1e-12), np.clip(y, 0.0, 1.0 - 1e-12)
+
+
+def _breakdown(ids, codes, n_clusters):
+    """Per cluster: [code, count, code, count, ...], most frequent first."""
+    n_codes = int(codes.max()) + 1 if len(codes) else 1
+    keys, counts = np.unique(ids.astype(np.int64) * n_codes + codes, return_counts=True)
+    cluster, code = keys // n_codes, keys % n_codes
+    order = np.lexsort((-counts, cluster))
+    cluster, code, counts = cluster[order], code[order], counts[order]
+    starts = np.searchsorted(cluster, np.arange(n_clusters + 1))
+    pairs = np.stack([code, counts], axis=1)
+    return [pairs[starts[c]:starts[c + 1]].ravel().tolist() for c in range(n_clusters)]
+
+
+class ClusterLevel:
+    """
+    Clusters of one zoom level (arrays indexed by cluster).
+
+    Attributes:
+        zoom (int): Zoom level.
+        lat, lon (ndarray): Mean position of the members.
+        count (ndarray): Number of QSOs.
+        first (ndarray): Index of the first member (for single QSO clusters).
+        expansion_zoom (ndarray): Zoom level at which the cluster splits.
+        bands, modes (list): Per cluster [code, count, ...], most frequent first.
+        ids (ndarray): Cluster of every point.
+    """
+
+    def __init__(self, zoom, ids, lat, lon, band_codes, mode_codes):
+        self.zoom = zoom
+        self.ids = ids
+        n = int(ids.max()) + 1 if len(ids) else 0
+        self.count = np.bincount(ids, minlength=n)
+        self.lat = np.bincount(ids, weights=lat, minlength=n) / np.maximum(self.count, 1)
+        self.lon = np.bincount(ids, weights=lon, minlength=n) / np.maximum(self.count, 1)
+        first = np.full(n, len(ids), dtype=np.int64)
+        np.minimum.at(first, ids, np.arange(len(ids)))
+        self.first = first
+        self.bands = _breakdown(ids, band_codes, n)
+        self.modes = _breakdown(ids, mode_codes, n)
+        self.expansion_zoom = np.full(n, zoom + 1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.count)
+
+
+def cluster_levels(lat, lon, band_codes, mode_codes, max_zoom=CLUSTER_MAX_ZOOM, cell_px=CLUSTER_CELL_PX):
+    """
+    Cluster hierarchy of points for zoom levels 0..max_zoom.
+
+    Args:
+        lat, lon (ndarray): Positions (all valid).
+        band_codes, mode_codes (ndarray): Category codes per point for the breakdowns.
+
+    Returns:
+        List of ClusterLevel, index = zoom level.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    band_codes = np.asarray(band_codes, dtype=np.int64)
+    mode_codes = np.asarray(mode_codes, dtype=np.int64)
+    x, y = mercator_xy(lat, lon)
+    cells_per_tile = TILE_SIZE // cell_px
+    levels = []
+    for zoom in range(max_zoom + 1):
+        cells = cells_per_tile << zoom
+        key = (y * cells).astype(np.int64) * cells + (x * cells).astype(np.int64)
+        # Cluster ids in order of the first member
+        _, first_index, ids = np.unique(key, return_index=True, return_inverse=True)
+        rank = np.empty(len(first_index), dtype=np.int64)
+        rank[np.argsort(first_index, kind="stable")] = np.arange(len(first_index))
+        levels.append(ClusterLevel(zoom, rank[ids].ravel(), lat, lon, band_codes, mode_codes))
+
+    # Expansion zoom, bottom up: a cluster with one child splits where that child splits
+    for zoom in range(max_zoom - 1, -1, -1):
+        level, finer = levels[zoom], levels[zoom + 1]
+        if not len(level):
+            continue
+        pairs = np.unique(level.ids * len(finer) + finer.ids)
+        parent, child = pairs // len(finer), pairs % len(finer)
+        children = np.bincount(parent, minlength=len(level))
+        only_child = np.zeros(len(level), dtype=np.int64)
+        only_child[parent] = child
+        single = children == 1
+        level.expansion_zoom[single] = finer.expansion_zoom[only_child[single]]
+    return levels
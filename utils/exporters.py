@@ -0,0 +1,230 @@
+"""
+Exporters for QSOMap2KML
+------------------------
+One interface for all output formats, fed by the same RenderPlan (parsed,
+geocoded and measured QSOs, see utils.render_plan):
+- KML and KMZ for Google Earth (utils.kml_export)
+- GeoJSON text sequence: one Feature per line, for web maps (*.geojsonl)
+- CSV with one row per QSO, for spreadsheets
+export_qsos() writes any number of files in one pass over the plan: the
+QSOs are fed to every exporter in chunks, so several formats cost one
+import and one geocoding run. New formats subclass Exporter and are
+registered with register_exporter().
+"""
+
+import csv
+import json
+import os
+
+import numpy as np
+
+from utils.app_utils import call_progress
+from utils.render_plan import FormattedColumn, as_render_plan, format_adif_date
+from utils.qso_groups import AGGREGATE_OFF
+from utils.kml_export import EXPORT_CHUNK_QSOS, WRITE_BUFFER, export_qsos_to_kml, export_qsos_to_kmz
+
+CSV_COLUMNS = ("call", "band", "mode", "name", "date", "time", "gridsquare", "lat", "lon", "distance_km", "bearing_deg")
+
+
+class Exporter:
+    """
+    Base class of an output format. export_qsos() calls begin() once,
+    write() for consecutive chunks of QSO indices (log order) and end() once;
+    close() is called in any case, also after an error.
+    """
+
+    # File extensions handled by this exporter (lower case, with dot)
+    extensions = ()
+
+    def __init__(self, filename, **options):
+        self.filename = filename
+        self.options = options
+        self.out = None
+
+    def begin(self, plan, i18n=None):
+        pass
+
+    def write(self, plan, indices):
+        pass
+
+    def end(self, plan, progress_callback=None):
+        pass
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+
+class KmlExporter(Exporter):
+    """
+    KML for Google Earth. The document is ordered by band folders, so it is
+    written in end() from the plan instead of chunk by chunk.
+    Options: aggregate, max_workers (see utils.kml_export.export_qsos_to_kml).
+    """
+
+    extensions = (".kml",)
+    export = staticmethod(export_qsos_to_kml)
+
+    def begin(self, plan, i18n=None):
+        self.i18n = i18n
+
+    def end(self, plan, progress_callback=None):
+        self.export(
+            plan, self.filename, plan.my_locator, plan.band_colors, plan.mode_colors,
+            i18n=self.i18n, lang=plan.lang, progress_callback=progress_callback,
+            aggregate=self.options.get("aggregate", AGGREGATE_OFF),
+            area_radius_km=plan.area_radius_km, max_workers=self.options.get("max_workers", 1)
+        )
+
+
+class KmzExporter(KmlExporter):
+    """KML zipped together with the marker icon."""
+
+    extensions = (".kmz",)
+    export = staticmethod(export_qsos_to_kmz)
+
+
+class _TextExporter(Exporter):
+    """Exporter streaming UTF-8 text to its file."""
+
+    def begin(self, plan, i18n=None):
+        self.out = open(self.filename, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER)
+
+    def end(self, plan, progress_callback=None):
+        self.close()
+
+
+def _iso_dates(plan):
+    """ADIF dates as YYYY-MM-DD (the plan's dates are localized)."""
+    if plan.lang == "en":
+        return plan.dates
+
+    def build():
+        return FormattedColumn(plan.store.column("date"), format_adif_date)
+    return plan.derived("iso_dates", build, shared=True)
+
+
+def _qso_values(plan, indices):
+    """Per QSO of indices: rounded position and distance/bearing (None if unknown)."""
+    lat = np.round(plan.lat[indices], 6)
+    lon = np.round(plan.lon[indices], 6)
+    if plan.stats:
+        distance = np.round(plan.stats.distance[indices], 1)
+        bearing = np.round(plan.stats.bearing[indices], 1)
+    else:
+        distance = bearing = np.full(len(indices), np.nan)
+    valid = plan.valid[indices]
+    for k, i in enumerate(indices):
+        yield (
+            i, bool(valid[k]), float(lat[k]), float(lon[k]),
+            None if np.isnan(distance[k]) else float(distance[k]),
+            None if np.isnan(bearing[k]) else float(bearing[k])
+        )
+
+
+class GeoJsonSeqExporter(_TextExporter):
+    """
+    Newline-delimited GeoJSON: one Feature per QSO and line (Point geometry,
+    null for QSOs without a position), readable line by line by web maps.
+    """
+
+    extensions = (".geojsonl", ".geojsons", ".ndjson")
+
+    def write(self, plan, indices):
+        bands, modes, grids = plan.store.column("band"), plan.store.column("mode"), plan.store.column("gridsquare")
+        dates = _iso_dates(plan)
+        lines = []
+        for i, valid, lat, lon, distance, bearing in _qso_values(plan, indices):
+            feature = {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]} if valid else None,
+                "properties": {
+                    "call": plan.calls[i], "band": bands[i], "mode": modes[i], "name": plan.names[i],
+                    "date": dates[i], "time": plan.times[i], "gridsquare": grids[i],
+                    "distance_km": distance, "bearing_deg": bearing,
+                },
+            }
+            lines.append(json.dumps(feature, ensure_ascii=False, separators=(",", ":")))
+        if lines:
+            self.out.write("\n".join(lines) + "\n")
+
+
+class CsvExporter(_TextExporter):
+    """CSV with a header row and one row per QSO (columns: CSV_COLUMNS)."""
+
+    extensions = (".csv",)
+
+    def begin(self, plan, i18n=None):
+        super().begin(plan, i18n)
+        self.writer = csv.writer(self.out)
+        self.writer.writerow(CSV_COLUMNS)
+
+    def write(self, plan, indices):
+        bands, modes, grids = plan.store.column("band"), plan.store.column("mode"), plan.store.column("gridsquare")
+        dates = _iso_dates(plan)
+        self.writer.writerows(
+            (
+                plan.calls[i], bands[i], modes[i], plan.names[i], dates[i], plan.times[i], grids[i],
+                lat if valid else "", lon if valid else "",
+                "" if distance is None else distance, "" if bearing is None else bearing
+            )
+            for i, valid, lat, lon, distance, bearing in _qso_values(plan, indices)
+        )
+
+
+EXPORTERS = {}
+
+
+def register_exporter(exporter_class):
+    """Make an Exporter subclass available for its file extensions."""
+    for ext in exporter_class.extensions:
+        EXPORTERS[ext] = exporter_class
+    return exporter_class
+
+
+for _exporter_class in (KmlExporter, KmzExporter, GeoJsonSeqExporter, CsvExporter):
+    register_exporter(_exporter_class)
+
+
+def exporter_for(filename, **options):
+    """Exporter instance for a file name, chosen by its extension."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in EXPORTERS:
+        raise ValueError(f"Unknown export format '{ext or filename}' (supported: {', '.join(sorted(EXPORTERS))})")
+    return EXPORTERS[ext](filename, **options)
+
+
+def export_qsos(qsos, targets, my_locator=None, band_colors=None, mode_colors=None, i18n=None, lang="en",
+                progress_callback=None, area_radius_km=0, **options):
+    """
+    Export QSOs to one or more files in one pass.
+
+    Args:
+        qsos (RenderPlan, QSOStore or list): Render plan (reused if it matches
+            the settings), QSO store or list of QSO dicts.
+        targets (list): File names (format by extension) or Exporter instances.
+        options: Passed to the exporters created from file names
+            (aggregate, max_workers for KML/KMZ).
+        Other arguments as in utils.kml_export.export_qsos_to_kml.
+
+    Returns:
+        The RenderPlan that was exported.
+    """
+    plan = as_render_plan(qsos, my_locator, band_colors, mode_colors, lang, area_radius_km)
+    exporters = [t if isinstance(t, Exporter) else exporter_for(t, **options) for t in targets]
+    try:
+        for exporter in exporters:
+            exporter.begin(plan, i18n)
+        total = len(plan)
+        for start in range(0, total, EXPORT_CHUNK_QSOS):
+            indices = np.arange(start, min(start + EXPORT_CHUNK_QSOS, total))
+            for exporter in exporters:
+                exporter.write(plan, indices)
+            call_progress(progress_callback, indices[-1] + 1, total)
+        for exporter in exporters:
+            exporter.end(plan, progress_callback)
+    finally:
+        for exporter in exporters:
+            exporter.close()
+    return plan
@@ -0,0 +1,140 @@
+"""
+Great-circle paths for QSOMap2KML
+---------------------------------
+Computes the short great-circle path from the QTH to many stations at once:
+- All points of all paths in one vectorized NumPy pass (no per-QSO trigonometry)
+- Number of segments adapts to the distance (short paths stay two points)
+- Paths are split at the antimeridian, with a point on each edge, so map
+  renderers do not draw a line across the whole map
+- GreatCircleCache keeps the result per destination locator, as many QSOs
+  share a grid square
+"""
+
+import numpy as np
+
+from utils.grid_locator import locators_to_latlon
+
+# Longest segment between two path points
+MAX_SEGMENT_KM = 200.0
+# Upper bound for the segments of one path (about half the earth's circumference)
+MAX_SEGMENTS = 128
+
+_EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _split_antimeridian(lat, lon, path_id):
+    """
+    Insert edge points where a path crosses the antimeridian.
+    Returns the new lat/lon/path_id arrays and the start index of every part.
+    """
+    crossing = np.flatnonzero((np.abs(np.diff(lon)) > 180) & (path_id[1:] == path_id[:-1]))
+    if len(crossing):
+        lat0, lon0 = lat[crossing], lon[crossing]
+        lat1, lon1 = lat[crossing + 1], lon[crossing + 1]
+        edge = np.where(lon0 > 0, 180.0, -180.0)
+        t = (edge - lon0) / (lon1 + 2 * edge - lon0)
+        edge_lat = lat0 + t * (lat1 - lat0)
+        at = np.repeat(crossing + 1, 2)
+        lat = np.insert(lat, at, np.column_stack([edge_lat, edge_lat]).ravel())
+        lon = np.insert(lon, at, np.column_stack([edge, -edge]).ravel())
+        path_id = np.insert(path_id, at, np.repeat(path_id[crossing], 2))
+        # After insertion the second edge point of crossing k sits at crossing[k] + 2k + 2
+        part_starts = crossing + 2 * np.arange(len(crossing)) + 2
+    else:
+        part_starts = np.zeros(0, dtype=np.int64)
+    path_starts = np.flatnonzero(np.r_[True, path_id[1:] != path_id[:-1]])
+    return lat, lon, path_id, np.union1d(path_starts, part_starts)
+
+
+def great_circle_paths(lat0, lon0, lats, lons, max_segment_km=MAX_SEGMENT_KM):
+    """
+    Great-circle paths from (lat0, lon0) to every (lats[i], lons[i]).
+
+    Args:
+        lat0, lon0: Start point (QTH) in degrees.
+        lats, lons: Destination arrays in degrees.
+        max_segment_km: Longest straight segment of a path.
+
+    Returns:
+        List with one entry per destination: a list of parts, each an (n, 2)
+        array of (lat, lon) points. Paths crossing the antimeridian have two parts.
+    """
+    lats = np.asarray(lats, dtype=float).reshape(-1)
+    lons = np.asarray(lons, dtype=float).reshape(-1)
+    if len(lats) == 0:
+        return []
+    v0 = _unit_vectors(lat0, lon0)
+    v1 = _unit_vectors(lats, lons)
+
+    cos_d = np.clip(v1 @ v0, -1.0, 1.0)
+    dist = np.arccos(cos_d)
+    # Unit tangent at the start pointing along each path
+    tangent = v1 - cos_d[:, None] * v0
+    norm = np.linalg.norm(tangent, axis=1)
+    # Antipodal (or identical) points have no unique path: head north
+    north = np.array([-np.sin(np.radians(lat0)) * np.cos(np.radians(lon0)),
+                      -np.sin(np.radians(lat0)) * np.sin(np.radians(lon0)),
+                      np.cos(np.radians(lat0))])
+    degenerate = norm < 1e-12
+    tangent[degenerate] = north
+    norm[degenerate] = np.linalg.norm(north)
+    tangent /= norm[:, None]
+
+    segments = np.clip(np.ceil(dist * _EARTH_RADIUS_KM / max_segment_km), 1, MAX_SEGMENTS).astype(np.int64)
+    counts = segments + 1
+    path_id = np.repeat(np.arange(len(lats)), counts)
+    first = np.cumsum(counts) - counts
+    step = np.arange(counts.sum()) - np.repeat(first, counts)
+    angle = (step / np.repeat(segments, counts)) * dist[path_id]
+    points = np.cos(angle)[:, None] * v0 + np.sin(angle)[:, None] * tangent[path_id]
+
+    lat = np.degrees(np.arcsin(np.clip(points[:, 2], -1.0, 1.0)))
+    lon = np.degrees(np.arctan2(points[:, 1], points[:, 0]))
+    # Exact end points (no rounding noise at QTH and station)
+    lat[first], lon[first] = lat0, lon0
+    last = first + segments
+    lat[last], lon[last] = lats, lons
+
+    lat, lon, path_id, part_starts = _split_antimeridian(lat, lon, path_id)
+    parts = np.split(np.column_stack([lat, lon]), part_starts[1:])
+    paths = [[] for _ in range(len(lats))]
+    for part, owner in zip(parts, path_id[part_starts]):
+        paths[owner].append(part)
+    return paths
+
+
+class GreatCircleCache:
+    """
+    Great-circle paths from one QTH, cached per destination locator.
+
+    Usage:
+        cache = GreatCircleCache(my_lat, my_lon)
+        paths = cache.get(store.column("gridsquare").categories)
+    """
+
+    def __init__(self, lat0, lon0, max_segment_km=MAX_SEGMENT_KM):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.max_segment_km = max_segment_km
+        self._paths = {}
+
+    def get(self, locators):
+        """
+        Paths (see great_circle_paths) for the given locators, in the same
+        order; None where a locator is invalid. Missing locators are computed
+        together in one vectorized call.
+        """
+        locators = list(locators)
+        missing = [loc for loc in dict.fromkeys(locators) if loc not in self._paths]
+        if missing:
+            lat, lon, valid = locators_to_latlon(missing)
+            idx = np.flatnonzero(valid)
+            paths = great_circle_paths(self.lat0, self.lon0, lat[idx], lon[idx], self.max_segment_km)
+            self._paths.update(dict.fromkeys(missing))
+            self._paths.update((missing[i], path) for i, path in zip(idx, paths))
+        return [self._paths[loc] for loc in locators]
@@ -1,31 +1,108 @@
-import math
+from functools import lru_cache
+
+import numpy as np
+
+# Per character pair: (first char, number of values, lon step, lat step) in degrees.
+# Field (AA-RR), square (00-99), subsquare (aa-xx), extended square (00-99),
+# extended subsquare (aa-xx).
+_PAIRS = (
+    ("A", 18, 20.0, 10.0),
+    ("0", 10, 2.0, 1.0),
+    ("A", 24, 5.0 / 60, 2.5 / 60),
+    ("0", 10, 0.5 / 60, 0.25 / 60),
+    ("A", 24, 0.5 / 60 / 24, 0.25 / 60 / 24),
+)
+MAX_LOCATOR_LENGTH = 2 * len(_PAIRS)
+
+_BASE = np.array([ord(first) for first, _, _, _ in _PAIRS for _ in (0, 1)], dtype=np.int32)
+_LIMIT = np.array([count for _, count, _, _ in _PAIRS for _ in (0, 1)], dtype=np.int32)
+_LON_STEP = np.array([lon_step for _, _, lon_step, _ in _PAIRS])
+_LAT_STEP = np.array([lat_step for _, _, _, lat_step in _PAIRS])
 
-import math
 
 def locator_to_latlon(locator):
     """
-    Converts a Maidenhead locator (e.g. JN47FD) to (lat, lon).
-    Returns (lat, lon) as floats (center of the square).
-    Returns None if invalid.
+    Converts a Maidenhead locator (e.g. JN47, JN47FD, JN47FD52, JN47FD52KL) to (lat, lon).
+    Returns (lat, lon) as floats (center of the most precise square given).
+    Trailing pairs that are not valid are ignored; returns None if even the
+    4-character square is invalid. Results are cached, as many QSOs share a square.
     """
     if not locator or len(locator) < 4:
         return None
-    locator = locator.strip().upper()
-    try:
-        lon = (ord(locator[0]) - ord('A')) * 20 - 180
-        lat = (ord(locator[1]) - ord('A')) * 10 - 90
-        lon += int(locator[2]) * 2
-        lat += int(locator[3]) * 1
-        if len(locator) >= 6:
-            lon += (ord(locator[4]) - ord('A')) * 5 / 60
-            lat += (ord(locator[5]) - ord('A')) * 2.5 / 60
-            # Mittelpunkt des 6-stelligen Feldes
-            lon += 2.5 / 60
-            lat += 1.25 / 60
-        else:
-            # Mittelpunkt des 4-stelligen Feldes
-            lon += 1
-            lat += 0.5
-        return (lat, lon)
-    except Exception:
-        return None
\ No newline at end of file
+    return _decode_locator(locator.strip().upper())
+
+
+@lru_cache(maxsize=65536)
+def _decode_locator(locator):
+    lon, lat = -180.0, -90.0
+    pairs = 0
+    for k, (first, count, lon_step, lat_step) in enumerate(_PAIRS):
+        pair = locator[2 * k:2 * k + 2]
+        if len(pair) < 2:
+            break
+        x, y = ord(pair[0]) - ord(first), ord(pair[1]) - ord(first)
+        if not (0 <= x < count and 0 <= y < count):
+            break
+        lon += x * lon_step
+        lat += y * lat_step
+        pairs += 1
+    if pairs < 2:
+        return None
+    # Mittelpunkt des genauesten Feldes
+    _, _, lon_step, lat_step = _PAIRS[pairs - 1]
+    return (lat + lat_step / 2, lon + lon_step / 2)
+
+
+def _code_points(arr):
+    """Unicode code points of a str array as an (n, 10) int matrix, zero padded."""
+    width = arr.dtype.itemsize // 4
+    used = min(width, MAX_LOCATOR_LENGTH)
+    chars = np.zeros((len(arr), MAX_LOCATOR_LENGTH), dtype=np.int32)
+    if used:
+        chars[:, :used] = arr.view(np.uint32).reshape(len(arr), width)[:, :used]
+    return chars
+
+
+def locators_to_latlon(locators):
+    """
+    Decodes a whole column of locators in one vectorized pass.
+    Same rules as locator_to_latlon (4 to 10 characters, case-insensitive).
+
+    Args:
+        locators: Sequence of str, or a NumPy str/bytes array.
+
+    Returns:
+        (lat, lon, valid): float64 arrays (NaN where invalid) and a bool mask.
+    """
+    arr = np.asarray(locators).reshape(-1)
+    if arr.size == 0:
+        empty = np.zeros(0)
+        return empty, empty.copy(), np.zeros(0, dtype=bool)
+    if arr.dtype.kind == "S":
+        arr = np.char.decode(arr, "latin-1")
+    elif arr.dtype.kind != "U":
+        arr = arr.astype(str)
+    chars = _code_points(arr)
+    leading_blank = (chars[:, 0] == ord(" ")) | (chars[:, 0] == ord("\t"))
+    if leading_blank.any():
+        chars[leading_blank] = _code_points(np.char.lstrip(arr[leading_blank]))
+    lower = (chars >= ord("a")) & (chars <= ord("z"))
+    chars[lower] -= ord("a") - ord("A")
+
+    values = chars - _BASE
+    # Padding (code point 0) is never in range, so short locators stop there
+    char_ok = (values >= 0) & (values < _LIMIT)
+    pair_ok = char_ok[:, 0::2] & char_ok[:, 1::2]
+    # Only the leading run of valid pairs counts
+    pairs = np.cumprod(pair_ok, axis=1).sum(axis=1)
+    valid = pairs >= 2
+
+    used = np.arange(len(_PAIRS)) < pairs[:, None]
+    lon = -180.0 + np.where(used, values[:, 0::2], 0) @ _LON_STEP
+    lat = -90.0 + np.where(used, values[:, 1::2], 0) @ _LAT_STEP
+    last = np.maximum(pairs - 1, 0)
+    lon += _LON_STEP[last] / 2
+    lat += _LAT_STEP[last] / 2
+    lat[~valid] = np.nan
+    lon[~valid] = np.nan
+    return lat, lon, valid
@@ -3,66 +3,117 @@ KML Export for QSOMap2KML
 -----------------------
 Exports QSOs as KML for Google Earth, with:
 - One placemark per QSO (with color by mode)
-- Lines from your location to each QSO (with color by band, in a hidden folder)
+- Great-circle lines from your location to each QSO (with color by band, in a hidden folder)
 - Grouping by band (folders)
 - All colors and names are taken from the config/colors dicts
 - QTH Pinpoint for your location
 - Date and time formatted and localized in tooltips
+- Distance and bearing from your location in tooltips, ODX per band/mode in the legend
+- Optional aggregation: one marker and line per grid square (and band) with a QSO table
+- KMZ (zipped KML with the marker icon bundled, opens offline)
+- Optional parallel rendering of the placemarks in a process pool (same output)
+
+The document is streamed to the file while the placemarks are generated
+(compact, one placemark per line, all text XML-escaped), so memory use does
+not grow with the number of QSOs.
 """
 
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+import numpy as np
 from utils.grid_locator import locator_to_latlon
+from utils.render_plan import RenderPlan, as_render_plan, format_adif_date, format_adif_time
+from utils.qso_groups import AGGREGATE_OFF, AGGREGATE_GRID_BAND, group_qsos
 from datetime import datetime
-from utils.app_utils import call_progress
+from utils.app_utils import call_progress, resource_path
 
-def format_adif_date(date_str, lang="en"):
-    """Format ADIF date YYYYMMDD to localized string."""
-    if not date_str or len(date_str) != 8:
-        return date_str
-    year, month, day = date_str[:4], date_str[4:6], date_str[6:8]
-    if lang == "de":
-        return f"{day}.{month}.{year}"
-    return f"{year}-{month}-{day}"
+KML_FOOTER = '</Document></kml>'
 
-def format_adif_time(time_str):
-    """Format ADIF time HHMMSS or HHMM to HH:MM or HH:MM:SS."""
-    if not time_str or len(time_str) < 4:
-        return time_str
-    hour, minute = time_str[:2], time_str[2:4]
-    if len(time_str) >= 6:
-        second = time_str[4:6]
-        return f"{hour}:{minute}:{second}"
-    return f"{hour}:{minute}"
+DEFAULT_POPUP = (
+    "Mode: {mode}<br>Band: {band}<br>Name: {name}<br>Date: {date}<br>Time: {time}"
+    "<br>Distance: {distance} km<br>Bearing: {bearing}°"
+)
 
-def export_qsos_to_kml(qsos, filename, my_locator=None, band_colors=None, mode_colors=None, i18n=None, lang="en", progress_callback=None):
-    """
-    Export QSOs to a KML file for Google Earth.
+# Output buffer of the streaming writer
+WRITE_BUFFER = 1024 * 1024
 
-    Args:
-        qsos (list): List of QSO dicts.
-        filename (str): Output KML file path.
-        my_locator (str): Your own grid locator (for lines).
-        band_colors (dict): Mapping band -> color (hex, e.g. #FF0000).
-        mode_colors (dict): Mapping mode -> color (hex, e.g. #00FF00).
-        i18n: I18n instance for translations.
-        lang (str): Language code ("en" or "de").
-    """
-    def kml_color(hex_color, alpha="ff"):
-        """Convert #RRGGBB to KML color aabbggrr (alpha first, then blue, green, red)."""
-        hex_color = hex_color.lstrip("#")
-        if len(hex_color) != 6:
-            return f"{alpha}ffffff"  # default: white
-        r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
-        return f"{alpha}{b}{g}{r}"
+# Parallel export: QSOs per rendered fragment, and the log size from which
+# starting the worker processes pays off
+EXPORT_CHUNK_QSOS = 5000
+PARALLEL_MIN_QSOS = 20000
+
+# Marker icon: fetched from Google for plain KML, bundled into KMZ files
+MARKER_ICON_URL = "http://maps.google.com/mapfiles/kml/paddle/wht-blank.png"
+MARKER_ICON_FILE = "resources/icons/kml_marker.png"
+KMZ_ICON_PATH = "files/marker.png"
+KMZ_DOC_NAME = "doc.kml"
+
+# Aggregation mode: popup of a QSO group (grid square)
+GROUP_POPUP_ROWS = 50
+DEFAULT_GROUP_POPUP = "<b>{grid}</b>: {count} QSOs<br>Distance: {distance} km<br>Bearing: {bearing}°"
+DEFAULT_GROUP_COLUMNS = "Call,Band,Mode,Date,Time"
+DEFAULT_GROUP_MORE = "... and {count} more"
+
+def xml_text(value):
+    """Escape a value for XML element text."""
+    return escape(str(value))
+
+def xml_attr(value):
+    """Escape a value for a double-quoted XML attribute."""
+    return escape(str(value), {'"': "&quot;"})
+
+def kml_color(hex_color, alpha="ff"):
+    """Convert #RRGGBB to KML color aabbggrr (alpha first, then blue, green, red)."""
+    hex_color = hex_color.lstrip("#")
+    if len(hex_color) != 6:
+        return f"{alpha}ffffff"  # default: white
+    r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
+    return f"{alpha}{b}{g}{r}"
 
-    my_pos = locator_to_latlon(my_locator) if my_locator else None
+def _translate(i18n, key, default):
+    """Translated text for key, or default if there is no translation."""
+    if i18n and hasattr(i18n, "t"):
+        text = i18n.t(key)
+        if text != key:
+            return text
+    return default
 
-    # Group QSOs by band
-    band_groups = {}
-    for qso in qsos:
-        band = qso.get("band", "Unknown")
-        band_groups.setdefault(band, []).append(qso)
+def popup_template(i18n):
+    """Description template for QSO placemarks (translated if available)."""
+    return _translate(i18n, "kml_popup", DEFAULT_POPUP)
 
-    # KML header
+def popup_description(template, **values):
+    """Fill the popup HTML template; the values are HTML-escaped first."""
+    return template.format(**{key: xml_text(value) for key, value in values.items()})
+
+def kml_styles(band_colors=None, mode_colors=None, icon_href=MARKER_ICON_URL):
+    """Line style per band (line_<band>) and marker style per mode (marker_<mode>)."""
+    styles = []
+    for band, color in (band_colors or {}).items():
+        styles.append(
+            f'<Style id="line_{xml_attr(band)}"><LineStyle><color>{kml_color(color, "ff")}</color>'
+            '<width>2</width></LineStyle></Style>'
+        )
+    # The bundled pin has its tip at the bottom center
+    hotspot = '' if icon_href == MARKER_ICON_URL else '<hotSpot x="0.5" y="0" xunits="fraction" yunits="fraction"/>'
+    for mode, color in (mode_colors or {}).items():
+        styles.append(
+            f'<Style id="marker_{xml_attr(mode)}"><IconStyle><color>{kml_color(color, "ff")}</color>'
+            f'<scale>1.2</scale><Icon><href>{xml_text(icon_href)}</href></Icon>{hotspot}</IconStyle></Style>'
+        )
+    return styles
+
+def kml_document_head(my_pos, band_colors=None, mode_colors=None, i18n=None, lang="en", stats=None, icon_href=MARKER_ICON_URL):
+    """
+    Build the KML up to the QSO placemarks: XML header, LookAt on the QTH,
+    band/mode styles, legend (with ODX from stats, if given) and QTH placemark.
+    Returns the fragments as a list of lines.
+    """
     now = datetime.now()
     if lang == "de":
         export_time = now.strftime("%d.%m.%Y - %H:%M")
@@ -77,154 +128,367 @@ def export_qsos_to_kml(qsos, filename, my_locator=None, band_colors=None, mode_c
     # QTH as Starting Pos
     if my_pos:
         my_lat, my_lon = my_pos
-        kml.append(f"""
-            <LookAt>
-                <longitude>{my_lon}</longitude>
-                <latitude>{my_lat}</latitude>
-                <altitude>0</altitude>
-                <range>2000000</range>
-                <tilt>0</tilt>
-                <heading>0</heading>
-                <altitudeMode>relativeToGround</altitudeMode>
-            </LookAt>
-        """)
-        
+        kml.append(
+            f'<LookAt><longitude>{my_lon}</longitude><latitude>{my_lat}</latitude><altitude>0</altitude>'
+            '<range>2000000</range><tilt>0</tilt><heading>0</heading>'
+            '<altitudeMode>relativeToGround</altitudeMode></LookAt>'
+        )
+
     # Define styles for each band and mode
-    style_defs = []
-    if band_colors:
-        for band, color in band_colors.items():
-            style_defs.append(
-                f"""
-                <Style id="line_{band}">
-                    <LineStyle>
-                        <color>{kml_color(color, "ff")}</color>
-                        <width>2</width>
-                    </LineStyle>
-                </Style>
-                """
-            )
-    if mode_colors:
-        for mode, color in mode_colors.items():
-            style_defs.append(
-                f"""
-                <Style id="marker_{mode}">
-                    <IconStyle>
-                        <color>{kml_color(color, "ff")}</color>
-                        <scale>1.2</scale>
-                        <Icon>
-                            <href>http://maps.google.com/mapfiles/kml/paddle/wht-blank.png</href>
-                        </Icon>
-                    </IconStyle>
-                </Style>
-                """
-            )
-    kml.extend(style_defs)
+    kml.extend(kml_styles(band_colors, mode_colors, icon_href))
 
     # Legende als Placemark
     legend_html = "<b>Bands:</b><br>"
     for band, color in (band_colors or {}).items():
-        legend_html += f'<span style="color:{color}">&#9632;</span> {band}<br>'
+        legend_html += f'<span style="color:{xml_attr(color)}">&#9632;</span> {xml_text(band)}<br>'
     legend_html += "<br><b>Modes:</b><br>"
     for mode, color in (mode_colors or {}).items():
-        legend_html += f'<span style="color:{color}">&#9632;</span> {mode}<br>'
-
-    kml.append(f"""
-        <Placemark>
-            <name>Legend</name>
-            <description><![CDATA[{legend_html}]]></description>
-            <Point>
-                <coordinates>0,0,0</coordinates>
-            </Point>
-        </Placemark>
-    """)
+        legend_html += f'<span style="color:{xml_attr(color)}">&#9632;</span> {xml_text(mode)}<br>'
+    if stats:
+        legend_html += "<br><b>ODX:</b><br>" + "".join(f"{xml_text(line)}<br>" for line in stats.odx_lines())
+    kml.append(
+        f'<Placemark><name>Legend</name><description>{xml_text(legend_html)}</description>'
+        '<Point><coordinates>0,0,0</coordinates></Point></Placemark>'
+    )
 
     # QTH Pinpoint
     if my_pos:
         my_lat, my_lon = my_pos
-        kml.append(f"""
-            <Placemark>
-                <name>QTH</name>
-                <description>{i18n.t('qth_tooltip') if i18n else 'Your location'}</description>
-                <Point>
-                    <coordinates>{my_lon},{my_lat},0</coordinates>
-                </Point>
-            </Placemark>
-        """)
-
-    # Band folders with QSO markers
-    total = sum(len(qsos_in_band) for qsos_in_band in band_groups.values())
+        qth = i18n.t('qth_tooltip') if i18n else 'Your location'
+        kml.append(
+            f'<Placemark><name>QTH</name><description>{xml_text(qth)}</description>'
+            f'<Point><coordinates>{my_lon},{my_lat},0</coordinates></Point></Placemark>'
+        )
+
+    return kml
+
+def _style_url(style):
+    return f'<styleUrl>#{xml_text(style)}</styleUrl>' if style else ''
+
+def qso_placemark(call, mode, description, marker_style, lat, lon):
+    """Point placemark for one QSO (description is HTML and gets escaped here)."""
+    return (
+        f'<Placemark><name>{xml_text(call)} ({xml_text(mode)})</name>'
+        f'<description>{xml_text(description)}</description>{_style_url(marker_style)}'
+        f'<Point><coordinates>{lon},{lat},0</coordinates></Point></Placemark>'
+    )
+
+def line_geometry(parts):
+    """
+    KML geometry for a great-circle path (see utils.great_circle): a LineString,
+    or a MultiGeometry if the path is split at the antimeridian.
+    """
+    # 4 decimals (about 10 m) are plenty for a drawn line and keep files small
+    strings = [
+        "<LineString><coordinates>"
+        + " ".join(f"{lon:.4f},{lat:.4f},0" for lat, lon in part)
+        + "</coordinates></LineString>"
+        for part in parts
+    ]
+    if len(strings) == 1:
+        return strings[0]
+    return "<MultiGeometry>" + "".join(strings) + "</MultiGeometry>"
+
+def line_placemark(line_style, geometry):
+    """Line placemark from the QTH to one QSO (geometry from line_geometry)."""
+    return f'<Placemark>{_style_url(line_style)}{geometry}</Placemark>'
+
+def group_popup(group, plan, i18n=None, max_rows=GROUP_POPUP_ROWS):
+    """
+    Popup HTML for a QSO group (see utils.qso_groups): count, distance and
+    bearing, and a table with one row per QSO (at most max_rows).
+    """
+    stats = plan.stats
+    first = group.indices[0]
+    header = _translate(i18n, "group_popup_header", DEFAULT_GROUP_POPUP).format(
+        grid=xml_text(group.grid), count=len(group),
+        distance=stats.format_distance(first) if stats else "-",
+        bearing=stats.format_bearing(first) if stats else "-"
+    )
+    columns = _translate(i18n, "group_popup_columns", DEFAULT_GROUP_COLUMNS).split(",")
+    rows = ["<tr>" + "".join(f"<th>{xml_text(c)}</th>" for c in columns) + "</tr>"]
+    for i in group.indices[:max_rows]:
+        cells = (
+            plan.calls[i], plan.store.column("band")[i], plan.store.column("mode")[i],
+            plan.dates[i], plan.times[i]
+        )
+        rows.append("<tr>" + "".join(f"<td>{xml_text(c)}</td>" for c in cells) + "</tr>")
+    more = ""
+    if len(group) > max_rows:
+        more = _translate(i18n, "group_popup_more", DEFAULT_GROUP_MORE).format(count=len(group) - max_rows)
+    return f'{header}<table>{"".join(rows)}</table>{more}'
+
+def _write_groups(out, plan, groups, i18n, progress_callback):
+    """Aggregation mode: one marker and one line per group, in band folders (or one folder)."""
+    geometries = line_geometries(plan)
+    folders = {}
+    for group in groups:
+        folder = "Grids" if group.band is None else (group.band or "Unknown")
+        folders.setdefault(folder, []).append(group)
+    total = len(groups)
     done = 0
-    if my_pos:
-        for band, qsos_in_band in band_groups.items():
-            kml.append(f'<Folder><name>{band}</name>')
-            for qso in qsos_in_band:
-                call = qso.get('call', 'Unknown').upper()
-                grid = qso.get('gridsquare')
-                mode = qso.get('mode', 'Unknown').upper()
-                name = qso.get('name', '')
-                date_raw = qso.get('date', '') or qso.get('qso_date', '')
-                time_raw = qso.get('time', '') or qso.get('time_on', '')
-                date = format_adif_date(date_raw, lang)
-                time = format_adif_time(time_raw)
-                pos = locator_to_latlon(grid) if grid else None
-                if not pos:
-                    continue    # Skip if no position found
-                
-                lat, lon = pos
-                
-                if (my_lat, my_lon) == (lat, lon):
-                    continue # Skip if QSO is at the same location as my_pos
-
-                marker_style = f'marker_{mode}' if mode_colors and mode in mode_colors else None
-                if i18n and hasattr(i18n, "t"):
-                    desc_template = i18n.t("kml_popup")
-                    if desc_template == "kml_popup":
-                        desc_template = "Mode: {mode}<br>Band: {band}<br>Name: {name}<br>Date: {date}<br>Time: {time}"
-                else:
-                    desc_template = "Mode: {mode}<br>Band: {band}<br>Name: {name}<br>Date: {date}<br>Time: {time}"
-                description = desc_template.format(mode=mode, band=band, name=name, date=date, time=time)
-                kml.append(f"""
-                    <Placemark>
-                        <name>{call} ({mode})</name>
-                        <description><![CDATA[{description}]]></description>
-                        {f'<styleUrl>#{marker_style}</styleUrl>' if marker_style else ''}
-                        <Point>
-                            <coordinates>{lon},{lat},0</coordinates>
-                        </Point>
-                    </Placemark>
-                """)
+    for folder, folder_groups in folders.items():
+        out.write(f'<Folder><name>{xml_text(folder)}</name>\n')
+        for group in folder_groups:
+            mode = group.dominant("mode") or 'UNKNOWN'
+            marker_style = f'marker_{mode}' if mode in plan.mode_colors else None
+            description = group_popup(group, plan, i18n)
+            out.write(qso_placemark(group.grid, len(group), description, marker_style, group.lat, group.lon) + "\n")
+            call_progress(progress_callback, done, total)
+            done += 1
+        out.write('</Folder>\n')
+    out.write('<Folder><name>Lines</name><visibility>1</visibility>\n')
+    for group in groups:
+        geometry = geometries[group.grid_code]
+        if geometry is None:
+            continue
+        band = group.band if group.band is not None else group.dominant("band")
+        line_style = f'line_{band}' if band in plan.band_colors else None
+        out.write(line_placemark(line_style, geometry) + "\n")
+    out.write('</Folder>\n')
+
+def band_groups(plan, indices=None):
+    """
+    QSO indices grouped by band code, bands in order of first appearance in
+    the store. indices limits the grouping to a subset.
+    """
+    if indices is None:
+        indices = np.arange(len(plan))
+    codes = plan.band_codes[indices]
+    groups = {}
+    for code in range(len(plan.band_labels)):
+        members = indices[codes == code]
+        if len(members):
+            groups[code] = members
+    return groups
+
+def line_geometries(plan):
+    """KML line geometry per grid code of the plan (None where invalid), built once per plan."""
+    return plan.derived(
+        "kml_line_geometries", lambda: [line_geometry(path) if path else None for path in plan.paths], shared=True
+    )
+
+def _marker_fragment(plan, band_code, indices, desc_template):
+    """Marker placemarks of QSOs of one band, one per line."""
+    stats = plan.stats
+    band = plan.band_labels[band_code]
+    lines = []
+    for i in indices:
+        mode_code = plan.mode_codes[i]
+        mode = plan.mode_labels[mode_code]
+        marker_style = f'marker_{mode}' if plan.mode_colors_by_code[mode_code] is not None else None
+        description = popup_description(
+            desc_template, mode=mode, band=band, name=plan.names[i],
+            date=plan.dates[i], time=plan.times[i],
+            distance=stats.format_distance(i), bearing=stats.format_bearing(i)
+        )
+        lines.append(qso_placemark(plan.calls[i] or 'Unknown', mode, description, marker_style,
+                                   float(plan.lat[i]), float(plan.lon[i])) + "\n")
+    return "".join(lines)
+
+def _line_fragment(plan, band_code, indices):
+    """Line placemarks of QSOs of one band, one per line."""
+    geometries = line_geometries(plan)
+    band = plan.band_labels[band_code]
+    line_style = f'line_{band}' if plan.band_colors_by_code[band_code] is not None else None
+    lines = []
+    for i in indices:
+        geometry = geometries[plan.grid_codes[i]]
+        if geometry is None:
+            continue
+        lines.append(line_placemark(line_style, geometry) + "\n")
+    return "".join(lines)
+
+def _render_fragment(plan, desc_template, task):
+    kind, band_code, indices = task
+    if kind == "markers":
+        return _marker_fragment(plan, band_code, indices, desc_template)
+    return _line_fragment(plan, band_code, indices)
+
+# State of an export worker process (set once per process by _init_worker)
+_worker_state = None
+
+def _init_worker(plan, desc_template):
+    global _worker_state
+    _worker_state = (plan, desc_template)
+
+def _render_fragment_in_worker(task):
+    plan, desc_template = _worker_state
+    return _render_fragment(plan, desc_template, task)
+
+def _chunks(indices, size=EXPORT_CHUNK_QSOS):
+    return [indices[start:start + size] for start in range(0, len(indices), size)] or [indices]
+
+def write_qso_placemarks(out, plan, indices=None, desc_template=DEFAULT_POPUP, progress_callback=None, max_workers=1):
+    """
+    Write one folder per band with a marker per QSO, then the Lines folder,
+    for the QSOs at indices (all of the plan if None).
+
+    The placemarks are rendered in chunks of EXPORT_CHUNK_QSOS. With more
+    than one worker (max_workers, None = number of CPUs) and a large log the
+    chunks are rendered in a process pool; they are written in the same
+    order, so the output is identical to the serial export.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    groups = band_groups(plan, indices)
+    # Markers: position known and not at the QTH
+    drawn = plan.valid & ~plan.at_qth
+    marker_tasks = [
+        [("markers", band_code, chunk) for chunk in _chunks(qsos_in_band[drawn[qsos_in_band]])]
+        for band_code, qsos_in_band in groups.items()
+    ]
+    line_tasks = [
+        ("lines", band_code, chunk)
+        for band_code, qsos_in_band in groups.items() for chunk in _chunks(qsos_in_band)
+    ]
+    tasks = [task for band_tasks in marker_tasks for task in band_tasks] + line_tasks
+
+    total = sum(len(chunk) for band_tasks in marker_tasks for _, _, chunk in band_tasks)
+    parallel = workers > 1 and total >= PARALLEL_MIN_QSOS
+    if parallel:
+        # spawn on every platform: the export runs in a worker thread of the
+        # GUI, and forking a threaded process is not safe
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(plan, desc_template))
+        # map() returns the results in task order
+        fragments = pool.map(_render_fragment_in_worker, tasks)
+    else:
+        fragments = (_render_fragment(plan, desc_template, task) for task in tasks)
+
+    try:
+        # Band folders with QSO markers
+        done = 0
+        for band_tasks, band_code in zip(marker_tasks, groups):
+            out.write(f'<Folder><name>{xml_text(plan.band_labels[band_code])}</name>\n')
+            for _, _, chunk in band_tasks:
+                out.write(next(fragments))
                 # Fortschritt melden
+                done += len(chunk)
                 call_progress(progress_callback, done, total)
-                done += 1
-            kml.append('</Folder>')
+            out.write('</Folder>\n')
 
-    # Hidden folder for all lines
-    if my_pos:
-        kml.append('<Folder><name>Lines</name><visibility>1</visibility>')
-        for band, qsos_in_band in band_groups.items():
-            for qso in qsos_in_band:
-                grid = qso.get('gridsquare')
-                pos = locator_to_latlon(grid) if grid else None
-                if not pos or not my_pos:
-                    continue
-                lat, lon = pos
-                line_style = f'line_{band}' if band_colors and band in band_colors else None
-                kml.append(f"""
-                    <Placemark>
-                        {f'<styleUrl>#{line_style}</styleUrl>' if line_style else ''}
-                        <LineString>
-                            <coordinates>
-                                {my_lon},{my_lat},0
-                                {lon},{lat},0
-                            </coordinates>
-                        </LineString>
-                    </Placemark>
-                """)
-        kml.append('</Folder>')
+        # Hidden folder for all lines
+        out.write('<Folder><name>Lines</name><visibility>1</visibility>\n')
+        for _ in line_tasks:
+            out.write(next(fragments))
+        out.write('</Folder>\n')
+    finally:
+        if parallel:
+            pool.shutdown(cancel_futures=True)
+
+def write_kml(out, plan, i18n=None, progress_callback=None, icon_href=MARKER_ICON_URL, aggregate=AGGREGATE_OFF, max_workers=1):
+    """
+    Stream a KML document for a render plan to a text file object.
+
+    Args:
+        out: Writable text stream (file, io.TextIOWrapper over a zip entry, ...).
+        plan (RenderPlan): Preprocessed QSOs and settings (see utils.render_plan).
+        i18n: I18n instance for translations.
+        icon_href (str): Marker icon used by the mode styles.
+        aggregate (str): "off", "grid" or "grid_band" (see utils.qso_groups).
+        max_workers (int): Processes rendering the placemarks (1 = serial, None = number of CPUs).
+    """
+    head = kml_document_head(plan.my_pos, plan.band_colors, plan.mode_colors, i18n, plan.lang, plan.stats, icon_href)
+    for line in head:
+        out.write(line + "\n")
+
+    if plan.my_pos:
+        if aggregate != AGGREGATE_OFF:
+            groups = group_qsos(plan.store, by_band=aggregate == AGGREGATE_GRID_BAND)
+            _write_groups(out, plan, groups, i18n, progress_callback)
+        else:
+            write_qso_placemarks(out, plan, None, popup_template(i18n), progress_callback, max_workers)
 
     # KML footer
-    kml.append('</Document></kml>')
+    out.write(KML_FOOTER)
 
-    # Write to file
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write("\n".join(kml))
\ No newline at end of file
+def export_qsos_to_kml(qsos, filename, my_locator=None, band_colors=None, mode_colors=None, i18n=None, lang="en", progress_callback=None, aggregate=AGGREGATE_OFF, area_radius_km=0, max_workers=1):
+    """
+    Export QSOs to a KML file for Google Earth.
+
+    Args:
+        qsos (RenderPlan, QSOStore or list): Render plan (reused if it matches
+            the settings below), QSO store or list of QSO dicts.
+        filename (str): Output KML file path.
+        my_locator (str): Your own grid locator (for lines).
+        band_colors (dict): Mapping band -> color (hex, e.g. #FF0000).
+        mode_colors (dict): Mapping mode -> color (hex, e.g. #00FF00).
+        i18n: I18n instance for translations.
+        lang (str): Language code ("en" or "de").
+        aggregate (str): "off", "grid" or "grid_band" (one placemark per grid square / and band).
+        area_radius_km (int): Only QSOs within this distance of my_locator (0 = all).
+        max_workers (int): Processes rendering the placemarks (1 = serial, None = number of
+            CPUs); the output is the same for every worker count.
+    """
+    plan = as_render_plan(qsos, my_locator, band_colors, mode_colors, lang, area_radius_km)
+    with open(filename, "w", encoding="utf-8", newline="\n", buffering=WRITE_BUFFER) as f:
+        write_kml(f, plan, i18n, progress_callback, aggregate=aggregate, max_workers=max_workers)
+
+def export_qsos_to_kmz(qsos, filename, my_locator=None, band_colors=None, mode_colors=None, i18n=None, lang="en", progress_callback=None, aggregate=AGGREGATE_OFF, area_radius_km=0, max_workers=1):
+    """
+    Export QSOs to a KMZ file: the KML document is compressed while it is
+    written (streamed into the zip entry), followed by the marker icon so the
+    file opens without network access. Arguments as in export_qsos_to_kml.
+    """
+    plan = as_render_plan(qsos, my_locator, band_colors, mode_colors, lang, area_radius_km)
+    with zipfile.ZipFile(filename, "w", compression=zipfile.ZIP_DEFLATED) as kmz:
+        # doc.kml must be the first entry, Google Earth opens the first KML
+        with kmz.open(KMZ_DOC_NAME, "w", force_zip64=True) as entry:
+            # Buffer so the compressor gets large blocks instead of single placemarks
+            buffered = io.BufferedWriter(entry, buffer_size=WRITE_BUFFER)
+            with io.TextIOWrapper(buffered, encoding="utf-8", newline="\n") as f:
+                write_kml(f, plan, i18n, progress_callback, icon_href=KMZ_ICON_PATH, aggregate=aggregate,
+                          max_workers=max_workers)
+        kmz.write(resource_path(MARKER_ICON_FILE), KMZ_ICON_PATH)
+
+
+class KmlAppender:
+    """
+    KML file that grows with new QSOs (follow mode for live logs).
+
+    The document head is written once; append() writes the placemarks for the
+    new QSOs over the closing tags and writes them again, so the file is a
+    complete KML document after every update and each update only costs the
+    new QSOs.
+    """
+
+    def __init__(self, filename, my_locator=None, band_colors=None, mode_colors=None, i18n=None, lang="en"):
+        self.filename = filename
+        self.my_locator = my_locator
+        self.my_pos = locator_to_latlon(my_locator) if my_locator else None
+        self.band_colors = band_colors or {}
+        self.mode_colors = mode_colors or {}
+        self.lang = lang
+        self.desc_template = popup_template(i18n)
+        head = kml_document_head(self.my_pos, band_colors, mode_colors, i18n, lang)
+        with open(filename, "w", encoding="utf-8", newline="\n") as f:
+            f.write("\n".join(head + [KML_FOOTER]))
+
+    def append(self, qsos):
+        """Add the QSOs of a QSOStore (or list of dicts) to the file."""
+        if not self.my_pos:
+            return
+        plan = RenderPlan(qsos, self.my_locator, self.band_colors, self.mode_colors, self.lang)
+        geometries = line_geometries(plan)
+        fragments = []
+        for i in np.flatnonzero(plan.valid & ~plan.at_qth):
+            band_code, mode_code = plan.band_codes[i], plan.mode_codes[i]
+            band, mode = plan.band_labels[band_code], plan.mode_labels[mode_code]
+            description = popup_description(
+                self.desc_template, mode=mode, band=band, name=plan.names[i],
+                date=plan.dates[i], time=plan.times[i],
+                distance=plan.stats.format_distance(i), bearing=plan.stats.format_bearing(i)
+            )
+            marker_style = f'marker_{mode}' if plan.mode_colors_by_code[mode_code] is not None else None
+            line_style = f'line_{band}' if plan.band_colors_by_code[band_code] is not None else None
+            fragments.append(qso_placemark(plan.calls[i] or 'Unknown', mode, description, marker_style,
+                                           float(plan.lat[i]), float(plan.lon[i])))
+            fragments.append(line_placemark(line_style, geometries[plan.grid_codes[i]]))
+        if not fragments:
+            return
+        footer = KML_FOOTER.encode("utf-8")
+        with open(self.filename, "r+b") as f:
+            f.seek(-len(footer), 2)
+            f.write(("\n" + "\n".join(fragments) + "\n").encode("utf-8"))
+            f.write(footer)
+            f.truncate()
@@ -0,0 +1,192 @@
+"""
+Tiled KMZ export for large logs
+-------------------------------
+Google Earth slows down with 100k+ placemarks in one document. This export
+splits the QSOs into a quadtree of KML tiles inside one KMZ:
+- The root document (doc.kml) holds styles, legend, QTH and a NetworkLink
+  per top-level tile
+- A tile with more than TILE_MAX_QSOS QSOs shows aggregate markers (QSO
+  count per cell, per-band counts in the popup) while it is small on screen,
+  and links its four sub-tiles through NetworkLinks with <Region>/<Lod>
+- Leaf tiles hold the individual QSOs, in the same band folders (and great-
+  circle lines) as the plain KML export
+Google Earth only loads a tile when its region is large enough on screen.
+"""
+
+import io
+import zipfile
+
+import numpy as np
+
+from utils.render_plan import as_render_plan
+from utils.app_utils import call_progress, resource_path
+from utils.kml_export import (
+    KML_FOOTER, KMZ_DOC_NAME, KMZ_ICON_PATH, MARKER_ICON_FILE, WRITE_BUFFER,
+    kml_document_head, kml_styles, popup_template, write_qso_placemarks, band_groups, xml_text
+)
+
+# QSOs a tile may hold before it is split into four sub-tiles
+TILE_MAX_QSOS = 1000
+# Deepest quadtree level (level 0 tiles are 180° x 180°)
+TILE_MAX_DEPTH = 12
+# A tile is loaded once its region covers this many pixels on screen
+LOD_PIXELS = 256
+# Aggregate cells per tile side
+AGGREGATE_CELLS = 8
+TILES_DIR = "tiles"
+
+
+def _region(south, west, north, east, min_lod, max_lod=-1):
+    return (
+        f'<Region><LatLonAltBox><north>{north}</north><south>{south}</south>'
+        f'<east>{east}</east><west>{west}</west></LatLonAltBox>'
+        f'<Lod><minLodPixels>{min_lod}</minLodPixels><maxLodPixels>{max_lod}</maxLodPixels></Lod></Region>'
+    )
+
+
+def _network_link(name, href, region):
+    return (
+        f'<NetworkLink><name>{xml_text(name)}</name>{region}'
+        f'<Link><href>{xml_text(href)}</href><viewRefreshMode>onRegion</viewRefreshMode></Link></NetworkLink>'
+    )
+
+
+class _TileWriter:
+    """Writes the quadtree tiles of one export into an open KMZ."""
+
+    def __init__(self, kmz, plan, i18n, progress_callback, max_qsos, max_depth):
+        self.kmz = kmz
+        self.plan = plan
+        self.progress_callback = progress_callback
+        self.max_qsos = max_qsos
+        self.max_depth = max_depth
+        self.desc_template = popup_template(i18n)
+        # Tiles live in TILES_DIR, the icon is referenced from there
+        self.styles = kml_styles(plan.band_colors, plan.mode_colors, f"../{KMZ_ICON_PATH}")
+        self.done = 0
+        # QSOs drawn as markers: valid position, not at the QTH
+        self.indices = np.flatnonzero(plan.valid & ~plan.at_qth)
+        self.total = len(self.indices)
+
+    @staticmethod
+    def tile_path(z, x, y):
+        return f"{TILES_DIR}/{z}_{x}_{y}.kml"
+
+    @staticmethod
+    def bounds(z, x, y):
+        """(south, west, north, east) of tile x/y at level z (2 x 1 tiles at level 0)."""
+        size = 180.0 / 2 ** z
+        west = -180.0 + x * size
+        south = -90.0 + y * size
+        return south, west, south + size, west + size
+
+    def children(self, z, x, y, indices):
+        """Non-empty sub-tiles as (x, y, indices)."""
+        south, west, north, east = self.bounds(z, x, y)
+        lat_mid, lon_mid = (south + north) / 2, (west + east) / 2
+        upper = self.plan.lat[indices] >= lat_mid
+        right = self.plan.lon[indices] >= lon_mid
+        result = []
+        for dy in (0, 1):
+            for dx in (0, 1):
+                members = indices[(upper == bool(dy)) & (right == bool(dx))]
+                if len(members):
+                    result.append((2 * x + dx, 2 * y + dy, members))
+        return result
+
+    def top_tiles(self):
+        lon = self.plan.lon[self.indices]
+        return [(x, 0, self.indices[(lon >= 0) == bool(x)]) for x in (0, 1)]
+
+    def link(self, z, x, y, count, href, min_lod):
+        return _network_link(f"{count} QSOs", href, _region(*self.bounds(z, x, y), min_lod))
+
+    def write(self, path, fragments):
+        with self.kmz.open(path, "w", force_zip64=True) as entry:
+            buffered = io.BufferedWriter(entry, buffer_size=WRITE_BUFFER)
+            with io.TextIOWrapper(buffered, encoding="utf-8", newline="\n") as out:
+                out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+                out.write('<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n')
+                out.write("\n".join(self.styles) + "\n")
+                fragments(out)
+                out.write(KML_FOOTER)
+
+    def write_tile(self, z, x, y, indices):
+        """Write tile z/x/y and, for split tiles, its sub-tiles (depth first)."""
+        lat, lon = self.plan.lat[indices], self.plan.lon[indices]
+        # QSOs on one spot (same grid) cannot be split any further
+        same_spot = np.ptp(lat) == 0 and np.ptp(lon) == 0
+        if len(indices) <= self.max_qsos or z >= self.max_depth or same_spot:
+            self.write(self.tile_path(z, x, y), lambda out: write_qso_placemarks(
+                out, self.plan, indices, self.desc_template
+            ))
+            self.done += len(indices)
+            call_progress(self.progress_callback, self.done, self.total)
+            return
+        children = self.children(z, x, y, indices)
+
+        def fragments(out):
+            # Aggregates until the sub-tiles are large enough to be loaded
+            out.write(f'<Folder><name>Overview</name>{_region(*self.bounds(z, x, y), 0, 2 * LOD_PIXELS)}\n')
+            for placemark in self.aggregates(z, x, y, indices):
+                out.write(placemark + "\n")
+            out.write('</Folder>\n')
+            for cx, cy, members in children:
+                # Sub-tiles are in the same directory
+                href = self.tile_path(z + 1, cx, cy).split("/", 1)[1]
+                out.write(self.link(z + 1, cx, cy, len(members), href, LOD_PIXELS) + "\n")
+
+        self.write(self.tile_path(z, x, y), fragments)
+        for cx, cy, members in children:
+            self.write_tile(z + 1, cx, cy, members)
+
+    def aggregates(self, z, x, y, indices):
+        """One placemark per occupied cell: QSO count, per-band counts, mean position."""
+        south, west, north, east = self.bounds(z, x, y)
+        cell = (east - west) / AGGREGATE_CELLS
+        lat, lon = self.plan.lat[indices], self.plan.lon[indices]
+        cx = np.clip(((lon - west) // cell).astype(np.int64), 0, AGGREGATE_CELLS - 1)
+        cy = np.clip(((lat - south) // cell).astype(np.int64), 0, AGGREGATE_CELLS - 1)
+        keys, inverse, counts = np.unique(cy * AGGREGATE_CELLS + cx, return_inverse=True, return_counts=True)
+        mean_lat = np.bincount(inverse, weights=lat) / counts
+        mean_lon = np.bincount(inverse, weights=lon) / counts
+        placemarks = []
+        for k in range(len(keys)):
+            members = indices[inverse == k]
+            bands = "".join(
+                f"{xml_text(self.plan.band_labels[band])}: {len(qsos)}<br>"
+                for band, qsos in band_groups(self.plan, members).items()
+            )
+            placemarks.append(
+                f'<Placemark><name>{counts[k]}</name><description>{xml_text(bands)}</description>'
+                f'<Point><coordinates>{mean_lon[k]},{mean_lat[k]},0</coordinates></Point></Placemark>'
+            )
+        return placemarks
+
+
+def export_qsos_to_kmz_tiles(qsos, filename, my_locator=None, band_colors=None, mode_colors=None, i18n=None, lang="en",
+                             progress_callback=None, max_qsos=TILE_MAX_QSOS, max_depth=TILE_MAX_DEPTH, area_radius_km=0):
+    """
+    Export QSOs as a tiled KMZ with level of detail (see module docstring).
+
+    Args:
+        max_qsos (int): QSOs per tile before it is split.
+        max_depth (int): Deepest quadtree level.
+        Other arguments as in utils.kml_export.export_qsos_to_kml.
+    """
+    plan = as_render_plan(qsos, my_locator, band_colors, mode_colors, lang, area_radius_km)
+    with zipfile.ZipFile(filename, "w", compression=zipfile.ZIP_DEFLATED) as kmz:
+        if not plan.my_pos:
+            # Without QTH there are no markers (same as the plain export)
+            head = kml_document_head(None, band_colors, mode_colors, i18n, lang, None, KMZ_ICON_PATH)
+            kmz.writestr(KMZ_DOC_NAME, "\n".join(head + [KML_FOOTER]))
+            return
+        tiles = _TileWriter(kmz, plan, i18n, progress_callback, max_qsos, max_depth)
+        top = [(x, y, members) for x, y, members in tiles.top_tiles() if len(members)]
+        head = kml_document_head(plan.my_pos, plan.band_colors, plan.mode_colors, i18n, plan.lang, plan.stats, KMZ_ICON_PATH)
+        links = [tiles.link(0, x, y, len(members), tiles.tile_path(0, x, y), 0) for x, y, members in top]
+        # doc.kml first: Google Earth opens the first KML of a KMZ
+        kmz.writestr(KMZ_DOC_NAME, "\n".join(head + links + [KML_FOOTER]))
+        for x, y, members in top:
+            tiles.write_tile(0, x, y, members)
+        kmz.write(resource_path(MARKER_ICON_FILE), KMZ_ICON_PATH)
@@ -0,0 +1,33 @@
+"""
+Log file reader for QSOMap2KML
+------------------------------
+Chooses the importer from the file content, so callers can open ADIF (.adi)
+and ADX (XML) logs the same way.
+"""
+
+import codecs
+
+from utils.adif_parser import iter_adif
+from utils.adx_parser import iter_adx
+
+# Bytes looked at to tell ADX from ADI
+SNIFF_SIZE = 4096
+
+
+def is_adx(filepath):
+    """True if the file starts like an XML document (ADX), False for ADI."""
+    with open(filepath, "rb") as f:
+        head = f.read(SNIFF_SIZE)
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        head = head.decode("utf-16", errors="ignore").encode("utf-8", errors="ignore")
+    elif head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    head = head.lstrip().lower()
+    return head.startswith(b"<?xml") or head.startswith(b"<adx")
+
+
+def iter_qsos(filepath):
+    """Yield QSO dicts from an ADIF or ADX file, detected from its content."""
+    if is_adx(filepath):
+        return iter_adx(filepath)
+    return iter_adif(filepath)
@@ -0,0 +1,213 @@
+"""
+SQLite QSO database for QSOMap2KML
+----------------------------------
+Optional local store that keeps QSOs between sessions:
+- Importing a log only adds QSOs that are not yet known, using the key
+  (call, qso_date, time_on, band, mode)
+- Indexes on band, mode, date and grid for fast filtered queries
+- database_filters() turns the database settings (bands, date range, area
+  radius around the own locator) into query filters, so the map does not
+  load the whole database; at most db_max_qsos QSOs (default
+  DEFAULT_MAX_QSOS, the latest ones) are loaded, 0 lifts the cap
+- Queries stream rows into a compact QSOStore, so the map preview and the
+  KML export run from a query instead of a full in-memory list
+"""
+
+import logging
+import math
+import os
+import sqlite3
+from itertools import islice
+
+from utils.grid_locator import locator_to_latlon
+from utils.log_reader import iter_qsos
+from utils.qso_store import QSOStore, project_qso
+from utils.spatial_index import EARTH_RADIUS_KM
+
+DEFAULT_DB_PATH = "config/qsos.sqlite"
+
+# Rows per executemany() call during import
+BATCH_SIZE = 5000
+
+# QSOs loaded from the database for the map by default (the latest ones)
+DEFAULT_MAX_QSOS = 250000
+
+# Maidenhead fields (AA-RR): 18 x 18 of 20° longitude x 10° latitude
+FIELD_COUNT = 18
+FIELD_LON = 20.0
+FIELD_LAT = 10.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS qsos (
+    id INTEGER PRIMARY KEY,
+    call TEXT NOT NULL,
+    band TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    gridsquare TEXT NOT NULL,
+    name TEXT NOT NULL,
+    qso_date TEXT NOT NULL,
+    time_on TEXT NOT NULL,
+    source TEXT,
+    UNIQUE (call, qso_date, time_on, band, mode)
+);
+CREATE INDEX IF NOT EXISTS idx_qsos_band ON qsos (band);
+CREATE INDEX IF NOT EXISTS idx_qsos_mode ON qsos (mode);
+CREATE INDEX IF NOT EXISTS idx_qsos_date ON qsos (qso_date, time_on);
+CREATE INDEX IF NOT EXISTS idx_qsos_grid ON qsos (gridsquare);
+"""
+
+# Column order matches utils.qso_store.FIELDS
+_COLUMNS = "call, band, mode, gridsquare, name, qso_date, time_on"
+_SELECT = f"SELECT {_COLUMNS} FROM qsos"
+_INSERT = (
+    "INSERT OR IGNORE INTO qsos (call, band, mode, gridsquare, name, qso_date, time_on, source) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+class QSODatabase:
+    """
+    SQLite backed QSO store.
+
+    Usage:
+        with QSODatabase() as db:
+            added, skipped = db.import_adif("log.adi")
+            store = db.query(bands=["20m"], date_from="20240101")
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def import_qsos(self, qsos, source=None):
+        """
+        Insert parsed QSO dicts (any iterable) in batches.
+        Returns (added, skipped); skipped QSOs were already in the database.
+        """
+        added = skipped = 0
+        rows = (project_qso(qso) + (source,) for qso in qsos)
+        with self.conn:
+            while True:
+                batch = list(islice(rows, BATCH_SIZE))
+                if not batch:
+                    break
+                before = self.conn.total_changes
+                self.conn.executemany(_INSERT, batch)
+                inserted = self.conn.total_changes - before
+                added += inserted
+                skipped += len(batch) - inserted
+        return added, skipped
+
+    def import_adif(self, filepath):
+        """Import an ADIF or ADX file; returns (added, skipped)."""
+        added, skipped = self.import_qsos(iter_qsos(filepath), source=os.path.basename(filepath))
+        logging.info(f"Imported {filepath} into {self.path}: {added} added, {skipped} already known")
+        return added, skipped
+
+    def _where(self, bands=None, modes=None, date_from=None, date_to=None, grid_prefix=None):
+        clauses, params = [], []
+        if bands:
+            clauses.append(f"band IN ({','.join('?' * len(bands))})")
+            params.extend(band.lower() for band in bands)
+        if modes:
+            clauses.append(f"mode IN ({','.join('?' * len(modes))})")
+            params.extend(mode.upper() for mode in modes)
+        if date_from:
+            clauses.append("qso_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("qso_date <= ?")
+            params.append(date_to)
+        if grid_prefix:
+            # Ranges instead of LIKE so the grid index is used
+            prefixes = [grid_prefix] if isinstance(grid_prefix, str) else grid_prefix
+            ranges = []
+            for prefix in prefixes:
+                prefix = prefix.upper()
+                ranges.append("(gridsquare >= ? AND gridsquare < ?)")
+                params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+            clauses.append(f"({' OR '.join(ranges)})")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def iter_query(self, limit=None, **filters):
+        """
+        Yield matching QSOs as tuples in utils.qso_store.FIELDS order, oldest first.
+        Filters: bands, modes (lists), date_from, date_to (YYYYMMDD), grid_prefix
+        (one prefix or a list of prefixes); limit keeps only the latest QSOs.
+        """
+        where, params = self._where(**filters)
+        if limit:
+            # Latest QSOs through the date index, then back in date order
+            yield from self.conn.execute(
+                f"SELECT {_COLUMNS} FROM (SELECT id, {_COLUMNS} FROM qsos{where} "
+                "ORDER BY qso_date DESC, time_on DESC, id DESC LIMIT ?) ORDER BY qso_date, time_on, id", params + [limit]
+            )
+        else:
+            yield from self.conn.execute(f"{_SELECT}{where} ORDER BY qso_date, time_on", params)
+
+    def query(self, **filters):
+        """Return matching QSOs as a QSOStore (see iter_query for filters)."""
+        return QSOStore.from_rows(self.iter_query(**filters))
+
+    def count(self, limit=None, **filters):
+        where, params = self._where(**filters)
+        count = self.conn.execute(f"SELECT COUNT(*) FROM qsos{where}", params).fetchone()[0]
+        return min(count, limit) if limit else count
+
+
+def area_fields(center_locator, radius_km):
+    """
+    Maidenhead fields (two letter grid prefixes) touched by the circle of
+    radius_km around a locator, for the grid index. None if there is no
+    radius or locator, or the circle touches every field.
+    """
+    center = locator_to_latlon(center_locator) if center_locator else None
+    if not radius_km or not center:
+        return None
+    lat, lon = center
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = lat - dlat, lat + dlat
+    ratio = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi / 2)) / max(math.cos(math.radians(lat)), 1e-12)
+    if south <= -90 or north >= 90 or radius_km >= math.pi * EARTH_RADIUS_KM / 2 or ratio >= 1:
+        # Circle contains a pole or is too wide: all longitudes (as utils.spatial_index)
+        columns = range(FIELD_COUNT)
+    else:
+        dlon = math.degrees(math.asin(ratio))
+        first = math.floor((lon - dlon + 180) / FIELD_LON)
+        last = math.floor((lon + dlon + 180) / FIELD_LON)
+        columns = sorted({column % FIELD_COUNT for column in range(first, last + 1)})
+    rows = range(max(math.floor((south + 90) / FIELD_LAT), 0), min(math.floor((north + 90) / FIELD_LAT), FIELD_COUNT - 1) + 1)
+    fields = [chr(ord("A") + column) + chr(ord("A") + row) for column in columns for row in rows]
+    return fields if len(fields) < FIELD_COUNT * FIELD_COUNT else None
+
+
+def database_filters(config):
+    """
+    Query filters (see QSODatabase.iter_query) from the settings: db_bands,
+    db_date_from, db_date_to (YYYYMMDD), the fields within area_radius_km
+    of my_grid (the exact radius is applied by the render plan) and the cap
+    db_max_qsos (0 = whole database).
+    """
+    filters = {
+        "limit": config.get("db_max_qsos", DEFAULT_MAX_QSOS),
+        "bands": config.get("db_bands") or None,
+        "date_from": config.get("db_date_from") or None,
+        "date_to": config.get("db_date_to") or None,
+        "grid_prefix": area_fields(config.get("my_grid"), config.get("area_radius_km", 0)),
+    }
+    return {key: value for key, value in filters.items() if value}
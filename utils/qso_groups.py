@@ -0,0 +1,61 @@
+"""
+QSO grouping by locator for QSOMap2KML
+--------------------------------------
+Aggregation mode for the KML export and the map preview: QSOs on the same
+grid square (optionally: same grid square and band) become one group with
+one marker and one line, so the number of map objects follows the number of
+distinct grids instead of the number of QSOs.
+Groups are built from the categorical codes of a QSOStore in one sort.
+"""
+
+import numpy as np
+
+# Values of the "aggregate_mode" setting
+AGGREGATE_OFF = "off"
+AGGREGATE_GRID = "grid"
+AGGREGATE_GRID_BAND = "grid_band"
+AGGREGATE_MODES = (AGGREGATE_OFF, AGGREGATE_GRID, AGGREGATE_GRID_BAND)
+
+
+class QSOGroup:
+    """QSOs sharing one grid (and band): indices into the store, in log order."""
+
+    def __init__(self, store, indices, by_band):
+        self.store = store
+        self.indices = indices
+        first = indices[0]
+        self.grid = store.column("gridsquare")[first]
+        self.grid_code = int(store.column("gridsquare").codes[first])
+        self.band = store.column("band")[first] if by_band else None
+        self.lat = float(store.lat[first])
+        self.lon = float(store.lon[first])
+
+    def __len__(self):
+        return len(self.indices)
+
+    def dominant(self, field):
+        """Most frequent value of a categorical field (band/mode) in the group."""
+        column = self.store.column(field)
+        counts = np.bincount(column.codes[self.indices])
+        return column.categories[int(np.argmax(counts))]
+
+
+def group_qsos(store, by_band=False):
+    """
+    Group the QSOs with a valid position by grid square (and band).
+
+    Returns:
+        List of QSOGroup, ordered by the first QSO of each group.
+    """
+    valid = np.flatnonzero(store.valid)
+    if not len(valid):
+        return []
+    key = store.column("gridsquare").codes[valid].astype(np.int64)
+    if by_band:
+        band = store.column("band")
+        key = key * max(len(band.categories), 1) + band.codes[valid]
+    order = np.argsort(key, kind="stable")
+    starts = np.flatnonzero(np.r_[True, key[order][1:] != key[order][:-1]])
+    groups = [valid[part] for part in np.split(order, starts[1:])]
+    groups.sort(key=lambda indices: indices[0])
+    return [QSOGroup(store, indices, by_band) for indices in groups]
@@ -0,0 +1,97 @@
+"""
+Distance and bearing statistics for QSOMap2KML
+----------------------------------------------
+Computes great-circle distance and azimuth from the own locator to every QSO
+in one vectorized pass over the decoded positions of a QSOStore, and the
+aggregates built from them:
+- ODX (longest distance) per band and per mode
+- Distance histogram
+- Bearing rose (QSO count per compass sector) for antenna planning
+"""
+
+import numpy as np
+
+from utils.spatial_index import haversine_km
+
+# Width of a distance histogram bin
+HISTOGRAM_STEP_KM = 1000
+# Number of compass sectors of the bearing rose (16 = N, NNE, NE, ...)
+ROSE_SECTORS = 16
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    """Initial great-circle bearing from point 1 to point 2 (0-360°, 0 = north)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlon = lon2 - lon1
+    y = np.sin(dlon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def _odx_by_category(column, distance):
+    """{category: index of the QSO with the largest distance} for a categorical column."""
+    ok = np.flatnonzero(~np.isnan(distance))
+    if not len(ok):
+        return {}
+    codes = column.codes[ok]
+    # Sort by code, then by descending distance: the first row of each code is its ODX
+    order = np.lexsort((-distance[ok], codes))
+    first = np.r_[True, codes[order][1:] != codes[order][:-1]]
+    best = ok[order[first]]
+    return {column.categories[column.codes[i]]: int(i) for i in best}
+
+
+class QSOStats:
+    """
+    Distance/bearing of every QSO of a store from one position, plus aggregates.
+
+    Attributes:
+        distance (ndarray): km per QSO (NaN without locator).
+        bearing (ndarray): degrees per QSO (NaN without locator).
+        odx_by_band, odx_by_mode (dict): band/mode -> index of the ODX QSO.
+        histogram (ndarray): QSO count per HISTOGRAM_STEP_KM bin.
+        rose (ndarray): QSO count per compass sector, starting at north.
+    """
+
+    def __init__(self, store, my_pos, histogram_step_km=HISTOGRAM_STEP_KM, rose_sectors=ROSE_SECTORS):
+        my_lat, my_lon = my_pos
+        self.store = store
+        self.distance = haversine_km(my_lat, my_lon, store.lat, store.lon)
+        self.bearing = bearing_deg(my_lat, my_lon, store.lat, store.lon)
+
+        self.odx_by_band = _odx_by_category(store.column("band"), self.distance)
+        self.odx_by_mode = _odx_by_category(store.column("mode"), self.distance)
+
+        valid = ~np.isnan(self.distance)
+        distance, bearing = self.distance[valid], self.bearing[valid]
+        self.histogram_step_km = histogram_step_km
+        self.histogram = np.bincount((distance // histogram_step_km).astype(np.int64))
+        sector = 360 / rose_sectors
+        self.rose = np.bincount(((bearing + sector / 2) // sector).astype(np.int64) % rose_sectors,
+                                minlength=rose_sectors)
+
+    def odx(self, i):
+        """(call, distance_km) of QSO i."""
+        return self.store.column("call")[i], float(self.distance[i])
+
+    def odx_lines(self):
+        """Legend lines 'band: CALL (km)' for every band, then every mode."""
+        lines = []
+        for odx in (self.odx_by_band, self.odx_by_mode):
+            for key, i in odx.items():
+                call, distance = self.odx(i)
+                lines.append(f"{key or '?'}: {call} ({distance:.0f} km)")
+        return lines
+
+    def format_distance(self, i):
+        """Distance of QSO i in whole km, '-' without locator."""
+        return "-" if np.isnan(self.distance[i]) else f"{self.distance[i]:.0f}"
+
+    def format_bearing(self, i):
+        """Bearing of QSO i in whole degrees, '-' without locator."""
+        return "-" if np.isnan(self.bearing[i]) else f"{self.bearing[i]:.0f}"
+
+
+def compute_stats(store, my_pos):
+    """QSOStats for a store, or None without a valid own position."""
+    return QSOStats(store, my_pos) if my_pos else None
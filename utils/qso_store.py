@@ -0,0 +1,382 @@
+"""
+Columnar QSO store for QSOMap2KML
+---------------------------------
+Keeps only the QSO fields the map preview and the KML export use, in compact
+NumPy arrays instead of one dict per QSO:
+- call, name, date and time as UTF-8 blobs with an offsets array
+- band, mode and gridsquare as categorical codes (one string per distinct value)
+- decoded locator positions as float arrays (NaN where the locator is invalid)
+
+A store can be saved to a memory-mappable cache file next to the ADIF file,
+so a log that was opened before reloads without parsing.
+"""
+
+import json
+import logging
+import os
+from array import array
+
+import numpy as np
+
+from utils.log_reader import iter_qsos
+from utils.grid_locator import locators_to_latlon
+from utils.spatial_index import GridIndex
+
+FIELDS = ("call", "band", "mode", "gridsquare", "name", "date", "time")
+CATEGORICAL_FIELDS = ("band", "mode", "gridsquare")
+STRING_FIELDS = ("call", "name", "date", "time")
+
+CACHE_SUFFIX = ".qsocache"
+CACHE_MAGIC = b"QSOSTORE"
+CACHE_VERSION = 2
+_ALIGN = 64
+
+
+def project_qso(qso):
+    """
+    Reduce a parsed QSO dict to a tuple in FIELDS order.
+    Call, mode and locator are uppercased, date/time fall back to the ADIF
+    names qso_date/time_on.
+    """
+    return (
+        qso.get("call", "").upper(),
+        qso.get("band", ""),
+        qso.get("mode", "").upper(),
+        qso.get("gridsquare", "").strip().upper(),
+        qso.get("name", ""),
+        qso.get("date", "") or qso.get("qso_date", ""),
+        qso.get("time", "") or qso.get("time_on", ""),
+    )
+
+
+class StringColumn:
+    """Immutable column of strings stored as one UTF-8 blob plus offsets."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return bytes(self.data[start:end]).decode("utf-8")
+
+    @classmethod
+    def concat(cls, columns):
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for col in columns:
+            offsets.append(col.offsets[1:] + base)
+            base += int(col.offsets[-1])
+        data = np.concatenate([np.zeros(0, dtype=np.uint8)] + [col.data for col in columns])
+        return cls(np.concatenate(offsets), data)
+
+    def take(self, indices):
+        starts = self.offsets[:-1][indices]
+        lengths = self.offsets[1:][indices] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if len(indices):
+            pick = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+            data = self.data[pick]
+        else:
+            data = np.zeros(0, dtype=np.uint8)
+        return StringColumn(offsets, data)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes
+
+
+class CategoricalColumn:
+    """Immutable column of repeated strings stored as codes into a category list."""
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = list(categories)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    @classmethod
+    def concat(cls, columns):
+        lookup = {}
+        parts = []
+        for col in columns:
+            remap = np.array([lookup.setdefault(cat, len(lookup)) for cat in col.categories], dtype=np.int64)
+            parts.append(remap[col.codes] if len(remap) else np.zeros(0, dtype=np.int64))
+        dtype = np.min_scalar_type(max(len(lookup) - 1, 0))
+        codes = np.concatenate([np.zeros(0, dtype=np.int64)] + parts).astype(dtype)
+        return cls(codes, list(lookup))
+
+    def take(self, indices):
+        return CategoricalColumn(self.codes[indices], self.categories)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+
+class _StoreBuilder:
+    """Collects projected rows into growable buffers without keeping the strings."""
+
+    def __init__(self):
+        self.count = 0
+        self.blobs = {field: bytearray() for field in STRING_FIELDS}
+        self.lengths = {field: array("q") for field in STRING_FIELDS}
+        self.lookup = {field: {} for field in CATEGORICAL_FIELDS}
+        self.codes = {field: array("I") for field in CATEGORICAL_FIELDS}
+
+    def add(self, row):
+        for field, value in zip(FIELDS, row):
+            if field in self.lookup:
+                lookup = self.lookup[field]
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(lookup)
+                self.codes[field].append(code)
+            else:
+                encoded = value.encode("utf-8")
+                self.blobs[field] += encoded
+                self.lengths[field].append(len(encoded))
+        self.count += 1
+
+    def build(self):
+        columns = {}
+        for field in STRING_FIELDS:
+            offsets = np.zeros(self.count + 1, dtype=np.int64)
+            np.cumsum(np.frombuffer(self.lengths[field], dtype=np.int64), out=offsets[1:])
+            data = np.frombuffer(self.blobs[field], dtype=np.uint8).copy()
+            columns[field] = StringColumn(offsets, data)
+        for field in CATEGORICAL_FIELDS:
+            categories = list(self.lookup[field])
+            dtype = np.min_scalar_type(max(len(categories) - 1, 0))
+            codes = np.frombuffer(self.codes[field], dtype=np.uint32).astype(dtype)
+            columns[field] = CategoricalColumn(codes, categories)
+        return QSOStore(columns)
+
+
+class QSOStore:
+    """
+    Compact, column oriented container for QSOs.
+
+    Columns are reached with column(name); positions with the lat/lon arrays
+    and the valid mask. Iterating yields one dict per QSO (built on the fly),
+    so code written for the old list of dicts keeps working.
+    """
+
+    def __init__(self, columns, lat=None, lon=None, _mmap=None):
+        self.columns = columns
+        self._mmap = _mmap
+        if lat is None or lon is None:
+            lat, lon = self._decode_positions()
+        self.lat = lat
+        self.lon = lon
+        self._spatial_index = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a store from tuples in FIELDS order."""
+        builder = _StoreBuilder()
+        for row in rows:
+            builder.add(row)
+        return builder.build()
+
+    @classmethod
+    def from_records(cls, qsos):
+        """Build a store from parsed QSO dicts (any iterable, consumed once)."""
+        return cls.from_rows(project_qso(qso) for qso in qsos)
+
+    @classmethod
+    def concat(cls, stores):
+        """Join several stores into one, keeping their order."""
+        stores = list(stores)
+        if not stores:
+            return cls.from_rows([])
+        columns = {}
+        for field in STRING_FIELDS:
+            columns[field] = StringColumn.concat([s.columns[field] for s in stores])
+        for field in CATEGORICAL_FIELDS:
+            columns[field] = CategoricalColumn.concat([s.columns[field] for s in stores])
+        lat = np.concatenate([s.lat for s in stores])
+        lon = np.concatenate([s.lon for s in stores])
+        return cls(columns, lat, lon)
+
+    @classmethod
+    def load_adif(cls, filepath, use_cache=True):
+        """
+        Load an ADIF or ADX file into a store.
+        With use_cache, a valid cache file next to the ADIF is memory-mapped
+        instead of parsing; otherwise the file is parsed and the cache written.
+        """
+        cache_path = filepath + CACHE_SUFFIX
+        if use_cache:
+            store = cls.load(cache_path, source=filepath)
+            if store is not None:
+                logging.info(f"Loaded {len(store)} QSOs from cache {cache_path}")
+                return store
+        store = cls.from_records(iter_qsos(filepath))
+        logging.info(f"Parsed {len(store)} QSOs from {filepath} ({store.nbytes} bytes in store)")
+        if use_cache:
+            store.save(cache_path, source=filepath)
+        return store
+
+    def _decode_positions(self):
+        # Decode each distinct locator once, then gather per QSO
+        grid = self.columns["gridsquare"]
+        cat_lat, cat_lon, _ = locators_to_latlon(grid.categories)
+        return cat_lat[grid.codes], cat_lon[grid.codes]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    @property
+    def valid(self):
+        """Boolean mask of QSOs with a decodable locator."""
+        return ~np.isnan(self.lat)
+
+    @property
+    def nbytes(self):
+        return sum(col.nbytes for col in self.columns.values()) + self.lat.nbytes + self.lon.nbytes
+
+    def column(self, field):
+        return self.columns[field]
+
+    def row(self, i):
+        """Return QSO i as a tuple in FIELDS order."""
+        return tuple(self.columns[field][i] for field in FIELDS)
+
+    def record(self, i):
+        """Return QSO i as a dict with the FIELDS keys."""
+        return dict(zip(FIELDS, self.row(i)))
+
+    def take(self, indices):
+        """Return a new store holding only the QSOs at the given indices."""
+        indices = np.asarray(indices, dtype=np.int64)
+        columns = {field: col.take(indices) for field, col in self.columns.items()}
+        return QSOStore(columns, self.lat[indices], self.lon[indices])
+
+    # --- Area queries ---
+
+    @property
+    def spatial_index(self):
+        """GridIndex over the QSO positions, built on first use."""
+        if self._spatial_index is None:
+            self._spatial_index = GridIndex(self.lat, self.lon)
+        return self._spatial_index
+
+    def within_radius(self, lat, lon, radius_km):
+        """New store with the QSOs within radius_km of (lat, lon)."""
+        return self.take(self.spatial_index.query_radius(lat, lon, radius_km))
+
+    def within_bbox(self, south, west, north, east):
+        """New store with the QSOs inside the bounding box (degrees)."""
+        return self.take(self.spatial_index.query_bbox(south, west, north, east))
+
+    # --- Persistence ---
+
+    def _arrays(self):
+        arrays = {"lat": self.lat, "lon": self.lon}
+        for field in STRING_FIELDS:
+            arrays[f"{field}.offsets"] = self.columns[field].offsets
+            arrays[f"{field}.data"] = self.columns[field].data
+        for field in CATEGORICAL_FIELDS:
+            arrays[f"{field}.codes"] = self.columns[field].codes
+        return arrays
+
+    def save(self, path, source=None):
+        """
+        Write the store to a memory-mappable file.
+        If source is given, its size and mtime are recorded so load() can
+        tell when the cache is stale. Errors are logged, not raised.
+        """
+        arrays = {name: np.ascontiguousarray(arr) for name, arr in self._arrays().items()}
+        header = {
+            "version": CACHE_VERSION,
+            "source": _source_stamp(source) if source else None,
+            "categories": {field: self.columns[field].categories for field in CATEGORICAL_FIELDS},
+            "arrays": {},
+        }
+        offset = 0
+        for name, arr in arrays.items():
+            header["arrays"][name] = {"dtype": arr.dtype.str, "offset": offset, "shape": list(arr.shape)}
+            offset += _aligned(arr.nbytes)
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_start = _aligned(len(CACHE_MAGIC) + 8 + len(header_bytes))
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(CACHE_MAGIC)
+                f.write(len(header_bytes).to_bytes(8, "little"))
+                f.write(header_bytes)
+                f.write(b"\0" * (data_start - f.tell()))
+                for arr in arrays.values():
+                    f.write(arr.tobytes())
+                    f.write(b"\0" * (_aligned(arr.nbytes) - arr.nbytes))
+            os.replace(tmp_path, path)
+            logging.debug(f"Saved QSO store cache {path}")
+        except OSError as e:
+            logging.warning(f"Could not write QSO store cache {path}: {e}")
+
+    @classmethod
+    def load(cls, path, source=None):
+        """
+        Memory-map a store written by save().
+        Returns None if the file is missing, unreadable or, when source is
+        given, does not match the current size/mtime of the source file.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                    return None
+                header_len = int.from_bytes(f.read(8), "little")
+                header = json.loads(f.read(header_len).decode("utf-8"))
+            if header.get("version") != CACHE_VERSION:
+                return None
+            if source and header.get("source") != _source_stamp(source):
+                logging.debug(f"QSO store cache {path} is stale")
+                return None
+            data_start = _aligned(len(CACHE_MAGIC) + 8 + header_len)
+            mm = np.memmap(path, dtype=np.uint8, mode="r")
+            arrays = {}
+            for name, spec in header["arrays"].items():
+                dtype = np.dtype(spec["dtype"])
+                count = int(np.prod(spec["shape"]))
+                start = data_start + spec["offset"]
+                arrays[name] = mm[start:start + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not read QSO store cache {path}: {e}")
+            return None
+        columns = {}
+        for field in STRING_FIELDS:
+            columns[field] = StringColumn(arrays[f"{field}.offsets"], arrays[f"{field}.data"])
+        for field in CATEGORICAL_FIELDS:
+            columns[field] = CategoricalColumn(arrays[f"{field}.codes"], header["categories"][field])
+        return cls(columns, arrays["lat"], arrays["lon"], _mmap=mm)
+
+
+def as_qso_store(qsos):
+    """Return qsos as a QSOStore, converting a list of dicts if needed."""
+    if isinstance(qsos, QSOStore):
+        return qsos
+    return QSOStore.from_records(qsos)
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
@@ -0,0 +1,241 @@
+"""
+Render plan for QSOMap2KML
+--------------------------
+One preprocessing stage shared by the map preview and all exports. A
+RenderPlan is built once per loaded log and set of display settings (own
+locator, colors, language, area filter) and holds everything that does not
+depend on the output format:
+- Area-filtered QSO store, positions and validity masks
+- Distance/bearing statistics
+- Date/time columns formatted on access, band/mode labels and colors per category
+- Great-circle paths per grid square
+Plans are immutable; output specific data derived from a plan (KML line
+geometries, Leaflet coordinates, ...) is memoized with derived(), so a
+second consumer only pays for serialization. restyled() makes a plan for
+other colors or another language that shares all geometry with the original.
+"""
+
+from functools import partial
+from types import MappingProxyType
+
+import numpy as np
+
+from utils.grid_locator import locator_to_latlon
+from utils.qso_store import as_qso_store
+from utils.spatial_index import apply_area_filter
+from utils.qso_stats import compute_stats
+from utils.great_circle import GreatCircleCache
+
+
+def format_adif_date(date_str, lang="en"):
+    """Format ADIF date YYYYMMDD to localized string."""
+    if not date_str or len(date_str) != 8:
+        return date_str
+    year, month, day = date_str[:4], date_str[4:6], date_str[6:8]
+    if lang == "de":
+        return f"{day}.{month}.{year}"
+    return f"{year}-{month}-{day}"
+
+def format_adif_time(time_str):
+    """Format ADIF time HHMMSS or HHMM to HH:MM or HH:MM:SS."""
+    if not time_str or len(time_str) < 4:
+        return time_str
+    hour, minute = time_str[:2], time_str[2:4]
+    if len(time_str) >= 6:
+        second = time_str[4:6]
+        return f"{hour}:{minute}:{second}"
+    return f"{hour}:{minute}"
+
+
+class FormattedColumn:
+    """
+    Read-only view of a store string column that formats values on access
+    (e.g. ADIF dates for display); formatter is called once per distinct value.
+    """
+
+    def __init__(self, column, formatter):
+        self.column = column
+        self.formatter = formatter
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.column)
+
+    def __getitem__(self, i):
+        value = self.column[i]
+        text = self._cache.get(value)
+        if text is None:
+            text = self._cache[value] = self.formatter(value)
+        return text
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getstate__(self):
+        # The column is shared with the pickled store, the cache is rebuilt
+        return {"column": self.column, "formatter": self.formatter}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _cache={})
+
+
+def _read_only(arr):
+    view = np.asarray(arr).view()
+    view.flags.writeable = False
+    return view
+
+
+def plan_settings(my_locator=None, band_colors=None, mode_colors=None, lang="en", area_radius_km=0):
+    """Hashable key of the settings a plan was built for."""
+    return (
+        my_locator or "",
+        tuple((band_colors or {}).items()),
+        tuple((mode_colors or {}).items()),
+        lang,
+        area_radius_km or 0,
+    )
+
+
+class RenderPlan:
+    """
+    Immutable, output independent view of a log for one set of settings.
+
+    Per QSO (index into store): lat, lon, valid, at_qth, calls, names, dates,
+    times, band_codes, mode_codes, grid_codes and stats.distance/bearing.
+    Per category code: band_labels, mode_labels, band_colors_by_code,
+    mode_colors_by_code (None if not configured) and paths (by grid code).
+    """
+
+    def __init__(self, qsos, my_locator=None, band_colors=None, mode_colors=None, lang="en", area_radius_km=0):
+        source = qsos
+        store = apply_area_filter(as_qso_store(qsos), my_locator, area_radius_km)
+        my_pos = locator_to_latlon(my_locator) if my_locator else None
+        band_colors = MappingProxyType(dict(band_colors or {}))
+        mode_colors = MappingProxyType(dict(mode_colors or {}))
+        bands = store.column("band")
+        modes = store.column("mode")
+        grids = store.column("gridsquare")
+
+        self.source = source
+        self.store = store
+        self.settings = plan_settings(my_locator, band_colors, mode_colors, lang, area_radius_km)
+        self.my_locator = my_locator
+        self.my_pos = my_pos
+        self.lang = lang
+        self.area_radius_km = area_radius_km or 0
+        self.band_colors = band_colors
+        self.mode_colors = mode_colors
+
+        self.lat = _read_only(store.lat)
+        self.lon = _read_only(store.lon)
+        self.valid = _read_only(store.valid)
+        if my_pos:
+            self.at_qth = _read_only((store.lat == my_pos[0]) & (store.lon == my_pos[1]))
+        else:
+            self.at_qth = _read_only(np.zeros(len(store), dtype=bool))
+        self.stats = compute_stats(store, my_pos)
+
+        # Per QSO strings stay in the store columns and are decoded on access
+        self.calls = store.column("call")
+        self.names = store.column("name")
+        self.dates = FormattedColumn(store.column("date"), partial(format_adif_date, lang=lang))
+        self.times = FormattedColumn(store.column("time"), format_adif_time)
+
+        self.band_codes = _read_only(bands.codes)
+        self.mode_codes = _read_only(modes.codes)
+        self.grid_codes = _read_only(grids.codes)
+        self.band_labels = tuple(band or "Unknown" for band in bands.categories)
+        self.mode_labels = tuple(mode or "UNKNOWN" for mode in modes.categories)
+        self.band_colors_by_code = tuple(band_colors.get(band) for band in self.band_labels)
+        self.mode_colors_by_code = tuple(mode_colors.get(mode) for mode in self.mode_labels)
+
+        # Great-circle path per grid square (list of parts, None if invalid)
+        if my_pos:
+            self.paths = tuple(GreatCircleCache(*my_pos).get(grids.categories))
+        else:
+            self.paths = ()
+
+        self._derived = {}
+        # Memoized data that only depends on positions and codes (kept by restyled())
+        self._shared = {}
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"RenderPlan is immutable (cannot set {name})")
+        super().__setattr__(name, value)
+
+    def __getstate__(self):
+        # Sent to export worker processes: without the source log and memoized
+        # data; mappingproxy cannot be pickled, so the colors go as plain dicts
+        state = dict(self.__dict__)
+        state["source"] = None
+        state["band_colors"] = dict(self.band_colors)
+        state["mode_colors"] = dict(self.mode_colors)
+        del state["_derived"], state["_shared"]
+        return state
+
+    def __setstate__(self, state):
+        state["band_colors"] = MappingProxyType(state["band_colors"])
+        state["mode_colors"] = MappingProxyType(state["mode_colors"])
+        state["_derived"] = {}
+        state["_shared"] = {}
+        self.__dict__.update(state)
+
+    def __len__(self):
+        return len(self.store)
+
+    def matches(self, my_locator=None, band_colors=None, mode_colors=None, lang="en", area_radius_km=0):
+        """True if the plan was built for these settings."""
+        return self.settings == plan_settings(my_locator, band_colors, mode_colors, lang, area_radius_km)
+
+    def derived(self, key, factory, shared=False):
+        """
+        Output specific data computed from the plan once (e.g. KML line
+        geometries); factory is called on first use, later calls reuse it.
+        shared=True: the data does not depend on colors or language and is
+        also reused by the plans made with restyled().
+        """
+        memo = self._shared if shared else self._derived
+        if key not in memo:
+            memo[key] = factory()
+        return memo[key]
+
+    def restyled(self, band_colors=None, mode_colors=None, lang="en"):
+        """
+        Plan for other colors and/or another language. Positions, statistics
+        and paths are shared with this plan, only labels and colors are redone.
+        """
+        if self.matches(self.my_locator, band_colors, mode_colors, lang, self.area_radius_km):
+            return self
+        plan = object.__new__(RenderPlan)
+        state = dict(self.__dict__)
+        del state["_frozen"]
+        band_colors = MappingProxyType(dict(band_colors or {}))
+        mode_colors = MappingProxyType(dict(mode_colors or {}))
+        state.update(
+            settings=plan_settings(self.my_locator, band_colors, mode_colors, lang, self.area_radius_km),
+            lang=lang,
+            band_colors=band_colors,
+            mode_colors=mode_colors,
+            band_colors_by_code=tuple(band_colors.get(band) for band in self.band_labels),
+            mode_colors_by_code=tuple(mode_colors.get(mode) for mode in self.mode_labels),
+            _derived={},
+        )
+        if lang != self.lang:
+            state["dates"] = FormattedColumn(self.store.column("date"), partial(format_adif_date, lang=lang))
+        plan.__dict__.update(state)
+        plan._frozen = True
+        return plan
+
+
+def as_render_plan(qsos, my_locator=None, band_colors=None, mode_colors=None, lang="en", area_radius_km=0):
+    """
+    Return qsos if it already is a RenderPlan for these settings, otherwise
+    build one (from the plan's source, a QSOStore or a list of QSO dicts).
+    """
+    if isinstance(qsos, RenderPlan):
+        if qsos.matches(my_locator, band_colors, mode_colors, lang, area_radius_km):
+            return qsos
+        qsos = qsos.source
+    return RenderPlan(qsos, my_locator, band_colors, mode_colors, lang, area_radius_km)
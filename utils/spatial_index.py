@@ -0,0 +1,139 @@
+"""
+Spatial index for decoded QSO positions
+---------------------------------------
+Buckets QSOs by Maidenhead square (2° lon x 1° lat, the first two character
+pairs of a locator, see utils.grid_locator). Squares are numbered row by row,
+so the squares of a bounding box are one contiguous slice per latitude row.
+Supports:
+- Bounding box queries (also across the antimeridian)
+- Radius queries (great-circle distance)
+- k nearest neighbours
+"""
+
+import numpy as np
+
+from utils.grid_locator import locator_to_latlon
+
+EARTH_RADIUS_KM = 6371.0088
+
+SQUARE_LON = 2.0
+SQUARE_LAT = 1.0
+_COLS = int(360 / SQUARE_LON)
+_ROWS = int(180 / SQUARE_LAT)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (scalars or NumPy arrays, degrees)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    """
+    Square-bucketed index over lat/lon arrays (NaN positions are skipped).
+    All queries return indices into the arrays the index was built from.
+    """
+
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        ids = np.flatnonzero(~np.isnan(self.lat))
+        cells = self._row(self.lat[ids]) * _COLS + self._col(self.lon[ids])
+        order = np.argsort(cells, kind="stable")
+        self._ids = ids[order]
+        # CSR layout: QSOs of cell c are _ids[_starts[c]:_starts[c + 1]]
+        self._starts = np.searchsorted(cells[order], np.arange(_ROWS * _COLS + 1))
+
+    def __len__(self):
+        return len(self._ids)
+
+    @staticmethod
+    def _row(lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / SQUARE_LAT), 0, _ROWS - 1).astype(np.int64)
+
+    @staticmethod
+    def _col(lon):
+        return np.clip(np.floor((np.asarray(lon) + 180) / SQUARE_LON), 0, _COLS - 1).astype(np.int64)
+
+    def _candidates(self, south, north, col_ranges):
+        """QSO indices in the squares of rows south..north and the given column ranges."""
+        parts = []
+        for row in range(int(self._row(south)), int(self._row(north)) + 1):
+            for c0, c1 in col_ranges:
+                start = self._starts[row * _COLS + c0]
+                end = self._starts[row * _COLS + c1 + 1]
+                if end > start:
+                    parts.append(self._ids[start:end])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _lon_ranges(west, east):
+        """Column ranges covering west..east; west > east means crossing the antimeridian."""
+        if east - west >= 360:
+            return [(0, _COLS - 1)], (-180.0, 180.0)
+        west = (west + 180) % 360 - 180
+        east = (east + 180) % 360 - 180
+        if west <= east:
+            return [(int(GridIndex._col(west)), int(GridIndex._col(east)))], (west, east)
+        return [(int(GridIndex._col(west)), _COLS - 1), (0, int(GridIndex._col(east)))], (west, east)
+
+    def query_bbox(self, south, west, north, east):
+        """Indices of QSOs inside the box, sorted ascending."""
+        col_ranges, (west, east) = self._lon_ranges(west, east)
+        ids = self._candidates(max(south, -90), min(north, 90), col_ranges)
+        lat, lon = self.lat[ids], self.lon[ids]
+        inside = (lat >= south) & (lat <= north)
+        if west <= east:
+            inside &= (lon >= west) & (lon <= east)
+        else:
+            inside &= (lon >= west) | (lon <= east)
+        return np.sort(ids[inside])
+
+    def query_radius(self, lat, lon, radius_km, return_distance=False):
+        """
+        Indices of QSOs within radius_km of (lat, lon), sorted ascending.
+        With return_distance, returns (indices, distances_km).
+        """
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        south, north = lat - dlat, lat + dlat
+        ratio = np.sin(radius_km / EARTH_RADIUS_KM) / max(np.cos(np.radians(lat)), 1e-12)
+        if south <= -90 or north >= 90 or radius_km >= np.pi * EARTH_RADIUS_KM / 2 or ratio >= 1:
+            # Circle contains a pole or is too wide: all longitudes
+            col_ranges = [(0, _COLS - 1)]
+        else:
+            dlon = np.degrees(np.arcsin(ratio))
+            col_ranges, _ = self._lon_ranges(lon - dlon, lon + dlon)
+        ids = np.sort(self._candidates(max(south, -90), min(north, 90), col_ranges))
+        dist = haversine_km(lat, lon, self.lat[ids], self.lon[ids])
+        inside = dist <= radius_km
+        if return_distance:
+            return ids[inside], dist[inside]
+        return ids[inside]
+
+    def nearest(self, lat, lon, k=1):
+        """
+        The k QSOs closest to (lat, lon) as (indices, distances_km), nearest first.
+        Searches growing radii, so only nearby squares are touched.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        radius = 250.0
+        while True:
+            ids, dist = self.query_radius(lat, lon, radius, return_distance=True)
+            if len(ids) >= k or radius >= np.pi * EARTH_RADIUS_KM:
+                order = np.argsort(dist, kind="stable")[:k]
+                return ids[order], dist[order]
+            radius *= 2
+
+
+def apply_area_filter(store, center_locator, radius_km):
+    """
+    Limit a QSOStore to the QSOs within radius_km of a locator.
+    Returns the store unchanged if the radius is 0/None or the locator invalid.
+    """
+    center = locator_to_latlon(center_locator) if center_locator else None
+    if not radius_km or not center:
+        return store
+    return store.within_radius(center[0], center[1], radius_km)
@@ -0,0 +1,247 @@
+"""
+Offline map tile cache for QSOMap2KML
+-------------------------------------
+Keeps the base map tiles of the preview on disk, so panning a known area
+needs no network and the map also works offline (field day, portable):
+- One SQLite file (config/tiles.sqlite), tiles by provider and z/x/y
+- Size cap in MB; when it is exceeded the least recently used tiles are
+  removed until the cache is back at 90 % of the cap
+- Hits only note the time in memory; the times are written as one
+  batch with the next put, eviction or close (no write per hit)
+- The preview serves tiles from the cache and only fetches misses (see
+  gui.map_scheme); seed_tiles() pre-loads a bounding box and zoom range
+  (command line: python main.py seed-tiles ...)
+Only the standard library is used (no Qt), so the command line can seed.
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import time
+import urllib.request
+
+DEFAULT_CACHE_PATH = "config/tiles.sqlite"
+DEFAULT_CACHE_MB = 500
+# Evict down to this share of the cap, so not every new tile triggers an eviction
+EVICT_TO = 0.9
+# Cache hits are noted in memory and written at the latest after this many
+FLUSH_HITS = 1000
+# Tile servers (OpenStreetMap) require an identifying User-Agent
+USER_AGENT = "QSOMap2KML tile cache"
+FETCH_TIMEOUT = 15
+# Upper limit of one seed run (tile server usage policies forbid bulk downloads)
+MAX_SEED_TILES = 20000
+# Web Mercator latitude limit
+MAX_LAT = 85.0511
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tiles (
+    provider TEXT NOT NULL,
+    z INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (provider, z, x, y)
+);
+CREATE INDEX IF NOT EXISTS idx_tiles_used ON tiles (used);
+"""
+
+
+class TileCache:
+    """
+    SQLite backed LRU cache of map tiles.
+
+    Usage:
+        with TileCache(max_mb=200) as cache:
+            data = cache.get("OpenStreetMap.Mapnik", 5, 17, 10)
+            if data is None:
+                cache.put("OpenStreetMap.Mapnik", 5, 17, 10, fetch_tile(provider, 5, 17, 10))
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_CACHE_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+        # Last use of the tiles read since the last flush: key -> time
+        self._touched = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+    def __contains__(self, key):
+        return self.conn.execute(
+            "SELECT 1 FROM tiles WHERE provider = ? AND z = ? AND x = ? AND y = ?", key
+        ).fetchone() is not None
+
+    def get(self, provider, z, x, y):
+        """Tile data or None; a hit marks the tile as recently used (written with the next flush)."""
+        key = (provider, z, x, y)
+        row = self.conn.execute("SELECT data FROM tiles WHERE provider = ? AND z = ? AND x = ? AND y = ?", key).fetchone()
+        if row is None:
+            return None
+        self._touched[key] = time.time()
+        if len(self._touched) >= FLUSH_HITS:
+            self.flush()
+        return row[0]
+
+    def flush(self):
+        """Write the use times of the tiles read since the last flush."""
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        with self.conn:
+            self.conn.executemany("UPDATE tiles SET used = ? WHERE provider = ? AND z = ? AND x = ? AND y = ?",
+                                  [(used,) + key for key, used in touched.items()])
+
+    def put(self, provider, z, x, y, data):
+        """Store a tile and evict the least recently used tiles if the cap is exceeded."""
+        key = (provider, z, x, y)
+        self._touched.pop(key, None)
+        self.flush()
+        with self.conn:
+            old = self.conn.execute("SELECT size FROM tiles WHERE provider = ? AND z = ? AND x = ? AND y = ?", key).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO tiles (provider, z, x, y, data, size, used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              key + (data, len(data), time.time()))
+        self.total += len(data) - (old[0] if old else 0)
+        if self.total > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def resize(self, max_mb):
+        """Change the size cap (evicts at once if the cache is larger)."""
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        if self.total > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def evict(self, target_bytes):
+        """Remove least recently used tiles until the cache holds at most target_bytes; returns the count."""
+        self.flush()
+        with self.conn:
+            rows = self.conn.execute("SELECT provider, z, x, y, size FROM tiles ORDER BY used")
+            doomed = []
+            for provider, z, x, y, size in rows:
+                if self.total <= target_bytes:
+                    break
+                doomed.append((provider, z, x, y))
+                self.total -= size
+            self.conn.executemany("DELETE FROM tiles WHERE provider = ? AND z = ? AND x = ? AND y = ?", doomed)
+            removed = len(doomed)
+        if removed:
+            logging.debug(f"Tile cache: evicted {removed} tiles, {self.total // 1024} KB left")
+        return removed
+
+    def clear(self):
+        self._touched = {}
+        with self.conn:
+            self.conn.execute("DELETE FROM tiles")
+        self.total = 0
+
+
+def fetch_tile(provider, z, x, y, timeout=FETCH_TIMEOUT):
+    """
+    Download one tile from the tile server.
+
+    Args:
+        provider (TileProvider): Base map of utils.tile_providers.
+        z, x, y (int): Tile coordinates.
+
+    Returns:
+        bytes; raises OSError (also urllib's URLError) if the server cannot be reached.
+    """
+    request = urllib.request.Request(provider.tile_url(z, x, y), headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def tile_xy(lat, lon, z):
+    """Web Mercator tile x, y containing a position at zoom z."""
+    n = 2 ** z
+    lat = max(min(lat, MAX_LAT), -MAX_LAT)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(bbox, zooms):
+    """
+    Tiles covering a bounding box.
+
+    Args:
+        bbox (tuple): (south, west, north, east) in degrees.
+        zooms (iterable): Zoom levels.
+
+    Yields:
+        (z, x, y)
+    """
+    south, west, north, east = bbox
+    for z in zooms:
+        x0, y0 = tile_xy(north, west, z)
+        x1, y1 = tile_xy(south, east, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def count_tiles(bbox, zooms):
+    south, west, north, east = bbox
+    total = 0
+    for z in zooms:
+        x0, y0 = tile_xy(north, west, z)
+        x1, y1 = tile_xy(south, east, z)
+        total += (x1 - x0 + 1) * (y1 - y0 + 1)
+    return total
+
+
+def seed_tiles(cache, provider, bbox, zooms, progress_callback=None, refresh=False, max_tiles=MAX_SEED_TILES):
+    """
+    Pre-load the tiles of a bounding box and zoom range into the cache.
+
+    Args:
+        cache (TileCache): Target cache.
+        provider (TileProvider): Base map.
+        bbox (tuple): (south, west, north, east) in degrees.
+        zooms (iterable): Zoom levels (limited to the provider's zoom range).
+        progress_callback (callable): Called with (done, total).
+        refresh (bool): Download tiles that are already cached again.
+        max_tiles (int): Refuse larger runs (ValueError).
+
+    Returns:
+        (fetched, cached, failed) tile counts.
+    """
+    zooms = [z for z in zooms if provider.min_zoom <= z <= provider.max_zoom]
+    total = count_tiles(bbox, zooms)
+    if total > max_tiles:
+        raise ValueError(f"{total} tiles requested, at most {max_tiles} per run (smaller area or fewer zoom levels)")
+    fetched = cached = failed = 0
+    for done, (z, x, y) in enumerate(tile_range(bbox, zooms), 1):
+        if not refresh and (provider.name, z, x, y) in cache:
+            cached += 1
+        else:
+            try:
+                cache.put(provider.name, z, x, y, fetch_tile(provider, z, x, y))
+                fetched += 1
+            except OSError as e:
+                logging.warning(f"Tile {provider.name} {z}/{x}/{y} not loaded: {e}")
+                failed += 1
+        if progress_callback:
+            progress_callback(done, total)
+    logging.info(f"Seeded {provider.name}: {fetched} fetched, {cached} already cached, {failed} failed")
+    return fetched, cached, failed
@@ -0,0 +1,111 @@
+"""
+Base map catalog for QSOMap2KML
+-------------------------------
+Reads the tile providers bundled with the application
+(resources/xyzservices/data/providers.json, the catalog of xyzservices):
+- Nested groups are flattened to names like "OpenStreetMap.Mapnik"
+- Providers that need an API key, use another projection than Web Mercator
+  or are marked broken are left out, so every entry works without setup
+- TileProvider.tile_url() builds the URL of one tile (z, x, y); the map
+  preview and the tile cache (utils.tile_cache) use the same URLs
+Only the JSON file is read, the xyzservices package is not needed.
+"""
+
+import json
+import logging
+import re
+from functools import lru_cache
+
+from utils.app_utils import resource_path
+
+PROVIDERS_PATH = "resources/xyzservices/data/providers.json"
+DEFAULT_PROVIDER = "OpenStreetMap.Mapnik"
+DEFAULT_MAX_ZOOM = 18
+
+# Placeholder of the catalog for keys the user has to fill in
+_KEY_PLACEHOLDER = "<insert your"
+# Leaflet options the preview does not support for a cached base layer
+_UNSUPPORTED = ("crs", "tms", "status")
+_FIELD = re.compile(r"\{(\w+)\}")
+
+
+class TileProvider:
+    """
+    One base map of the catalog.
+
+    Args:
+        name (str): Catalog name, e.g. "OpenStreetMap.Mapnik".
+        options (dict): Entry of providers.json (url, attribution, max_zoom, ...).
+    """
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+        self.url = options["url"]
+        self.attribution = options.get("html_attribution") or options.get("attribution", "")
+        self.min_zoom = int(options.get("min_zoom", 0))
+        self.max_zoom = int(options.get("max_zoom", DEFAULT_MAX_ZOOM))
+        # "abc" or ["a", "b", "c"]
+        self.subdomains = list(options.get("subdomains", "abc"))
+
+    def tile_url(self, z, x, y):
+        """URL of tile z/x/y (subdomains spread by tile, no retina suffix)."""
+        values = dict(self.options, z=z, x=x, y=y, r="")
+        if self.subdomains:
+            values["s"] = self.subdomains[(x + y) % len(self.subdomains)]
+        return _FIELD.sub(lambda m: str(values[m.group(1)]), self.url)
+
+    def leaflet_url(self):
+        """URL template for a Leaflet tile layer: provider fields filled in, {s}/{z}/{x}/{y}/{r} left to Leaflet."""
+        values = dict(self.options, s="{s}", z="{z}", x="{x}", y="{y}", r="{r}")
+        return _FIELD.sub(lambda m: str(values[m.group(1)]), self.url)
+
+    def usable(self):
+        """Whether the provider works without an API key in the Web Mercator preview."""
+        if any(key in self.options for key in _UNSUPPORTED):
+            return False
+        if any(isinstance(v, str) and v.startswith(_KEY_PLACEHOLDER) for v in self.options.values()):
+            return False
+        try:
+            self.tile_url(0, 0, 0)
+        except KeyError:
+            return False
+        return True
+
+
+def _flatten(node, prefix=""):
+    if "url" in node:
+        yield prefix, node
+        return
+    for key, child in node.items():
+        if isinstance(child, dict):
+            yield from _flatten(child, f"{prefix}.{key}" if prefix else key)
+
+
+@lru_cache(maxsize=None)
+def load_providers(path=PROVIDERS_PATH):
+    """
+    Usable providers of the catalog by name (read once).
+
+    Returns:
+        dict: name -> TileProvider, in catalog order; empty if the file is missing.
+    """
+    try:
+        with open(resource_path(path), "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error reading tile providers {path}: {e}")
+        return {}
+    providers = {}
+    for name, options in _flatten(catalog):
+        provider = TileProvider(name, options)
+        if provider.usable():
+            providers[name] = provider
+    logging.debug(f"{len(providers)} usable tile providers in {path}")
+    return providers
+
+
+def get_provider(name):
+    """Provider by catalog name; unknown names fall back to OpenStreetMap (None without catalog)."""
+    providers = load_providers()
+    return providers.get(name) or providers.get(DEFAULT_PROVIDER)
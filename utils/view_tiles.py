@@ -0,0 +1,192 @@
+"""
+Viewport tiles for the lazily loaded map preview
+------------------------------------------------
+Logs too large to send to the browser at once (render mode "lazy") are
+loaded by the page as the user pans and zooms: the page only gets the
+lookup tables and asks for the Web Mercator tiles in view (see
+MapPreview.load_tiles):
+- Up to CLUSTER_MAX_ZOOM a tile holds the clusters of its zoom level
+  (utils.clustering, at most (256 / CLUSTER_CELL_PX)² per tile); single QSO
+  clusters come with their QSO
+- Above, tiles of DETAIL_ZOOM hold the QSOs themselves, found with the
+  spatial index of the store (utils.spatial_index); at most MAX_TILE_QSOS
+  per response and tile, the page asks for the rest with the offset it gets
+  back under "more"
+- The great-circle path of a grid square is sent with its first QSO
+The page remembers the tiles it has, so panning only transfers new tiles.
+"""
+
+import itertools
+import math
+
+import numpy as np
+
+from utils.clustering import CLUSTER_MAX_ZOOM, cluster_levels, mercator_xy
+
+# Zoom level of the tiles that hold single QSOs (all zoom levels above the clusters)
+DETAIL_ZOOM = CLUSTER_MAX_ZOOM + 1
+MAX_TILE_QSOS = 10000
+# Degrees added around a tile for the spatial index query
+EDGE_PAD = 1e-6
+# Tiles answered per request; the others are returned under "more"
+MAX_REQUEST_TILES = 256
+
+_tokens = itertools.count(1)
+
+
+def plan_clusters(plan):
+    """Cluster levels of the QSOs with a position of a plan (utils.clustering), computed once per plan."""
+    def build():
+        drawn = np.flatnonzero(plan.valid)
+        return cluster_levels(plan.lat[drawn], plan.lon[drawn], plan.band_codes[drawn], plan.mode_codes[drawn])
+    return plan.derived("cluster_levels", build, shared=True)
+
+
+def tile_keys(lat, lon, zoom):
+    """Tile x, y of positions at a zoom level."""
+    n = 1 << zoom
+    x, y = mercator_xy(lat, lon)
+    return (x * n).astype(np.int64), (y * n).astype(np.int64)
+
+
+def tile_bounds(zoom, x, y):
+    """(south, west, north, east) of a tile in degrees; the edge rows reach the poles (see mercator_xy)."""
+    n = 1 << zoom
+
+    def lat(row):
+        if row <= 0:
+            return 90.0
+        if row >= n:
+            return -90.0
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def _rounded(values):
+    return [None if np.isnan(v) else int(v) for v in np.round(values)]
+
+
+class ViewTiles:
+    """
+    Data source of one lazily loaded page.
+
+    Args:
+        plan (RenderPlan): Plan of the page (positions, codes, texts and paths).
+
+    Attributes:
+        token (int): Identifies the page; requests of older pages are ignored.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.token = next(_tokens)
+        self.drawn = np.flatnonzero(plan.valid)
+        self.levels = plan_clusters(plan)
+        # Clusters per tile and level, CSR layout: clusters of the tile with key k
+        # are order[starts[k]:ends[k]] (keys sorted, looked up with searchsorted)
+        self._cluster_tiles = []
+        for level in self.levels:
+            x, y = tile_keys(level.lat, level.lon, level.zoom)
+            keys = y * (1 << level.zoom) + x
+            order = np.argsort(keys, kind="stable")
+            self._cluster_tiles.append((keys[order], order))
+        # Built here (worker thread) instead of on the first request
+        plan.store.spatial_index
+        self._sent_paths = set()
+
+    def tiles(self, zoom, keys):
+        """
+        Content of the tiles of a zoom level that the page asks for.
+
+        Args:
+            zoom (int): Map zoom level; above CLUSTER_MAX_ZOOM the keys are tiles of DETAIL_ZOOM.
+            keys (list): [[x, y], ...] tile coordinates; detail tiles may come as
+                [x, y, offset] to continue a tile that had more than MAX_TILE_QSOS.
+
+        Returns:
+            dict: rows (QSO columns), clusters (cluster columns, row = index into
+            rows or -1; None above CLUSTER_MAX_ZOOM), paths (new grid square paths)
+            and more (keys left for another request: tiles beyond MAX_REQUEST_TILES
+            and [x, y, offset] of the detail tiles that were cut).
+        """
+        keys, more = keys[:MAX_REQUEST_TILES], [list(key) for key in keys[MAX_REQUEST_TILES:]]
+        if zoom > CLUSTER_MAX_ZOOM:
+            ids = []
+            for key in keys:
+                x, y = int(key[0]), int(key[1])
+                offset = int(key[2]) if len(key) > 2 else 0
+                tile_ids = self._detail_tile(x, y)
+                ids.append(tile_ids[offset:offset + MAX_TILE_QSOS])
+                if len(tile_ids) > offset + MAX_TILE_QSOS:
+                    more.append([x, y, offset + MAX_TILE_QSOS])
+            ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+            return {"rows": self._rows(ids), "clusters": None, "paths": self._new_paths(ids), "more": more}
+
+        keys = [(int(x), int(y)) for x, y in keys]
+        zoom = max(int(zoom), 0)
+        level = self.levels[zoom]
+        sorted_keys, order = self._cluster_tiles[zoom]
+        wanted = np.array([y * (1 << zoom) + x for x, y in keys], dtype=np.int64)
+        starts = np.searchsorted(sorted_keys, wanted, side="left")
+        ends = np.searchsorted(sorted_keys, wanted, side="right")
+        clusters = np.concatenate([order[s:e] for s, e in zip(starts, ends)]) if keys else np.zeros(0, dtype=np.int64)
+        single = level.count[clusters] == 1
+        ids = self.drawn[level.first[clusters[single]]]
+        row = np.full(len(clusters), -1, dtype=np.int64)
+        row[single] = np.arange(len(ids))
+        return {
+            "rows": self._rows(ids),
+            "clusters": {
+                "lat": np.round(level.lat[clusters], 5).tolist(),
+                "lon": np.round(level.lon[clusters], 5).tolist(),
+                "count": level.count[clusters].tolist(),
+                "exp": level.expansion_zoom[clusters].tolist(),
+                "bands": [level.bands[c] for c in clusters.tolist()],
+                "modes": [level.modes[c] for c in clusters.tolist()],
+                "row": row.tolist(),
+            },
+            "paths": {},
+            "more": more,
+        }
+
+    def _detail_tile(self, x, y):
+        """Indices of all QSOs in tile x/y of DETAIL_ZOOM (spatial index, then exact tile test), in a stable order."""
+        plan = self.plan
+        south, west, north, east = tile_bounds(DETAIL_ZOOM, x, y)
+        # Padded against rounding at the edges, the tile test below decides
+        ids = plan.store.spatial_index.query_bbox(south - EDGE_PAD, west - EDGE_PAD, north + EDGE_PAD, east + EDGE_PAD)
+        tx, ty = tile_keys(plan.lat[ids], plan.lon[ids], DETAIL_ZOOM)
+        return np.sort(ids[(tx == x) & (ty == y)])
+
+    def _rows(self, ids):
+        """QSO columns for the page; codes refer to the band/mode tables of the page."""
+        plan = self.plan
+        stats = plan.stats
+        dates = plan.store.column("date")
+        grids = plan.grid_codes[ids].tolist() if plan.my_pos else [None] * len(ids)
+        return {
+            "lat": np.round(plan.lat[ids], 5).tolist(),
+            "lon": np.round(plan.lon[ids], 5).tolist(),
+            "band": plan.band_codes[ids].tolist(),
+            "mode": plan.mode_codes[ids].tolist(),
+            "call": [plan.calls[i] or "UNKNOWN" for i in ids],
+            "name": [plan.names[i] for i in ids],
+            # ADIF dates, formatted in the page
+            "date": [dates[i] for i in ids],
+            "time": [plan.times[i] for i in ids],
+            "distance": _rounded(stats.distance[ids]) if stats else [None] * len(ids),
+            "bearing": _rounded(stats.bearing[ids]) if stats else [None] * len(ids),
+            "grid": [g if g is not None and plan.paths[g] else None for g in grids],
+        }
+
+    def _new_paths(self, ids):
+        """Paths of the grid squares of QSOs that were not sent to the page yet."""
+        plan = self.plan
+        if not plan.my_pos or not len(ids):
+            return {}
+        paths = {}
+        for grid_code in np.unique(plan.grid_codes[ids]).tolist():
+            if grid_code not in self._sent_paths and plan.paths[grid_code]:
+                self._sent_paths.add(grid_code)
+                paths[grid_code] = [np.round(part, 4).tolist() for part in plan.paths[grid_code]]
+        return paths